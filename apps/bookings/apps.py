@@ -7,3 +7,4 @@ class BookingsConfig(AppConfig):
     
     def ready(self):
         import apps.bookings.signals
+        import apps.bookings.effects
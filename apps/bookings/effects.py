@@ -0,0 +1,214 @@
+"""
+Efectos derivados de las transiciones de bookings
+
+La transición se confirma primero (state_machine.transition); después, al
+hacer commit, la lista declarativa de efectos del nuevo estado se ejecuta
+en segundo plano: mensaje en el chat, cierre de la conversación, envíos
+por WebSocket, push y sincronización con Spring Boot. Cada efecto se mide
+por separado (métrica booking.effect.<nombre>) y un error en uno no
+impide que corran los demás.
+
+El push se omite solo para quien ya recibió el mensaje del chat por
+WebSocket en esta misma transición: si el booking no tiene conversación
+o el fan-out se descartó, la notificación se envía siempre.
+"""
+import logging
+
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.shared.background import run_in_background
+from apps.shared.metrics import timed
+from apps.shared.realtime import deliver, fan_out, user_group
+from .models import Booking
+from .state_machine import booking_status_changed
+
+logger = logging.getLogger(__name__)
+
+
+def _participant_groups(conversation):
+    return {
+        user_group(user_id): user_id
+        for user_id in conversation.participants.values_list('user_id', flat=True)
+    }
+
+
+def send_booking_message_to_websocket(conversation, message):
+    """
+    Envía un mensaje de booking a través de WebSocket a todos los participantes.
+    Devuelve los ids de los participantes a los que se entregó.
+    Los errores se propagan al efecto (run_transition_effects los registra)
+    """
+    from apps.chat.protocol import message_event
+    from apps.chat.serializers import MessageSerializer
+
+    # Serializar una vez y enviar a todos los participantes en un solo fan-out
+    groups = _participant_groups(conversation)
+    delivered = deliver(groups, message_event(MessageSerializer(message).data))
+    logger.info(
+        'Mensaje de booking %s enviado por WebSocket a %s/%s participantes',
+        message.id, len(delivered), len(groups)
+    )
+    return {groups[group] for group in delivered}
+
+
+def send_conversation_closed_notification(conversation):
+    """
+    Envía notificación de cierre de conversación a través de WebSocket
+    """
+    from apps.chat.protocol import conversation_closed_event
+    from apps.chat.serializers import ConversationSerializer
+
+    groups = _participant_groups(conversation)
+    delivered = fan_out(groups, conversation_closed_event(ConversationSerializer(conversation).data))
+    logger.info(
+        'Cierre de la conversación %s enviado a %s/%s participantes',
+        conversation.id, delivered, len(groups)
+    )
+
+
+# Efectos
+
+def chat_message(action, content, close=False):
+    """
+    Efecto: mensaje de sistema en la conversación del booking (y cierre
+    opcional), enviado por WebSocket a los participantes. El mensaje lleva
+    como autor a quien hizo la transición; sin autor no se envía.
+    Deja en `booking._chat_delivered_to` los usuarios que lo recibieron
+    """
+    def effect(booking, actor_id):
+        from apps.chat.models import Conversation, Message
+        conversation = Conversation.objects.filter(booking=booking).first()
+        if not conversation or actor_id is None:
+            return
+        message = Message.objects.create(
+            conversation=conversation,
+            sender_id=actor_id,
+            message_type='booking_action',
+            booking_action=action,
+            content=content(booking) if callable(content) else content
+        )
+        conversation.last_message_at = timezone.now()
+        if close:
+            conversation.is_closed = True  # Cerrar conversación
+        conversation.save(update_fields=['last_message_at', 'is_closed'])
+
+        booking._chat_delivered_to = send_booking_message_to_websocket(conversation, message)
+        if close:
+            send_conversation_closed_notification(conversation)
+    effect.__name__ = 'chat_message'
+    return effect
+
+
+def push(recipient, title, message, notification_type):
+    """
+    Efecto: notificación push a `recipient` ('customer' o 'provider');
+    `message` recibe el booking y el usuario que hizo la transición
+    """
+    def effect(booking, actor_id):
+        from apps.notifications.services.firebase_service import send_push_notification
+        actor = booking.provider if actor_id == booking.provider_id else booking.customer
+        user_id = getattr(booking, f'{recipient}_id')
+        send_push_notification(
+            user_id=user_id,
+            title=title,
+            message=message(booking, actor),
+            data={
+                "type": notification_type,
+                "booking_id": str(booking.id)
+            },
+            # Omitir solo si el mensaje del chat de esta transición le llegó
+            # por WebSocket (y sigue conectado)
+            skip_if_online=user_id in getattr(booking, '_chat_delivered_to', ())
+        )
+    effect.__name__ = 'push'
+    return effect
+
+
+def springboot_sync(booking, actor_id):
+    """Efecto: notificaciones y reputación en Spring Boot"""
+    from .signals import _sync_status_with_springboot
+    _sync_status_with_springboot(booking)
+
+
+def _reason_text(booking):
+    return f" Razón: {booking.cancellation_reason}" if booking.cancellation_reason else ""
+
+
+def _rejection_message(booking):
+    return f'Solicitud rechazada.{_reason_text(booking)}'
+
+
+def _cancellation_message(booking):
+    # La cancelación por DELETE no lleva razón
+    return f'Servicio cancelado por el cliente.{_reason_text(booking)}'
+
+
+# Estado destino -> efectos, en orden de ejecución
+TRANSITION_EFFECTS = {
+    'accepted': [
+        chat_message('accepted', 'Solicitud aceptada. El servicio ha sido programado.'),
+        push(
+            'customer', "Reserva confirmada ✅",
+            lambda booking, actor: f"{actor.full_name} aceptó tu solicitud de {booking.service.title}",
+            "BOOKING_ACCEPTED"
+        ),
+        springboot_sync,
+    ],
+    'rejected_by_provider': [
+        chat_message('rejected', _rejection_message, close=True),
+        push(
+            'customer', "Reserva rechazada ❌",
+            lambda booking, actor: f"{actor.full_name} rechazó tu solicitud de {booking.service.title}",
+            "BOOKING_REJECTED"
+        ),
+        springboot_sync,
+    ],
+    'in_progress': [
+        chat_message('in_progress', 'Servicio iniciado. El proveedor ha comenzado el trabajo.'),
+        springboot_sync,
+    ],
+    'completed': [
+        chat_message('completed', 'Servicio completado. ¡Gracias por confiar en nosotros!', close=True),
+        push(
+            'customer', "Servicio completado 🎉",
+            lambda booking, actor: f"{actor.full_name} marcó el servicio como completado",
+            "BOOKING_COMPLETED"
+        ),
+        springboot_sync,
+    ],
+    'canceled': [
+        chat_message('canceled', _cancellation_message, close=True),
+        push(
+            'provider', "Reserva cancelada ⚠️",
+            lambda booking, actor: f"{actor.full_name} canceló la reserva de {booking.service.title}",
+            "BOOKING_CANCELLED"
+        ),
+        springboot_sync,
+    ],
+}
+
+
+def run_transition_effects(booking_id, status, actor_id):
+    """
+    Ejecutar los efectos de una transición ya confirmada (en segundo plano)
+    """
+    booking = Booking.objects.select_related('service').filter(id=booking_id).first()
+    if booking is None:
+        return
+
+    for effect in TRANSITION_EFFECTS.get(status, []):
+        try:
+            with timed(f'booking.effect.{status}.{effect.__name__}'):
+                effect(booking, actor_id)
+        except Exception:
+            logger.exception('Error en efecto %s del booking %s', effect.__name__, booking_id)
+
+
+@receiver(booking_status_changed, sender=Booking)
+def schedule_transition_effects(sender, booking, previous_status, status, actor_id=None, **kwargs):
+    """
+    Encolar los efectos de la transición para después del commit
+    """
+    if status in TRANSITION_EFFECTS:
+        run_in_background(run_transition_effects, booking.id, status, actor_id)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_booking_service_price'),
+        ('services', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='bookings_custome_b789e2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='bookings_provide_f84a5e_idx',
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente'), ('negotiating', 'En Negociación'), ('accepted', 'Aceptado'), ('in_progress', 'En Progreso'), ('completed', 'Completado'), ('canceled', 'Cancelado por Cliente'), ('rejected_by_provider', 'Rechazado por Proveedor')], default='pending', max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer_id', 'status', '-created_at'], name='bookings_custome_f56327_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['provider_id', 'status', '-created_at'], name='bookings_provide_b0ca36_idx'),
+        ),
+    ]
@@ -3,7 +3,7 @@ Modelos de reservas/bookings
 """
 from django.db import models
 from apps.services.models import Service
-from apps.users.models import User
+from apps.users.models import cached_user
 
 
 class Booking(models.Model):
@@ -45,21 +45,17 @@ class Booking(models.Model):
     class Meta:
         db_table = 'bookings'
         indexes = [
-            models.Index(fields=['customer_id', 'status']),
-            models.Index(fields=['provider_id', 'status']),
+            models.Index(fields=['customer_id', 'status', '-created_at']),
+            models.Index(fields=['provider_id', 'status', '-created_at']),
             models.Index(fields=['-created_at']),
         ]
     
     @property
     def customer(self):
-        try:
-            return User.objects.get(id=self.customer_id)
-        except User.DoesNotExist:
-            return None
+        """Cliente (se consulta una sola vez por instancia, ver attach_users)"""
+        return cached_user(self, 'customer', self.customer_id)
     
     @property
     def provider(self):
-        try:
-            return User.objects.get(id=self.provider_id)
-        except User.DoesNotExist:
-            return None
+        """Proveedor (se consulta una sola vez por instancia, ver attach_users)"""
+        return cached_user(self, 'provider', self.provider_id)
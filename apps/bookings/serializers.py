@@ -3,7 +3,10 @@ Serializers para el módulo de bookings
 """
 from rest_framework import serializers
 from .models import Booking
+from .state_machine import can_transition
+from apps.services.models import Service
 from apps.services.serializers import ServiceSerializer
+from apps.shared.serializers import DynamicFieldsMixin
 from apps.users.models import User
 
 
@@ -23,10 +26,36 @@ class ProviderSerializer(serializers.ModelSerializer):
         fields = ['id', 'full_name', 'email', 'phone_number']
 
 
-class BookingSerializer(serializers.ModelSerializer):
-    """Serializer completo para bookings"""
+class BookingServiceSerializer(serializers.ModelSerializer):
+    """
+    Servicio embebido en un booking (representación compacta): solo
+    columnas del servicio y su categoría, sin proveedor, imágenes,
+    favoritos ni conteos. El detalle completo está en /services/<id>/
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    average_rating = serializers.DecimalField(source='rating_avg', max_digits=3, decimal_places=2, read_only=True)
     
-    service = ServiceSerializer(read_only=True)
+    class Meta:
+        model = Service
+        fields = [
+            'id', 'title', 'price', 'location_type', 'category', 'category_name',
+            'provider_id', 'is_active', 'is_published', 'average_rating', 'reviews_count'
+        ]
+
+
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializer completo para bookings
+
+    El servicio se embebe en forma compacta; con ?expand=service se
+    devuelve el ServiceSerializer completo
+    """
+    
+    expandable_fields = {'service': ServiceSerializer}
+    select_related_fields = {'service': ['service__category']}
+    expanded_prefetch_fields = {'service': ['service__images']}
+    
+    service = BookingServiceSerializer(read_only=True)
     customer = CustomerSerializer(read_only=True)
     provider = ProviderSerializer(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -40,8 +69,9 @@ class BookingSerializer(serializers.ModelSerializer):
             'completed_at', 'canceled_at', 'cancellation_reason', 
             'created_at', 'updated_at'
         ]
+        # El estado solo cambia con las transiciones (state_machine.transition)
         read_only_fields = [
-            'id', 'customer_id', 'provider_id', 'accepted_at', 'in_progress_at',
+            'id', 'customer_id', 'provider_id', 'status', 'accepted_at', 'in_progress_at',
             'completed_at', 'canceled_at', 'created_at', 'updated_at'
         ]
     
@@ -57,7 +87,7 @@ class BookingSerializer(serializers.ModelSerializer):
         """Actualizar un booking existente"""
         # Solo permitir actualizar ciertos campos según el estado
         allowed_fields = ['booking_date', 'booking_time', 'booking_notes', 
-                         'customer_address', 'status', 'cancellation_reason']
+                         'customer_address', 'cancellation_reason']
         
         for attr, value in validated_data.items():
             if attr in allowed_fields:
@@ -67,8 +97,10 @@ class BookingSerializer(serializers.ModelSerializer):
         return instance
 
 
-class BookingListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listas de bookings"""
+class BookingListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer simplificado para listas de bookings (admite ?fields=)"""
+    
+    select_related_fields = {'service_title': ['service'], 'service_price': ['service']}
     
     service_title = serializers.CharField(source='service.title', read_only=True)
     service_price = serializers.DecimalField(source='service.price', max_digits=10, decimal_places=2, read_only=True)
@@ -120,19 +152,8 @@ class BookingStatusUpdateSerializer(serializers.ModelSerializer):
         instance = self.instance
         current_status = instance.status if instance else None
         
-        # Definir transiciones válidas
-        valid_transitions = {
-            'pending': ['accepted', 'rejected', 'canceled_by_customer'],
-            'negotiating': ['accepted', 'rejected', 'canceled_by_customer', 'canceled_by_provider'],
-            'accepted': ['in_progress', 'completed', 'canceled_by_customer', 'canceled_by_provider'],
-            'in_progress': ['completed', 'canceled_by_provider'],
-            'completed': [],  # Estado final
-            'canceled_by_customer': [],  # Estado final
-            'canceled_by_provider': [],  # Estado final
-            'rejected': []  # Estado final
-        }
-        
-        if current_status and value not in valid_transitions.get(current_status, []):
+        # Transiciones válidas definidas en la máquina de estados
+        if current_status and not can_transition(current_status, value):
             raise serializers.ValidationError(
                 f"No se puede cambiar de '{current_status}' a '{value}'"
             )
@@ -1,12 +1,123 @@
 """
 Signals para sincronización automática de bookings
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Booking
+from .state_machine import booking_status_changed
+from apps.users.models import ProviderStats, EarningsEntry
 from apps.shared.springboot_client import SpringBootClient
 
 
+def _completed_contribution(state):
+    """
+    Aporte de un booking a (completed_bookings, lifetime_revenue) del proveedor
+    """
+    if not state or state['status'] != 'completed':
+        return 0, 0
+    price = state['service_price']
+    if price is None:
+        price = state['service__price']
+    return 1, price or 0
+
+
+def _record_earnings(booking):
+    """
+    Registrar en el ledger el ingreso del booking completado (idempotente)
+    """
+    EarningsEntry.record(
+        provider_id=booking.provider_id,
+        booking_id=booking.id,
+        amount=booking.service_price or booking.service.price,
+        created_at=booking.completed_at
+    )
+
+
+def _stats_state(booking):
+    return {
+        'provider_id': booking.provider_id,
+        'status': booking.status,
+        'service_price': booking.service_price,
+        'service__price': booking.service.price if booking.service_price is None else None,
+    }
+
+
+@receiver(pre_save, sender=Booking)
+def track_booking_stats_state(sender, instance, **kwargs):
+    """
+    Guardar el estado previo relevante para las estadísticas del proveedor
+    """
+    instance._previous_stats_state = None
+    if instance.pk:
+        instance._previous_stats_state = Booking.objects.filter(pk=instance.pk).values(
+            'provider_id', 'status', 'service_price', 'service__price'
+        ).first()
+    # Solo un proveedor nuevo para el booking puede no tener fila todavía
+    previous = instance._previous_stats_state
+    if previous is None or previous['provider_id'] != instance.provider_id:
+        ProviderStats.ensure(instance.provider_id)
+
+
+@receiver(post_save, sender=Booking)
+def update_provider_stats_on_save(sender, instance, created, **kwargs):
+    """
+    Ajustar completed_bookings / lifetime_revenue cuando un booking entra
+    o sale del estado completed (o cambia su precio estando completado)
+    """
+    previous = getattr(instance, '_previous_stats_state', None)
+    if previous is None and instance.status != 'completed':
+        return
+    if previous and previous['status'] != 'completed' and instance.status != 'completed':
+        return
+    
+    old_count, old_revenue = _completed_contribution(previous)
+    new_count, new_revenue = _completed_contribution(_stats_state(instance))
+    
+    if previous and previous['provider_id'] != instance.provider_id:
+        ProviderStats.apply_delta(
+            previous['provider_id'], completed_bookings=-old_count, lifetime_revenue=-old_revenue
+        )
+        old_count, old_revenue = 0, 0
+    
+    ProviderStats.apply_delta(
+        instance.provider_id,
+        completed_bookings=new_count - old_count,
+        lifetime_revenue=new_revenue - old_revenue
+    )
+    
+    if instance.status == 'completed' and not (previous and previous['status'] == 'completed'):
+        _record_earnings(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def update_provider_stats_on_delete(sender, instance, **kwargs):
+    """
+    Descontar el booking eliminado si estaba completado
+    """
+    if instance.status != 'completed':
+        return
+    count, revenue = _completed_contribution(_stats_state(instance))
+    ProviderStats.apply_delta(
+        instance.provider_id, completed_bookings=-count, lifetime_revenue=-revenue
+    )
+
+
+@receiver(booking_status_changed, sender=Booking)
+def update_provider_stats_on_transition(sender, booking, previous_status, status, **kwargs):
+    """
+    Las transiciones de la máquina de estados no pasan por post_save:
+    contar aquí el booking que entra en completed (es un estado final) y
+    registrar su ingreso, en la misma transacción que el cambio de estado
+    """
+    if status != 'completed':
+        return
+    count, revenue = _completed_contribution(_stats_state(booking))
+    ProviderStats.apply_delta(
+        booking.provider_id, completed_bookings=count, lifetime_revenue=revenue
+    )
+    _record_earnings(booking)
+
+
 @receiver(post_save, sender=Booking)
 def on_booking_status_change(sender, instance, created, **kwargs):
     """
@@ -22,8 +133,15 @@ def on_booking_status_change(sender, instance, created, **kwargs):
             link_url=f'/bookings/{instance.id}',
             related_id=instance.id
         )
-    
-    elif instance.status == 'accepted':
+    else:
+        _sync_status_with_springboot(instance)
+
+
+def _sync_status_with_springboot(instance):
+    """
+    Notificaciones y reputación en Spring Boot según el estado del booking
+    """
+    if instance.status == 'accepted':
         # Booking aceptado - notificar al cliente
         SpringBootClient.create_notification(
             user_id=instance.customer_id,
@@ -0,0 +1,111 @@
+"""
+Máquina de estados de bookings
+
+Las transiciones bloquean la fila (SELECT ... FOR UPDATE), validan su
+estado real y lo cambian con un UPDATE condicional
+(WHERE id = ? AND status IN (...)): si dos peticiones compiten (p. ej.
+aceptar y cancelar a la vez) solo una actualiza la fila y la otra recibe
+InvalidTransition. Solo se escriben el estado, su timestamp y los campos
+extra de la transición, y `booking_status_changed` se emite una única vez
+por transición aplicada.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Booking
+
+
+# Estado actual -> estados a los que puede pasar
+VALID_TRANSITIONS = {
+    'pending': ['accepted', 'rejected_by_provider', 'canceled'],
+    'negotiating': ['accepted', 'rejected_by_provider', 'canceled'],
+    'accepted': ['in_progress', 'completed', 'canceled'],
+    'in_progress': ['completed', 'canceled'],
+    'completed': [],  # Estado final
+    'canceled': [],  # Estado final
+    'rejected_by_provider': [],  # Estado final
+}
+
+# Timestamp que se registra al entrar en cada estado
+STATUS_TIMESTAMPS = {
+    'accepted': 'accepted_at',
+    'in_progress': 'in_progress_at',
+    'completed': 'completed_at',
+    'canceled': 'canceled_at',
+    'rejected_by_provider': 'canceled_at',
+}
+
+# Se emite tras cada transición aplicada, dentro de la transacción.
+# Argumentos: booking, previous_status, status, actor_id (quién la hizo)
+booking_status_changed = Signal()
+
+
+class InvalidTransition(Exception):
+    """La transición no es válida desde el estado actual del booking"""
+
+    def __init__(self, current_status, new_status):
+        self.current_status = current_status
+        self.new_status = new_status
+        super().__init__(f"No se puede cambiar de '{current_status}' a '{new_status}'")
+
+
+def allowed_sources(new_status):
+    """Estados desde los que se puede llegar a `new_status`"""
+    return [
+        current for current, targets in VALID_TRANSITIONS.items()
+        if new_status in targets
+    ]
+
+
+def can_transition(current_status, new_status):
+    return new_status in VALID_TRANSITIONS.get(current_status, [])
+
+
+def transition(booking, new_status, from_statuses=None, actor_id=None, **fields):
+    """
+    Pasar `booking` a `new_status` si su estado en la base de datos está en
+    `from_statuses` (por defecto, todos los que permiten la transición).
+    `fields` son columnas extra a escribir (p. ej. cancellation_reason) y
+    `actor_id` el usuario que hace la transición (autor de los efectos).
+
+    Actualiza la instancia en memoria y devuelve el estado anterior leído
+    de la base de datos (no el de la instancia, que puede ser viejo); lanza
+    InvalidTransition (con el estado actual) si otra petición cambió antes
+    el booking o la transición no es válida.
+    """
+    sources = allowed_sources(new_status)
+    if from_statuses is not None:
+        sources = [status for status in from_statuses if status in sources]
+
+    now = timezone.now()
+    values = dict(fields, status=new_status, updated_at=now)
+    timestamp_field = STATUS_TIMESTAMPS.get(new_status)
+    if timestamp_field:
+        values[timestamp_field] = now
+
+    with transaction.atomic():
+        # Bloquear la fila y leer su estado real: la instancia en memoria
+        # puede estar desactualizada y no sirve como estado previo
+        previous_status = (
+            Booking.objects.select_for_update().filter(pk=booking.pk)
+            .values_list('status', flat=True).first()
+        )
+        if previous_status not in sources:
+            raise InvalidTransition(previous_status, new_status)
+
+        updated = Booking.objects.filter(pk=booking.pk, status__in=sources).update(**values)
+        if not updated:
+            raise InvalidTransition(previous_status, new_status)
+
+        for field, value in values.items():
+            setattr(booking, field, value)
+
+        booking_status_changed.send(
+            sender=Booking,
+            booking=booking,
+            previous_status=previous_status,
+            status=new_status,
+            actor_id=actor_id
+        )
+    return previous_status
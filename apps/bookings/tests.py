@@ -0,0 +1,303 @@
+"""
+Tests de los cambios de estado de bookings
+"""
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.chat.models import Conversation, ConversationParticipant, Message
+from apps.services.models import Service
+from apps.shared.metrics import snapshot
+from apps.shared.testing import (
+    UsersTableMixin, auth_header, create_user, mock_springboot, run_concurrently
+)
+from . import effects
+from .models import Booking
+from .state_machine import InvalidTransition, booking_status_changed, transition
+
+
+CUSTOMER_ID = 2
+PROVIDER_ID = 1
+
+
+class BookingDetailTransitionTests(UsersTableMixin, TestCase):
+    """PUT y DELETE de booking_detail pasan por la máquina de estados"""
+
+    def setUp(self):
+        mock_springboot(self)
+        create_user(PROVIDER_ID, role='PROVIDER')
+        create_user(CUSTOMER_ID)
+        self.service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+        self.booking = Booking.objects.create(
+            service=self.service, customer_id=CUSTOMER_ID, provider_id=PROVIDER_ID
+        )
+        self.url = f'/api/dashboard/bookings/{self.booking.id}/'
+
+        self.transitions = []
+        handler = lambda sender, **kwargs: self.transitions.append(
+            (kwargs['previous_status'], kwargs['status'], kwargs['actor_id'])
+        )
+        booking_status_changed.connect(handler, sender=Booking, weak=False)
+        self.addCleanup(booking_status_changed.disconnect, handler, sender=Booking)
+
+    def test_delete_cancels_through_the_state_machine(self):
+        response = self.client.delete(self.url, **auth_header(CUSTOMER_ID))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'canceled')
+        self.assertIsNotNone(self.booking.canceled_at)
+        self.assertEqual(self.transitions, [('pending', 'canceled', CUSTOMER_ID)])
+
+    def test_delete_of_a_final_booking_is_rejected(self):
+        Booking.objects.filter(pk=self.booking.pk).update(status='completed')
+
+        response = self.client.delete(self.url, **auth_header(CUSTOMER_ID))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).status, 'completed')
+        self.assertEqual(self.transitions, [])
+
+    def test_put_cannot_modify_final_bookings(self):
+        for final_status in ('completed', 'canceled', 'rejected_by_provider'):
+            Booking.objects.filter(pk=self.booking.pk).update(status=final_status)
+
+            response = self.client.put(
+                self.url, {'booking_notes': 'Tocar el timbre'},
+                content_type='application/json', **auth_header(CUSTOMER_ID)
+            )
+
+            self.assertEqual(response.status_code, 400, final_status)
+
+    def test_put_does_not_change_the_status(self):
+        response = self.client.put(
+            self.url, {'status': 'completed', 'booking_notes': 'Tocar el timbre'},
+            content_type='application/json', **auth_header(CUSTOMER_ID)
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'pending')
+        self.assertEqual(self.booking.booking_notes, 'Tocar el timbre')
+        self.assertEqual(self.transitions, [])
+
+
+class TransitionPreviousStatusTests(UsersTableMixin, TestCase):
+    """El estado previo sale de la base de datos, no de la instancia cargada"""
+
+    def setUp(self):
+        mock_springboot(self)
+        create_user(PROVIDER_ID, role='PROVIDER')
+        create_user(CUSTOMER_ID)
+        service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+        self.booking = Booking.objects.create(
+            service=service, customer_id=CUSTOMER_ID, provider_id=PROVIDER_ID
+        )
+
+        self.transitions = []
+        handler = lambda sender, **kwargs: self.transitions.append(
+            (kwargs['previous_status'], kwargs['status'])
+        )
+        booking_status_changed.connect(handler, sender=Booking, weak=False)
+        self.addCleanup(booking_status_changed.disconnect, handler, sender=Booking)
+
+    def test_stale_instance_reports_the_real_previous_status(self):
+        stale = Booking.objects.get(pk=self.booking.pk)
+        Booking.objects.filter(pk=self.booking.pk).update(status='accepted')
+
+        previous_status = transition(stale, 'canceled', actor_id=CUSTOMER_ID)
+
+        self.assertEqual(previous_status, 'accepted')
+        self.assertEqual(self.transitions, [('accepted', 'canceled')])
+        self.assertEqual(stale.status, 'canceled')
+
+    def test_stale_instance_cannot_skip_the_real_status(self):
+        stale = Booking.objects.get(pk=self.booking.pk)
+        Booking.objects.filter(pk=self.booking.pk).update(status='canceled')
+
+        with self.assertRaises(InvalidTransition) as raised:
+            transition(stale, 'accepted', ['pending'], actor_id=PROVIDER_ID)
+
+        self.assertEqual(raised.exception.current_status, 'canceled')
+        self.assertEqual(self.transitions, [])
+
+
+class ConcurrentTransitionTests(TransactionTestCase):
+    """Aceptar y cancelar a la vez: gana una sola transición y se emite una vez"""
+
+    ROUNDS = 30
+
+    def setUp(self):
+        mock_springboot(self)
+        # Los efectos (chat, push) no son parte de lo que se mide aquí
+        patcher = mock.patch('apps.bookings.effects.run_in_background')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+
+        self.transitions = []
+        handler = lambda sender, **kwargs: self.transitions.append(
+            (kwargs['booking'].pk, kwargs['previous_status'], kwargs['status'])
+        )
+        booking_status_changed.connect(handler, sender=Booking, weak=False)
+        self.addCleanup(booking_status_changed.disconnect, handler, sender=Booking)
+
+    def test_accept_and_cancel_race(self):
+        def apply(booking_id, new_status, from_statuses, actor_id):
+            # Cada hilo con su propia instancia, como dos peticiones distintas
+            booking = Booking.objects.get(pk=booking_id)
+            transition(booking, new_status, from_statuses, actor_id=actor_id)
+
+        for _ in range(self.ROUNDS):
+            booking = Booking.objects.create(
+                service=self.service, customer_id=CUSTOMER_ID, provider_id=PROVIDER_ID
+            )
+
+            errors = run_concurrently(apply, [
+                (booking.pk, 'accepted', ['pending'], PROVIDER_ID),
+                (booking.pk, 'canceled', ['pending'], CUSTOMER_ID),
+            ])
+
+            booking.refresh_from_db()
+            self.assertIn(booking.status, ('accepted', 'canceled'))
+            # La perdedora ve el estado que dejó la ganadora
+            self.assertEqual(len(errors), 1, errors)
+            self.assertIsInstance(errors[0], InvalidTransition)
+            self.assertEqual(errors[0].current_status, booking.status)
+            emitted = [t for t in self.transitions if t[0] == booking.pk]
+            self.assertEqual(emitted, [(booking.pk, 'pending', booking.status)])
+
+
+class BookingsListCountTests(UsersTableMixin, TestCase):
+    """El listado respeta ?count= también para el conteo por estado"""
+
+    url = '/api/dashboard/bookings/'
+
+    def setUp(self):
+        mock_springboot(self)
+        create_user(PROVIDER_ID, role='PROVIDER')
+        create_user(CUSTOMER_ID)
+        service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+        for booking_status in ('pending', 'pending', 'accepted'):
+            Booking.objects.create(
+                service=service, customer_id=CUSTOMER_ID, provider_id=PROVIDER_ID,
+                status=booking_status
+            )
+
+    def test_exact_count_comes_from_the_status_facet(self):
+        response = self.client.get(self.url, {'status': 'pending'}, **auth_header(CUSTOMER_ID))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['status_counts'], {'pending': 2, 'accepted': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['bookings']), 2)
+
+    def test_count_none_skips_the_status_facet(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'count': 'none'}, **auth_header(CUSTOMER_ID))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(response.data['count'])
+        self.assertIsNone(response.data['status_counts'])
+        self.assertEqual(len(response.data['bookings']), 3)
+        sql = [query['sql'].upper() for query in queries.captured_queries]
+        self.assertFalse([q for q in sql if 'GROUP BY' in q or 'COUNT(' in q], sql)
+
+    def test_invalid_count_mode_is_rejected(self):
+        response = self.client.get(self.url, {'count': 'todo'}, **auth_header(CUSTOMER_ID))
+
+        self.assertEqual(response.status_code, 400)
+
+
+def _errors(name):
+    return snapshot().get(name, {}).get('errors', 0)
+
+
+class TransitionEffectsTests(UsersTableMixin, TestCase):
+    """Un efecto que falla no impide que corran los demás y queda en su métrica"""
+
+    def setUp(self):
+        self.springboot = mock_springboot(self)
+        create_user(PROVIDER_ID, role='PROVIDER')
+        create_user(CUSTOMER_ID)
+        service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+        self.booking = Booking.objects.create(
+            service=service, customer_id=CUSTOMER_ID, provider_id=PROVIDER_ID, status='accepted'
+        )
+        self.conversation = Conversation.objects.create(booking=self.booking, service_id=service.id)
+        for user_id in (CUSTOMER_ID, PROVIDER_ID):
+            ConversationParticipant.objects.create(conversation=self.conversation, user_id=user_id)
+
+        patcher = mock.patch(
+            'apps.notifications.services.firebase_service.send_push_notification', return_value=True
+        )
+        self.send_push = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failing_effect_does_not_stop_the_others(self):
+        calls = []
+
+        def first(booking, actor_id):
+            calls.append('first')
+
+        def failing(booking, actor_id):
+            raise RuntimeError('caído')
+
+        def last(booking, actor_id):
+            calls.append('last')
+
+        errors_before = _errors('booking.effect.accepted.failing')
+        with mock.patch.dict(effects.TRANSITION_EFFECTS, {'accepted': [first, failing, last]}):
+            effects.run_transition_effects(self.booking.id, 'accepted', PROVIDER_ID)
+
+        self.assertEqual(calls, ['first', 'last'])
+        self.assertEqual(_errors('booking.effect.accepted.failing'), errors_before + 1)
+        self.assertEqual(_errors('booking.effect.accepted.first'), 0)
+
+    def test_websocket_error_is_recorded_and_push_still_runs(self):
+        errors_before = _errors('booking.effect.accepted.chat_message')
+        with mock.patch.object(effects, '_participant_groups', side_effect=RuntimeError('sin canal')):
+            effects.run_transition_effects(self.booking.id, 'accepted', PROVIDER_ID)
+
+        # El mensaje se guardó; el error del envío llega a la métrica del efecto
+        self.assertTrue(Message.objects.filter(
+            conversation=self.conversation, booking_action='accepted'
+        ).exists())
+        self.assertEqual(_errors('booking.effect.accepted.chat_message'), errors_before + 1)
+        self.send_push.assert_called_once()
+        self.assertEqual(self.send_push.call_args.kwargs['user_id'], CUSTOMER_ID)
+        self.assertFalse(self.send_push.call_args.kwargs['skip_if_online'])
+
+    def test_push_is_skipped_only_after_websocket_delivery(self):
+        effects.run_transition_effects(self.booking.id, 'accepted', PROVIDER_ID)
+
+        self.send_push.assert_called_once()
+        self.assertTrue(self.send_push.call_args.kwargs['skip_if_online'])
+
+    def test_push_is_sent_when_the_fan_out_is_dropped(self):
+        with mock.patch.object(effects, 'deliver', return_value=set()):
+            effects.run_transition_effects(self.booking.id, 'accepted', PROVIDER_ID)
+
+        self.assertFalse(self.send_push.call_args.kwargs['skip_if_online'])
+
+    def test_push_is_sent_when_the_booking_has_no_conversation(self):
+        # Bookings creados por bookings_list_create no tienen conversación
+        self.conversation.delete()
+
+        effects.run_transition_effects(self.booking.id, 'accepted', PROVIDER_ID)
+
+        self.send_push.assert_called_once()
+        self.assertFalse(self.send_push.call_args.kwargs['skip_if_online'])
@@ -5,15 +5,14 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from django.utils import timezone
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.db.models import Q, Count
 
 from conectaya.authentication.decorators import jwt_required_drf
-from apps.users.models import User
+from apps.shared.pagination import KeysetPagination
+from apps.users.models import User, attach_users
 from apps.services.models import Service
 from .models import Booking
+from .state_machine import transition, InvalidTransition, VALID_TRANSITIONS
 from .serializers import (
     BookingSerializer, BookingListSerializer, BookingCreateSerializer,
     BookingStatusUpdateSerializer
@@ -21,77 +20,27 @@ from .serializers import (
 from apps.notifications.services.firebase_service import send_push_notification
 
 
-def send_booking_message_to_websocket(conversation, message):
-    """
-    Envía un mensaje de booking a través de WebSocket a todos los participantes
-    """
-    try:
-        from apps.chat.serializers import MessageSerializer
-        
-        channel_layer = get_channel_layer()
-        if not channel_layer:
-            print("Channel layer not configured")
-            return
-        
-        # Serializar el mensaje
-        message_data = MessageSerializer(message).data
-        
-        # Obtener participantes de la conversación
-        participants = conversation.participants.all()
-        
-        # Enviar a cada participante
-        for participant in participants:
-            async_to_sync(channel_layer.group_send)(
-                f'user_{participant.user_id}',
-                {
-                    'type': 'new_message',
-                    'message': message_data
-                }
-            )
-        
-        print(f"Booking message sent via WebSocket to {len(participants)} participants")
-    except Exception as e:
-        print(f"Error sending booking message via WebSocket: {e}")
+
+def _get_booking(booking_id):
+    """Booking con su servicio y categoría en una sola consulta (o 404)"""
+    return get_object_or_404(Booking.objects.select_related('service__category'), id=booking_id)
 
 
-def send_conversation_closed_notification(conversation):
+def _booking_data(request, booking):
     """
-    Envía notificación de cierre de conversación a través de WebSocket
+    Serializar un booking para la respuesta: cliente y proveedor en una
+    sola consulta y el servicio compacto salvo ?expand=service
     """
-    try:
-        from apps.chat.serializers import ConversationSerializer
-        
-        channel_layer = get_channel_layer()
-        if not channel_layer:
-            print("Channel layer not configured")
-            return
-        
-        # Serializar la conversación
-        conversation_data = ConversationSerializer(conversation).data
-        
-        # Obtener participantes de la conversación
-        participants = conversation.participants.all()
-        
-        # Enviar a cada participante
-        for participant in participants:
-            async_to_sync(channel_layer.group_send)(
-                f'user_{participant.user_id}',
-                {
-                    'type': 'conversation_closed',
-                    'conversation': conversation_data
-                }
-            )
-        
-        print(f"Conversation closed notification sent to {len(participants)} participants")
-    except Exception as e:
-        print(f"Error sending conversation closed notification: {e}")
+    attach_users([booking], customer='customer_id', provider='provider_id')
+    return BookingSerializer(booking, context={'request': request}).data
 
 
 @api_view(['GET', 'POST'])
 @jwt_required_drf
 def bookings_list_create(request):
     """
-    GET: Lista bookings del usuario autenticado
+    GET: Lista bookings del usuario autenticado (paginada por cursor, con
+         conteo por estado en status_counts)
     POST: Crea un nuevo booking
     """
     try:
@@ -112,17 +61,49 @@ def bookings_list_create(request):
                     Q(customer_id=user_id) | Q(provider_id=user_id)
                 )
             
+            try:
+                count_mode = KeysetPagination.get_count_mode(request)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Conteo por estado en una sola consulta agrupada (antes del
+            # filtro), salvo que el cliente no quiera conteos (?count=none)
+            status_counts = None
+            if count_mode != 'none':
+                status_counts = {
+                    row['status']: row['total']
+                    for row in bookings.order_by().values('status').annotate(total=Count('id'))
+                }
+            
             # Filtros adicionales
             status_filter = request.GET.get('status')
+            count = None
             if status_filter:
                 bookings = bookings.filter(status=status_filter)
+                if status_counts is not None:
+                    count = status_counts.get(status_filter, 0)
+            elif status_counts is not None:
+                count = sum(status_counts.values())
+            
+            # Paginación por cursor sobre (created_at, id)
+            paginator = KeysetPagination()
+            context = {'request': request}
+            try:
+                page = paginator.paginate_queryset(
+                    BookingListSerializer.setup_queryset(bookings, context), request, count=count
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
-            bookings = bookings.order_by('-created_at')
-            serializer = BookingListSerializer(bookings, many=True)
+            # Clientes y proveedores de toda la página en una sola consulta
+            attach_users(page, customer='customer_id', provider='provider_id')
+            
+            serializer = BookingListSerializer(page, many=True, context=context)
             
             return Response({
                 'bookings': serializer.data,
-                'count': bookings.count()
+                'status_counts': status_counts,
+                **paginator.get_pagination_data()
             }, status=status.HTTP_200_OK)
         
         elif request.method == 'POST':
@@ -157,7 +138,7 @@ def bookings_list_create(request):
                 )
                 
                 return Response(
-                    BookingSerializer(booking).data,
+                    _booking_data(request, booking),
                     status=status.HTTP_201_CREATED
                 )
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -179,7 +160,7 @@ def booking_detail(request, booking_id):
     """
     try:
         user_id = request.jwt_user_id
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = _get_booking(booking_id)
         
         # Verificar permisos (solo participantes pueden ver/modificar)
         if user_id not in [booking.customer_id, booking.provider_id]:
@@ -189,12 +170,11 @@ def booking_detail(request, booking_id):
             )
         
         if request.method == 'GET':
-            serializer = BookingSerializer(booking)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(_booking_data(request, booking), status=status.HTTP_200_OK)
         
         elif request.method == 'PUT':
             # Solo permitir actualizar ciertos campos según el rol y estado
-            if booking.status in ['completed', 'canceled_by_customer', 'canceled_by_provider', 'rejected']:
+            if not VALID_TRANSITIONS.get(booking.status):
                 return Response(
                     {'error': 'No se puede modificar un booking finalizado'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -204,7 +184,7 @@ def booking_detail(request, booking_id):
             if serializer.is_valid():
                 booking = serializer.save()
                 return Response(
-                    BookingSerializer(booking).data,
+                    _booking_data(request, booking),
                     status=status.HTTP_200_OK
                 )
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -217,16 +197,17 @@ def booking_detail(request, booking_id):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            if booking.status not in ['pending', 'negotiating', 'accepted']:
+            try:
+                transition(
+                    booking, 'canceled', from_statuses=['pending', 'negotiating', 'accepted'],
+                    actor_id=user_id
+                )
+            except InvalidTransition:
                 return Response(
                     {'error': 'No se puede cancelar este booking'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            booking.status = 'canceled_by_customer'
-            booking.canceled_at = timezone.now()
-            booking.save()
-            
             return Response(
                 {'message': 'Booking cancelado correctamente'},
                 status=status.HTTP_200_OK
@@ -247,67 +228,26 @@ def booking_accept(request, booking_id):
     """
     try:
         user_id = request.jwt_user_id
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = _get_booking(booking_id)
         
-        print(f"DEBUG: booking_accept called for booking_id={booking_id}, user_id={user_id}")
-        print(f"DEBUG: booking.provider_id={booking.provider_id}, booking.status={booking.status}")
-
         # Solo el proveedor puede aceptar
         if user_id != booking.provider_id:
-            print("DEBUG: Permission denied - user is not provider")
             return Response(
                 {'error': 'Solo el proveedor puede aceptar la solicitud'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status != 'pending':
-            print(f"DEBUG: Invalid status - {booking.status}")
+        # UPDATE condicional: si otra petición cambió el estado, no se aplica
+        try:
+            transition(booking, 'accepted', from_statuses=['pending'], actor_id=user_id)
+        except InvalidTransition:
             return Response(
                 {'error': 'Solo se pueden aceptar solicitudes pendientes'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'accepted'
-        booking.accepted_at = timezone.now()
-        booking.save()
-        
-        # Enviar mensaje al chat
-        try:
-            from apps.chat.models import Conversation, Message
-            conversation = Conversation.objects.filter(booking=booking).first()
-            if conversation:
-                message = Message.objects.create(
-                    conversation=conversation,
-                    sender_id=user_id,
-                    message_type='booking_action',
-                    booking_action='accepted',
-                    content='Solicitud aceptada. El servicio ha sido programado.'
-                )
-                conversation.last_message_at = timezone.now()
-                conversation.save()
-                
-                # Enviar por WebSocket en tiempo real
-                send_booking_message_to_websocket(conversation, message)
-        except Exception as e:
-            print(f"Error sending chat message: {e}")
-        
-        # 🔥 Enviar notificación push al cliente
-        try:
-            provider = User.objects.get(id=user_id)
-            send_push_notification(
-                user_id=booking.customer_id,
-                title="Reserva confirmada ✅",
-                message=f"{provider.full_name} aceptó tu solicitud de {booking.service.title}",
-                data={
-                    "type": "BOOKING_ACCEPTED",
-                    "booking_id": str(booking.id)
-                }
-            )
-        except Exception as e:
-            print(f"Error sending push notification: {e}")
-        
         return Response(
-            BookingSerializer(booking).data,
+            _booking_data(request, booking),
             status=status.HTTP_200_OK
         )
         
@@ -326,7 +266,7 @@ def booking_reject(request, booking_id):
     """
     try:
         user_id = request.jwt_user_id
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = _get_booking(booking_id)
         
         # Solo el proveedor puede rechazar
         if user_id != booking.provider_id:
@@ -335,59 +275,19 @@ def booking_reject(request, booking_id):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status != 'pending':
+        try:
+            transition(
+                booking, 'rejected_by_provider', from_statuses=['pending'], actor_id=user_id,
+                cancellation_reason=request.data.get('reason', '')
+            )
+        except InvalidTransition:
             return Response(
                 {'error': 'Solo se pueden rechazar solicitudes pendientes'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'rejected_by_provider'
-        booking.cancellation_reason = request.data.get('reason', '')
-        booking.canceled_at = timezone.now()
-        booking.save()
-        
-        # Enviar mensaje al chat y cerrar conversación
-        try:
-            from apps.chat.models import Conversation, Message
-            conversation = Conversation.objects.filter(booking=booking).first()
-            if conversation:
-                reason_text = f" Razón: {booking.cancellation_reason}" if booking.cancellation_reason else ""
-                message = Message.objects.create(
-                    conversation=conversation,
-                    sender_id=user_id,
-                    message_type='booking_action',
-                    booking_action='rejected',
-                    content=f'Solicitud rechazada.{reason_text}'
-                )
-                conversation.last_message_at = timezone.now()
-                conversation.is_closed = True  # Cerrar conversación
-                conversation.save()
-                
-                # Enviar por WebSocket en tiempo real
-                send_booking_message_to_websocket(conversation, message)
-                
-                # Notificar cierre de conversación
-                send_conversation_closed_notification(conversation)
-        except Exception as e:
-            print(f"Error sending chat message: {e}")
-        
-        # 🔥 Enviar notificación push al cliente
-        try:
-            provider = User.objects.get(id=user_id)
-            send_push_notification(
-                user_id=booking.customer_id,
-                title="Reserva rechazada ❌",
-                message=f"{provider.full_name} rechazó tu solicitud de {booking.service.title}",
-                data={
-                    "type": "BOOKING_REJECTED",
-                    "booking_id": str(booking.id)
-                }
-            )
-        except Exception as e:
-            print(f"Error sending push notification: {e}")
-        
         return Response(
-            BookingSerializer(booking).data,
+            _booking_data(request, booking),
             status=status.HTTP_200_OK
         )
         
@@ -406,7 +306,7 @@ def booking_start(request, booking_id):
     """
     try:
         user_id = request.jwt_user_id
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = _get_booking(booking_id)
         
         # Solo el proveedor puede iniciar
         if user_id != booking.provider_id:
@@ -415,38 +315,16 @@ def booking_start(request, booking_id):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status != 'accepted':
+        try:
+            transition(booking, 'in_progress', from_statuses=['accepted'], actor_id=user_id)
+        except InvalidTransition:
             return Response(
                 {'error': 'Solo se pueden iniciar servicios aceptados'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'in_progress'
-        booking.in_progress_at = timezone.now()
-        booking.save()
-        
-        # Enviar mensaje al chat
-        try:
-            from apps.chat.models import Conversation, Message
-            conversation = Conversation.objects.filter(booking=booking).first()
-            if conversation:
-                message = Message.objects.create(
-                    conversation=conversation,
-                    sender_id=user_id,
-                    message_type='booking_action',
-                    booking_action='in_progress',
-                    content='Servicio iniciado. El proveedor ha comenzado el trabajo.'
-                )
-                conversation.last_message_at = timezone.now()
-                conversation.save()
-                
-                # Enviar por WebSocket en tiempo real
-                send_booking_message_to_websocket(conversation, message)
-        except Exception as e:
-            print(f"Error sending chat message: {e}")
-        
         return Response(
-            BookingSerializer(booking).data,
+            _booking_data(request, booking),
             status=status.HTTP_200_OK
         )
         
@@ -465,86 +343,25 @@ def booking_complete(request, booking_id):
     """
     try:
         user_id = request.jwt_user_id
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = _get_booking(booking_id)
         
-        print(f"DEBUG: booking_complete called for booking_id={booking_id}, user_id={user_id}")
-        print(f"DEBUG: booking.provider_id={booking.provider_id}, booking.status={booking.status}")
-
         # Solo el proveedor puede completar
         if user_id != booking.provider_id:
-            print("DEBUG: Permission denied - user is not provider")
             return Response(
                 {'error': 'Solo el proveedor puede completar el servicio'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        if booking.status not in ['accepted', 'in_progress']:
-            print(f"DEBUG: Invalid status - {booking.status}")
+        try:
+            transition(booking, 'completed', from_statuses=['accepted', 'in_progress'], actor_id=user_id)
+        except InvalidTransition:
             return Response(
                 {'error': 'Solo se pueden completar servicios aceptados o en progreso'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'completed'
-        booking.completed_at = timezone.now()
-        booking.save()
-        
-        # Enviar mensaje al chat y cerrar conversación
-        try:
-            from apps.chat.models import Conversation, Message
-            conversation = Conversation.objects.filter(booking=booking).first()
-            if conversation:
-                message = Message.objects.create(
-                    conversation=conversation,
-                    sender_id=user_id,
-                    message_type='booking_action',
-                    booking_action='completed',
-                    content='Servicio completado. ¡Gracias por confiar en nosotros!'
-                )
-                conversation.last_message_at = timezone.now()
-                conversation.is_closed = True  # Cerrar conversación
-                conversation.save()
-                
-                # Enviar por WebSocket en tiempo real
-                send_booking_message_to_websocket(conversation, message)
-                
-                # Notificar cierre de conversación
-                send_conversation_closed_notification(conversation)
-        except Exception as e:
-            print(f"Error sending chat message: {e}")
-        
-        # 🔥 Enviar notificación push al cliente
-        try:
-            provider = User.objects.get(id=user_id)
-            send_push_notification(
-                user_id=booking.customer_id,
-                title="Servicio completado 🎉",
-                message=f"{provider.full_name} marcó el servicio como completado",
-                data={
-                    "type": "BOOKING_COMPLETED",
-                    "booking_id": str(booking.id)
-                }
-            )
-        except Exception as e:
-            print(f"Error sending push notification: {e}")
-        
-        # Incrementar ganancias del proveedor
-        from apps.users.models import UserProfile
-        try:
-            provider_profile = UserProfile.objects.get(user_id=user_id)
-            # Usar el precio guardado en el booking o el precio actual del servicio
-            price = booking.service_price or booking.service.price
-            if price:
-                provider_profile.add_earnings(price)
-        except UserProfile.DoesNotExist:
-            # Crear perfil si no existe
-            provider_profile = UserProfile.objects.create(user_id=user_id)
-            price = booking.service_price or booking.service.price
-            if price:
-                provider_profile.add_earnings(price)
-        
         return Response(
-            BookingSerializer(booking).data,
+            _booking_data(request, booking),
             status=status.HTTP_200_OK
         )
         
@@ -563,7 +380,7 @@ def booking_cancel(request, booking_id):
     """
     try:
         user_id = request.jwt_user_id
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = _get_booking(booking_id)
         
         # Solo el cliente puede cancelar
         if user_id != booking.customer_id:
@@ -572,13 +389,6 @@ def booking_cancel(request, booking_id):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Solo se puede cancelar si está pending, accepted o in_progress
-        if booking.status not in ['pending', 'accepted', 'in_progress']:
-            return Response(
-                {'error': 'No se puede cancelar este servicio en su estado actual'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Obtener razón (obligatoria)
         cancellation_reason = request.data.get('reason', '').strip()
         if not cancellation_reason:
@@ -587,52 +397,20 @@ def booking_cancel(request, booking_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        booking.status = 'canceled'
-        booking.cancellation_reason = cancellation_reason
-        booking.canceled_at = timezone.now()
-        booking.save()
-        
-        # Enviar mensaje al chat y cerrar conversación
-        try:
-            from apps.chat.models import Conversation, Message
-            conversation = Conversation.objects.filter(booking=booking).first()
-            if conversation:
-                message = Message.objects.create(
-                    conversation=conversation,
-                    sender_id=user_id,
-                    message_type='booking_action',
-                    booking_action='canceled',
-                    content=f'Servicio cancelado por el cliente. Razón: {cancellation_reason}'
-                )
-                conversation.last_message_at = timezone.now()
-                conversation.is_closed = True  # Cerrar conversación
-                conversation.save()
-                
-                # Enviar por WebSocket en tiempo real
-                send_booking_message_to_websocket(conversation, message)
-                
-                # Notificar cierre de conversación
-                send_conversation_closed_notification(conversation)
-        except Exception as e:
-            print(f"Error sending chat message: {e}")
-        
-        # 🔥 Enviar notificación push al proveedor
+        # Solo se puede cancelar si está pending, accepted o in_progress
         try:
-            client = User.objects.get(id=user_id)
-            send_push_notification(
-                user_id=booking.provider_id,
-                title="Reserva cancelada ⚠️",
-                message=f"{client.full_name} canceló la reserva de {booking.service.title}",
-                data={
-                    "type": "BOOKING_CANCELLED",
-                    "booking_id": str(booking.id)
-                }
+            transition(
+                booking, 'canceled', from_statuses=['pending', 'accepted', 'in_progress'], actor_id=user_id,
+                cancellation_reason=cancellation_reason
+            )
+        except InvalidTransition:
+            return Response(
+                {'error': 'No se puede cancelar este servicio en su estado actual'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except Exception as e:
-            print(f"Error sending push notification: {e}")
         
         return Response(
-            BookingSerializer(booking).data,
+            _booking_data(request, booking),
             status=status.HTTP_200_OK
         )
         
@@ -3,14 +3,17 @@ WebSocket consumers para el sistema de chat
 """
 import json
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from conectaya.authentication.jwt_utils import JWTUtils
 from apps.users.models import User
-from apps.chat.models import Conversation, Message
+from apps.chat.models import Conversation
 from apps.chat.serializers import MessageSerializer
-from django.utils import timezone
+from apps.shared.realtime import group_send_many, user_group
+from apps.chat import presence, replay, protocol, services
 
 logger = logging.getLogger(__name__)
 
@@ -45,16 +48,26 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        # Aceptar conexión
-        await self.accept()
+        # Aceptar conexión (con frames MessagePack si el cliente lo pide)
+        self.binary = protocol.MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=protocol.MSGPACK_SUBPROTOCOL if self.binary else None)
+        
+        # Registrar presencia (una entrada por conexión/dispositivo)
+        await sync_to_async(presence.touch)(self.user.id, self.channel_name)
         
         logger.info(f"Usuario {self.user.id} conectado al WebSocket")
         
         # Enviar confirmación de conexión
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'connection_established',
             'message': 'Conectado al chat en tiempo real'
-        }))
+        })
+        
+        # Reenviar lo perdido desde el último mensaje recibido, si el cliente lo indica
+        query_params = parse_qs(self.scope.get('query_string', b'').decode('utf-8'))
+        last_seen = query_params.get('last_seen_message_id', [None])[0]
+        if last_seen is not None:
+            await self.handle_sync({'last_seen_message_id': last_seen})
 
     async def disconnect(self, close_code):
         """
@@ -66,25 +79,35 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.user_group_name,
                 self.channel_name
             )
+            await sync_to_async(presence.disconnect)(self.user.id, self.channel_name)
             logger.info(f"Usuario {self.user.id} desconectado del WebSocket")
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """
-        Manejar mensajes recibidos del WebSocket
+        Manejar mensajes recibidos del WebSocket (JSON o MessagePack)
         """
         try:
-            data = json.loads(text_data)
+            if bytes_data is not None:
+                data = protocol.unpack(bytes_data)
+            else:
+                data = json.loads(text_data)
             message_type = data.get('type')
             
             if message_type == 'chat_message':
                 await self.handle_chat_message(data.get('data', {}))
             elif message_type == 'typing':
                 await self.handle_typing(data.get('data', {}))
+            elif message_type == 'heartbeat':
+                await self.handle_heartbeat()
+            elif message_type == 'sync':
+                await self.handle_sync(data.get('data', {}))
+            elif message_type == 'ack':
+                await self.handle_ack(data.get('data', {}))
             else:
                 logger.warning(f"Tipo de mensaje desconocido: {message_type}")
                 
-        except json.JSONDecodeError:
-            logger.error("Error decodificando mensaje JSON")
+        except (json.JSONDecodeError, ValueError):
+            logger.error("Error decodificando mensaje del WebSocket")
             await self.send_error("Formato de mensaje inválido")
         except Exception as e:
             logger.error(f"Error procesando mensaje WebSocket: {e}")
@@ -96,11 +119,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         chat_id = data.get('chat_id')
         content = data.get('content')
+        idempotency_key = data.get('idempotency_key')
         
         if not chat_id or not content:
             await self.send_error("chat_id y content son requeridos")
             return
         
+        if idempotency_key is not None and (
+            not isinstance(idempotency_key, str) or len(idempotency_key) > 64
+        ):
+            await self.send_error("idempotency_key debe ser un texto de hasta 64 caracteres")
+            return
+        
         try:
             # Verificar que la conversación existe y el usuario tiene acceso
             conversation = await self.get_conversation(chat_id)
@@ -108,23 +138,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 await self.send_error("Conversación no encontrada")
                 return
             
-            # Crear el mensaje
-            message = await self.create_message(conversation, content)
+            # Crear y serializar el mensaje (un solo salto al pool de hilos)
+            message_data, participant_ids, created = await self.create_message(
+                conversation, content, idempotency_key
+            )
             
-            # Serializar mensaje
-            message_data = await self.serialize_message(message)
+            if not created:
+                # Reintento: el mensaje ya se envió, solo confirmarlo a esta conexión
+                await self.new_message(protocol.message_event(message_data))
+                return
             
             # Enviar mensaje a ambos participantes
-            participants = await self.get_conversation_participants(conversation)
-            
-            for participant in participants:
-                await self.channel_layer.group_send(
-                    f'user_{participant.id}',
-                    {
-                        'type': 'new_message',
-                        'message': message_data
-                    }
-                )
+            await group_send_many(
+                [user_group(participant_id) for participant_id in participant_ids],
+                protocol.message_event(message_data),
+                channel_layer=self.channel_layer
+            )
                 
             logger.info(f"Mensaje enviado en conversación {chat_id}")
             
@@ -149,10 +178,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 return
             
             # Obtener el otro participante
-            other_participant = await self.get_other_participant(conversation)
-            if other_participant:
+            other_participant_id = await self.get_other_participant_id(conversation)
+            if other_participant_id:
                 await self.channel_layer.group_send(
-                    f'user_{other_participant.id}',
+                    user_group(other_participant_id),
                     {
                         'type': 'typing_indicator',
                         'conversation_id': chat_id,
@@ -164,50 +193,129 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error manejando typing: {e}")
 
+    async def handle_heartbeat(self):
+        """
+        Renovar la presencia de esta conexión (el cliente lo envía cada
+        ~25 s, por debajo de presence.PRESENCE_TTL)
+        """
+        await sync_to_async(presence.touch)(self.user.id, self.channel_name)
+        await self.send_frame({'type': 'heartbeat_ack'})
+
+    async def handle_sync(self, data):
+        """
+        Reenviar los mensajes posteriores a last_seen_message_id (o al último
+        ack del usuario). Si has_more es true, el cliente vuelve a pedir
+        desde el último id recibido
+        """
+        last_seen = data.get('last_seen_message_id')
+        try:
+            if last_seen is None:
+                last_seen = await sync_to_async(replay.get_ack)(self.user.id)
+                if last_seen is None:
+                    await self.send_error("last_seen_message_id es requerido")
+                    return
+            last_seen = int(last_seen)
+        except (TypeError, ValueError):
+            await self.send_error("last_seen_message_id inválido")
+            return
+        
+        try:
+            messages_data, has_more = await self.get_missed_messages(last_seen)
+        except Exception as e:
+            logger.error(f"Error reenviando mensajes: {e}")
+            await self.send_error("Error sincronizando mensajes")
+            return
+        
+        compact_data = None
+        if self.binary:
+            compact_data = {
+                'm': [protocol.compact_message(message) for message in messages_data],
+                'more': has_more
+            }
+        await self.send_frame({
+            'type': 'missed_messages',
+            'data': {
+                'messages': messages_data,
+                'has_more': has_more
+            }
+        }, compact_data=compact_data)
+
+    async def handle_ack(self, data):
+        """
+        Confirmar la recepción de mensajes hasta message_id
+        """
+        try:
+            message_id = int(data.get('message_id'))
+        except (TypeError, ValueError):
+            return
+        await sync_to_async(replay.store_ack)(self.user.id, message_id)
+
     async def new_message(self, event):
         """
         Enviar nuevo mensaje al WebSocket
         """
-        await self.send(text_data=json.dumps({
+        if self.binary and 'packed' in event:
+            # Frame compacto ya codificado en el fan-out
+            await self.send(bytes_data=event['packed'])
+            return
+        await self.send_frame({
             'type': 'new_message',
             'data': event['message']
-        }))
+        }, compact_data=protocol.compact_message(event['message']))
 
     async def typing_indicator(self, event):
         """
         Enviar indicador de escritura al WebSocket
         """
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'typing',
             'data': {
                 'conversation_id': event['conversation_id'],
                 'user_id': event['user_id'],
                 'is_typing': event['is_typing']
             }
-        }))
+        }, compact_data={
+            'c': event['conversation_id'],
+            'u': event['user_id'],
+            'y': event['is_typing']
+        })
 
     async def conversation_closed(self, event):
         """
         Enviar notificación de conversación cerrada al WebSocket
         """
-        await self.send(text_data=json.dumps({
+        if self.binary and 'packed' in event:
+            await self.send(bytes_data=event['packed'])
+            return
+        await self.send_frame({
             'type': 'conversation_closed',
             'data': event['conversation']
-        }))
+        })
 
     async def send_error(self, message):
         """
         Enviar mensaje de error al WebSocket
         """
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'error',
             'message': message
-        }))
+        })
+
+    async def send_frame(self, frame, compact_data=None):
+        """
+        Enviar un frame en el formato negociado: JSON de texto o, con el
+        subprotocolo MessagePack, binario con claves cortas
+        """
+        if self.binary:
+            await self.send(bytes_data=protocol.encode(frame, binary=True, compact_data=compact_data))
+        else:
+            await self.send(text_data=protocol.encode(frame))
 
-    # Métodos de base de datos (síncronos convertidos a asíncronos)
+    # Métodos de base de datos: ORM async nativo donde alcanza, y un solo
+    # database_sync_to_async por operación para el resto (transacciones y
+    # serializers de DRF, que son síncronos)
     
-    @database_sync_to_async
-    def authenticate_user(self, token):
+    async def authenticate_user(self, token):
         """
         Autenticar usuario usando JWT token
         """
@@ -217,82 +325,47 @@ class ChatConsumer(AsyncWebsocketConsumer):
         try:
             user_id = JWTUtils.get_user_id_from_token(token)
             if user_id:
-                return User.objects.get(id=user_id)
+                return await User.objects.aget(id=user_id)
         except (User.DoesNotExist, Exception) as e:
             logger.error(f"Error autenticando usuario: {e}")
         
         return AnonymousUser()
 
-    @database_sync_to_async
-    def get_conversation(self, conversation_id):
+    async def get_conversation(self, conversation_id):
         """
-        Obtener conversación por ID
+        Obtener conversación por ID, solo si el usuario participa en ella
         """
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            # Verificar que el usuario tiene acceso a esta conversación
-            participant = conversation.participants.filter(user_id=self.user.id).first()
-            if participant:
-                return conversation
-        except Conversation.DoesNotExist:
-            pass
-        return None
-
+        return await Conversation.objects.filter(
+            id=conversation_id,
+            participants__user_id=self.user.id
+        ).afirst()
 
     @database_sync_to_async
-    def create_message(self, conversation, content):
+    def create_message(self, conversation, content, idempotency_key=None):
         """
-        Crear nuevo mensaje
+        Crear el mensaje (o recuperar el original si es un reintento con la
+        misma clave) y serializarlo. Devuelve (datos, user_id de los
+        participantes, creado)
         """
-        from datetime import timedelta
-        
-        message = Message.objects.create(
-            conversation=conversation,
-            sender_id=self.user.id,
-            content=content
+        message, participant_ids, created = services.create_message(
+            conversation, self.user.id, idempotency_key=idempotency_key, content=content
         )
-        
-        # Actualizar timestamp de la conversación
-        conversation.last_message_at = timezone.now()
-        conversation.save()
-        
-        # Incrementar contador de no leídos para otros participantes y reactivar chat si estaba eliminado
-        other_participants = conversation.participants.exclude(user_id=self.user.id)
-        for other_participant in other_participants:
-            other_participant.unread_count += 1
-            # Reactivar chat si estaba eliminado (soft delete)
-            # y limpiar historial para que solo se vean mensajes nuevos
-            if other_participant.deleted_at:
-                other_participant.deleted_at = None
-                # Establecer cleared_at justo antes del mensaje actual para que este mensaje SÍ se vea
-                # pero los mensajes anteriores no
-                other_participant.cleared_at = message.created_at - timedelta(seconds=1)
-            other_participant.save()
-        
-        return message
-
-    @database_sync_to_async
-    def serialize_message(self, message):
-        """
-        Serializar mensaje para envío
-        """
-        serializer = MessageSerializer(message)
-        return serializer.data
+        return MessageSerializer(message).data, participant_ids, created
 
     @database_sync_to_async
-    def get_conversation_participants(self, conversation):
+    def get_missed_messages(self, last_seen_message_id):
         """
-        Obtener todos los participantes de la conversación
+        Mensajes perdidos ya serializados y si quedan más
         """
-        participants = conversation.participants.all()
-        return [p.user for p in participants if p.user]
+        messages, has_more = replay.missed_messages(self.user.id, last_seen_message_id)
+        # Los clientes binarios no reciben el usuario anidado: no se consulta
+        context = {'fields': list(protocol.COMPACT_MESSAGE_KEYS)} if self.binary else {}
+        return MessageSerializer(messages, many=True, context=context).data, has_more
 
-    @database_sync_to_async
-    def get_other_participant(self, conversation):
+    async def get_other_participant_id(self, conversation):
         """
-        Obtener el otro participante de la conversación
+        Obtener el user_id del otro participante de la conversación
         """
-        participants = conversation.participants.exclude(user_id=self.user.id)
-        if participants.exists():
-            return participants.first().user
-        return None
+        return await conversation.participants.exclude(
+            user_id=self.user.id
+        ).values_list('user_id', flat=True).afirst()
@@ -0,0 +1,334 @@
+"""
+Prueba de carga del chat en tiempo real (WebSocket + channel layer)
+
+Abre muchas conexiones WebSocket autenticadas con JWT firmados localmente
+(settings.JWT_SECRET_KEY), publica eventos new_message en los grupos
+user_<id> a un ritmo fijo y mide:
+
+- conexiones por segundo y conexiones fallidas
+- latencia del fan-out (p50/p99/máx) desde group_send hasta que el cliente
+  recibe el frame
+- memoria (RSS) por conexión
+
+Por defecto todo corre en este proceso: los clientes hablan con el
+consumer vía ASGI (sin red) y el channel layer es el de settings o el que
+se elija con --layer (memory = InMemoryChannelLayer, un solo nodo; redis =
+channels_redis contra --redis-url, p. ej. un Redis local). Con --url los
+clientes se conectan por red a un nodo Daphne (requiere el paquete
+websockets) y los eventos se publican en el channel layer que use ese nodo;
+con --server-pid se mide la memoria de ese proceso.
+
+Los eventos no se guardan en la base de datos: solo se leen los usuarios.
+
+Uso:
+    python manage.py chat_load_test --connections 500 --messages 2000 --rate 500
+    python manage.py chat_load_test --layer redis --redis-url redis://localhost:6379/1
+    python manage.py chat_load_test --url ws://localhost:8000/ws/chat/ --server-pid 1234
+"""
+import asyncio
+import importlib.util
+import itertools
+import json
+import os
+import resource
+import time
+from collections import Counter
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.shared.realtime import user_group
+from apps.users.models import User
+
+
+CHAT_PATH = '/ws/chat/'
+TOKEN_LIFETIME = 3600  # segundos
+
+
+def _mint_token(user_id):
+    """Access token equivalente al que emite Spring Boot"""
+    now = int(time.time())
+    payload = {'sub': str(user_id), 'userId': user_id, 'iat': now, 'exp': now + TOKEN_LIFETIME}
+    return jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm='HS256')
+
+
+def _rss_kb(pid=None):
+    """Memoria residente del proceso en KB (por defecto, este proceso)"""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/status") as status_file:
+            for line in status_file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if pid:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+class InProcessClient:
+    """Cliente WebSocket que habla con el consumer por ASGI, sin red"""
+
+    def __init__(self, application, token):
+        from channels.testing import WebsocketCommunicator
+        self.communicator = WebsocketCommunicator(application, f'{CHAT_PATH}?token={token}')
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise ConnectionError('Conexión rechazada')
+
+    async def receive(self):
+        return await self.communicator.receive_from(timeout=3600)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class RemoteClient:
+    """Cliente WebSocket por red contra un nodo Daphne"""
+
+    def __init__(self, url, token):
+        self.url = f'{url}?token={token}'
+        self.connection = None
+
+    async def connect(self):
+        import websockets
+        self.connection = await websockets.connect(self.url, max_size=None)
+
+    async def receive(self):
+        return await self.connection.recv()
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga del WebSocket del chat: tasa de conexión, latencia de fan-out y memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200, help='Conexiones simultáneas')
+        parser.add_argument('--messages', type=int, default=1000, help='Eventos a publicar')
+        parser.add_argument('--rate', type=float, default=200, help='Eventos publicados por segundo')
+        parser.add_argument(
+            '--connect-concurrency', type=int, default=50,
+            help='Conexiones abriéndose a la vez'
+        )
+        parser.add_argument(
+            '--users', type=str,
+            help='IDs de usuario separados por comas (por defecto, usuarios activos de la base de datos)'
+        )
+        parser.add_argument(
+            '--layer', choices=['settings', 'memory', 'redis'], default='settings',
+            help='Channel layer para el modo en proceso y para publicar'
+        )
+        parser.add_argument('--redis-url', type=str, help='Redis para --layer redis (por defecto REDIS_URL)')
+        parser.add_argument('--url', type=str, help='URL ws:// de un nodo Daphne (modo por red)')
+        parser.add_argument('--server-pid', type=int, help='PID del nodo para medir su memoria')
+        parser.add_argument(
+            '--drain-timeout', type=float, default=10,
+            help='Segundos de espera por entregas pendientes al final'
+        )
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['messages'] < 0 or options['rate'] <= 0:
+            raise CommandError('--connections y --rate deben ser positivos y --messages no negativo')
+        if options['url']:
+            if importlib.util.find_spec('websockets') is None:
+                raise CommandError('--url requiere el paquete websockets (pip install websockets)')
+
+        user_ids = self._user_ids(options)
+        self._configure_layer(options)
+        report = asyncio.run(self._run(options, user_ids))
+        self._print_report(report, options)
+
+    def _user_ids(self, options):
+        if options['users']:
+            try:
+                user_ids = [int(value) for value in options['users'].split(',') if value.strip()]
+            except ValueError:
+                raise CommandError('--users debe ser una lista de enteros separados por comas')
+        else:
+            user_ids = list(
+                User.objects.filter(is_active=True)
+                .order_by('id')
+                .values_list('id', flat=True)[:options['connections']]
+            )
+        if not user_ids:
+            raise CommandError('No hay usuarios para abrir conexiones')
+        return user_ids
+
+    def _configure_layer(self, options):
+        if options['layer'] == 'settings':
+            return
+        from channels.layers import channel_layers
+
+        if options['layer'] == 'memory':
+            if options['url']:
+                raise CommandError('--layer memory solo sirve en modo en proceso (sin --url)')
+            config = {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+        else:
+            config = {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {'hosts': [options['redis_url'] or settings.REDIS_URL]},
+            }
+        settings.CHANNEL_LAYERS = {'default': config}
+        channel_layers.backends = {}
+
+    def _make_client_factory(self, options):
+        if options['url']:
+            return lambda token: RemoteClient(options['url'], token)
+
+        from conectaya.authentication.websocket_middleware import JWTAuthMiddlewareStack
+        from channels.routing import URLRouter
+        from conectaya.routing import websocket_urlpatterns
+
+        # Misma pila que conectaya.asgi sin la validación de Origin
+        application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        return lambda token: InProcessClient(application, token)
+
+    async def _run(self, options, user_ids):
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            raise CommandError('No hay channel layer configurado')
+
+        make_client = self._make_client_factory(options)
+        tokens = {user_id: _mint_token(user_id) for user_id in user_ids}
+        assignments = list(itertools.islice(itertools.cycle(user_ids), options['connections']))
+        memory_pid = options['server_pid'] if options['url'] else None
+        memory_before = _rss_kb(memory_pid)
+
+        # Conexiones
+        clients = []
+        failures = Counter()
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+
+        async def open_connection(user_id):
+            client = make_client(tokens[user_id])
+            async with semaphore:
+                try:
+                    await client.connect()
+                    await client.receive()  # connection_established
+                    clients.append((user_id, client))
+                except Exception as e:
+                    failures[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(open_connection(user_id) for user_id in assignments))
+        connect_seconds = time.perf_counter() - start
+        memory_after = _rss_kb(memory_pid)
+
+        # Lectores: latencia desde la publicación hasta la recepción
+        latencies = []
+        connected = Counter(user_id for user_id, _ in clients)
+
+        async def read(client):
+            while True:
+                try:
+                    frame = json.loads(await client.receive())
+                except Exception:
+                    return
+                data = frame.get('data') or {}
+                if frame.get('type') == 'new_message' and 'load_test_sent_at' in data:
+                    latencies.append((time.time() - data['load_test_sent_at']) * 1000)
+
+        readers = [asyncio.ensure_future(read(client)) for _, client in clients]
+
+        # Publicación a ritmo fijo, repartida entre los usuarios conectados
+        targets = itertools.cycle(sorted(connected) or [None])
+        expected = 0
+        interval = 1 / options['rate']
+        publish_start = time.perf_counter()
+        for sequence in range(options['messages'] if connected else 0):
+            user_id = next(targets)
+            await channel_layer.group_send(user_group(user_id), {
+                'type': 'new_message',
+                'message': {
+                    'id': -sequence,
+                    'content': 'load test',
+                    'load_test_sent_at': time.time()
+                }
+            })
+            expected += connected[user_id]
+            delay = publish_start + (sequence + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        publish_seconds = time.perf_counter() - publish_start
+
+        deadline = time.perf_counter() + options['drain_timeout']
+        while len(latencies) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        deliver_seconds = time.perf_counter() - publish_start
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*(client.close() for _, client in clients), return_exceptions=True)
+
+        memory_per_connection = None
+        if clients and memory_before is not None and memory_after is not None:
+            memory_per_connection = (memory_after - memory_before) / len(clients)
+
+        return {
+            'users': len(user_ids),
+            'requested': options['connections'],
+            'connected': len(clients),
+            'failures': failures,
+            'connect_seconds': connect_seconds,
+            'published': options['messages'] if connected else 0,
+            'publish_seconds': publish_seconds,
+            'expected': expected,
+            'delivered': len(latencies),
+            'deliver_seconds': deliver_seconds,
+            'latencies': latencies,
+            'memory_per_connection': memory_per_connection,
+        }
+
+    def _print_report(self, report, options):
+        write = self.stdout.write
+        mode = f"red ({options['url']})" if options['url'] else 'en proceso'
+        write(f"Modo: {mode}, channel layer: {options['layer']}, usuarios: {report['users']}")
+
+        rate = report['connected'] / report['connect_seconds'] if report['connect_seconds'] else 0
+        write(
+            f"Conexiones: {report['connected']}/{report['requested']} en "
+            f"{report['connect_seconds']:.2f}s ({rate:.0f}/s)"
+        )
+        if report['failures']:
+            detail = ', '.join(f'{name}: {count}' for name, count in report['failures'].items())
+            write(self.style.WARNING(f'Fallidas: {detail}'))
+
+        if report['published']:
+            throughput = report['delivered'] / report['deliver_seconds'] if report['deliver_seconds'] else 0
+            write(
+                f"Eventos: {report['published']} publicados en {report['publish_seconds']:.2f}s, "
+                f"{report['delivered']}/{report['expected']} entregas ({throughput:.0f}/s)"
+            )
+            latencies = report['latencies']
+            if latencies:
+                write(
+                    f"Latencia de fan-out: p50 {_percentile(latencies, 50):.1f}ms, "
+                    f"p99 {_percentile(latencies, 99):.1f}ms, máx {max(latencies):.1f}ms"
+                )
+            if report['delivered'] < report['expected']:
+                write(self.style.WARNING(
+                    f"{report['expected'] - report['delivered']} entregas no llegaron en "
+                    f"{options['drain_timeout']}s"
+                ))
+
+        if report['memory_per_connection'] is not None:
+            scope = 'nodo' if options['url'] else 'proceso (clientes y servidor)'
+            write(f"Memoria por conexión ({scope}): {report['memory_per_connection']:.1f} KB")
+
+        self.stdout.write(self.style.SUCCESS('Prueba de carga terminada'))
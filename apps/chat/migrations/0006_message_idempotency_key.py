@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_is_closed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('conversation', 'sender_id', 'idempotency_key'), name='unique_message_idempotency_key'),
+        ),
+    ]
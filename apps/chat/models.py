@@ -3,7 +3,7 @@ Modelos de chat
 """
 from django.db import models
 from apps.bookings.models import Booking
-from apps.users.models import User
+from apps.users.models import User, cached_user
 
 
 class Conversation(models.Model):
@@ -84,16 +84,25 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Clave generada por el cliente para reintentos: el mismo envío (REST o
+    # WebSocket) devuelve el mensaje original en lugar de duplicarlo
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    
     class Meta:
         db_table = 'messages'
         indexes = [
             models.Index(fields=['conversation', '-created_at']),
             models.Index(fields=['sender_id']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['conversation', 'sender_id', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_message_idempotency_key'
+            ),
+        ]
     
     @property
     def sender(self):
-        try:
-            return User.objects.get(id=self.sender_id)
-        except User.DoesNotExist:
-            return None
+        """Autor del mensaje (se consulta una sola vez por instancia, ver attach_users)"""
+        return cached_user(self, 'sender', self.sender_id)
@@ -0,0 +1,93 @@
+"""
+Presencia de usuarios en el chat (quién tiene un WebSocket abierto)
+
+Cada conexión se guarda en un sorted set por usuario
+(presence:user:<id>, miembro = channel_name, score = último heartbeat),
+así un usuario con varios dispositivos sigue en línea mientras alguno
+esté conectado. Una conexión cuenta como activa si su heartbeat es más
+reciente que PRESENCE_TTL; las que quedaron colgadas (p. ej. un worker
+que murió sin desconectar) caducan solas. presence:last_seen guarda la
+última actividad de cada usuario.
+
+Si Redis no está disponible todos se consideran desconectados: en ese
+caso se siguen enviando las notificaciones push.
+"""
+import time
+
+from redis import RedisError
+
+from apps.shared.redis_client import get_redis, mark_redis_down
+
+# Segundos sin heartbeat tras los que una conexión deja de contar
+PRESENCE_TTL = 60
+
+USER_KEY = 'presence:user:{user_id}'
+LAST_SEEN_KEY = 'presence:last_seen'
+
+
+def _user_key(user_id):
+    return USER_KEY.format(user_id=user_id)
+
+
+def touch(user_id, connection_id):
+    """
+    Registrar una conexión (al conectar) o renovarla (en cada heartbeat)
+    """
+    now = time.time()
+    key = _user_key(user_id)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.zadd(key, {connection_id: now})
+        pipe.zremrangebyscore(key, '-inf', now - PRESENCE_TTL)
+        pipe.expire(key, PRESENCE_TTL * 2)
+        pipe.zadd(LAST_SEEN_KEY, {user_id: now})
+        pipe.execute()
+    except RedisError as e:
+        mark_redis_down(e)
+
+
+def disconnect(user_id, connection_id):
+    """
+    Quitar una conexión; el usuario sigue en línea si tiene otras
+    """
+    try:
+        pipe = get_redis().pipeline()
+        pipe.zrem(_user_key(user_id), connection_id)
+        pipe.zadd(LAST_SEEN_KEY, {user_id: time.time()})
+        pipe.execute()
+    except RedisError as e:
+        mark_redis_down(e)
+
+
+def get_presence(user_ids):
+    """
+    Estado de varios usuarios en una sola ida a Redis:
+    {user_id: {'online': bool, 'last_seen': timestamp o None}}
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    presence = {user_id: {'online': False, 'last_seen': None} for user_id in user_ids}
+    if not user_ids:
+        return presence
+
+    cutoff = time.time() - PRESENCE_TTL
+    try:
+        pipe = get_redis().pipeline()
+        for user_id in user_ids:
+            pipe.zcount(_user_key(user_id), f'({cutoff}', '+inf')
+            pipe.zscore(LAST_SEEN_KEY, user_id)
+        results = pipe.execute()
+    except RedisError as e:
+        mark_redis_down(e)
+        return presence
+
+    for index, user_id in enumerate(user_ids):
+        connections, last_seen = results[2 * index], results[2 * index + 1]
+        presence[user_id] = {'online': connections > 0, 'last_seen': last_seen}
+    return presence
+
+
+def is_online(user_id):
+    """
+    True si el usuario tiene al menos un WebSocket activo
+    """
+    return get_presence([user_id])[user_id]['online']
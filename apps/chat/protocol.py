@@ -0,0 +1,94 @@
+"""
+Formato de los frames del WebSocket del chat
+
+Por defecto los frames son JSON de texto: {"type": ..., "data": ...}.
+Si el cliente pide el subprotocolo MSGPACK_SUBPROTOCOL al conectar, los
+frames son binarios MessagePack con claves cortas: {"t": tipo, "d": datos}.
+En ese formato los mensajes van compactos (COMPACT_MESSAGE_KEYS): sin el
+usuario anidado ni message_type_display, el cliente resuelve el autor por
+sender_id desde su cache de usuarios.
+
+Para new_message y conversation_closed el frame compacto se codifica una
+sola vez al hacer el fan-out (campo 'packed' del evento) y cada conexión
+binaria lo reenvía tal cual.
+"""
+import json
+
+import msgpack
+
+MSGPACK_SUBPROTOCOL = 'conectaya.msgpack.v1'
+
+# Campo del MessageSerializer -> clave en el frame compacto
+COMPACT_MESSAGE_KEYS = {
+    'id': 'i',
+    'conversation_id': 'c',
+    'sender_id': 's',
+    'message_type': 'mt',
+    'content': 'b',
+    'file_id': 'f',
+    'booking_action': 'a',
+    'is_read': 'r',
+    'created_at': 'at',
+    'idempotency_key': 'k',
+}
+
+
+def compact_message(message_data):
+    """Mensaje serializado -> dict con claves cortas (sin campos redundantes)"""
+    return {
+        short: message_data[field]
+        for field, short in COMPACT_MESSAGE_KEYS.items()
+        if field in message_data
+    }
+
+
+def pack(event_type, data=None):
+    """Frame MessagePack {'t': tipo, 'd': datos}"""
+    frame = {'t': event_type}
+    if data is not None:
+        frame['d'] = data
+    return msgpack.packb(frame, use_bin_type=True)
+
+
+def unpack(frame):
+    """
+    Frame MessagePack recibido del cliente -> dict con las mismas claves
+    que el formato JSON ({'type': ..., 'data': ...})
+    """
+    data = msgpack.unpackb(frame, raw=False)
+    if not isinstance(data, dict):
+        raise ValueError('El frame debe ser un mapa')
+    return {'type': data.get('t'), 'data': data.get('d') or {}}
+
+
+def encode(frame, binary=False, compact_data=None):
+    """
+    Codificar un frame de salida ({'type': ..., 'data'/'message': ...}) en el
+    formato de la conexión. En binario, `compact_data` reemplaza a los datos
+    (p. ej. mensajes compactos)
+    """
+    if not binary:
+        return json.dumps(frame)
+    data = compact_data if compact_data is not None else frame.get('data', frame.get('message'))
+    return pack(frame['type'], data)
+
+
+def message_event(message_data):
+    """
+    Evento del channel layer para un mensaje nuevo, con el frame binario ya
+    codificado para todas las conexiones MessagePack
+    """
+    return {
+        'type': 'new_message',
+        'message': message_data,
+        'packed': pack('new_message', compact_message(message_data)),
+    }
+
+
+def conversation_closed_event(conversation_data):
+    """Evento del channel layer para el cierre de una conversación"""
+    return {
+        'type': 'conversation_closed',
+        'conversation': conversation_data,
+        'packed': pack('conversation_closed', {'i': conversation_data['id'], 'x': True}),
+    }
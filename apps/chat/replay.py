@@ -0,0 +1,180 @@
+"""
+Reenvío de mensajes perdidos al reconectar el WebSocket
+
+Cada mensaje creado se anota (solo su id) en un stream de Redis por
+participante (chat:events:user:<id>), recortado a STREAM_MAXLEN entradas.
+Al reconectar, el cliente indica el último mensaje que recibió
+(last_seen_message_id) y se le reenvían solo los posteriores:
+
+- si el stream cubre el hueco (es válido desde antes de
+  last_seen_message_id y su entrada más antigua no es posterior), los ids
+  salen del stream y los mensajes se leen por clave primaria;
+- si no (buffer recortado, caducado, con escrituras perdidas o Redis
+  caído), se consulta la base de datos por keyset (id > last_seen_message_id)
+  sobre las conversaciones del usuario.
+
+Cada stream tiene una marca "válido desde" (chat:events:valid:user:<id>):
+el primer mensaje anotado desde que el stream está completo. Si una
+escritura falla, el stream de esos usuarios deja de ser confiable; como
+Redis puede no estar disponible en ese momento, el proceso recuerda a los
+usuarios afectados y borra su stream y su marca en su siguiente operación
+con Redis (anotar o leer un stream): el stream vuelve a empezar desde el
+siguiente mensaje y, mientras tanto, se lee desde la base de datos.
+
+El cliente también puede confirmar lo que recibió (ack); el último id
+confirmado se usa cuando pide sincronizar sin indicar desde dónde.
+"""
+import threading
+
+from django.db.models import F, Q
+from redis import RedisError
+
+from apps.shared.redis_client import get_redis, mark_redis_down
+from apps.users.models import attach_users
+from .models import Message
+
+STREAM_KEY = 'chat:events:user:{user_id}'
+VALID_SINCE_KEY = 'chat:events:valid:user:{user_id}'
+ACK_KEY = 'chat:ack:user:{user_id}'
+
+# Entradas máximas del stream por usuario (recorte aproximado de Redis)
+STREAM_MAXLEN = 500
+
+# Segundos sin actividad tras los que se borra el stream y el ack
+STREAM_TTL = 7 * 24 * 3600
+
+# Mensajes máximos por respuesta de reenvío (el cliente pide más con has_more)
+REPLAY_LIMIT = 100
+
+# Guardar ARGV[1] en KEYS[1] solo si es mayor que el valor actual (atómico)
+STORE_ACK_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# Usuarios con escrituras perdidas cuyo stream aún no se pudo invalidar
+_lost_writes = set()
+_lost_writes_lock = threading.Lock()
+
+
+def _invalidate_lost_writes(pipe):
+    """
+    Agregar al pipeline el borrado de los streams con escrituras perdidas;
+    devuelve los usuarios incluidos (para olvidarlos si el pipeline se ejecuta)
+    """
+    with _lost_writes_lock:
+        lost = set(_lost_writes)
+    for user_id in lost:
+        pipe.delete(STREAM_KEY.format(user_id=user_id), VALID_SINCE_KEY.format(user_id=user_id))
+    return lost
+
+
+def _forget_lost_writes(user_ids):
+    with _lost_writes_lock:
+        _lost_writes.difference_update(user_ids)
+
+
+def record_message(message_id, user_ids):
+    """
+    Anotar un mensaje nuevo en el stream de cada participante. Si falla,
+    esos streams se invalidan en la siguiente operación que llegue a Redis
+    """
+    try:
+        pipe = get_redis().pipeline()
+        lost = _invalidate_lost_writes(pipe)
+        for user_id in user_ids:
+            key = STREAM_KEY.format(user_id=user_id)
+            valid_since_key = VALID_SINCE_KEY.format(user_id=user_id)
+            pipe.xadd(key, {'message_id': message_id}, maxlen=STREAM_MAXLEN, approximate=True)
+            # Un stream nuevo (o recién invalidado) es completo desde este mensaje
+            pipe.set(valid_since_key, message_id, nx=True)
+            pipe.expire(key, STREAM_TTL)
+            pipe.expire(valid_since_key, STREAM_TTL)
+        pipe.execute()
+    except RedisError as e:
+        mark_redis_down(e)
+        with _lost_writes_lock:
+            _lost_writes.update(user_ids)
+        return
+    _forget_lost_writes(lost)
+
+
+def store_ack(user_id, message_id):
+    """
+    Guardar el último mensaje confirmado por el cliente (solo avanza; la
+    comparación y la escritura se hacen en Redis en un solo paso)
+    """
+    key = ACK_KEY.format(user_id=user_id)
+    try:
+        client = get_redis()
+        client.eval(STORE_ACK_SCRIPT, 1, key, message_id, STREAM_TTL)
+    except RedisError as e:
+        mark_redis_down(e)
+
+
+def get_ack(user_id):
+    """Último mensaje confirmado por el usuario, o None"""
+    try:
+        value = get_redis().get(ACK_KEY.format(user_id=user_id))
+    except RedisError as e:
+        mark_redis_down(e)
+        return None
+    return int(value) if value is not None else None
+
+
+def _buffered_ids(user_id, last_seen_message_id):
+    """
+    Ids posteriores a last_seen_message_id según el stream, o None si el
+    stream no alcanza a cubrir el hueco
+    """
+    try:
+        pipe = get_redis().pipeline()
+        lost = _invalidate_lost_writes(pipe)
+        pipe.get(VALID_SINCE_KEY.format(user_id=user_id))
+        pipe.xrange(STREAM_KEY.format(user_id=user_id))
+        valid_since, entries = pipe.execute()[-2:]
+    except RedisError as e:
+        mark_redis_down(e)
+        return None
+    _forget_lost_writes(lost)
+    # Sin marca (invalidado o anterior a ella) o empezado después de
+    # last_seen_message_id: puede faltar algún mensaje del hueco
+    if valid_since is None or int(valid_since) > last_seen_message_id:
+        return None
+    ids = [int(fields[b'message_id']) for _, fields in entries]
+    # Entrada más antigua posterior a last_seen_message_id: el recorte pudo
+    # haber quitado mensajes del hueco
+    if not ids or min(ids) > last_seen_message_id:
+        return None
+    return sorted({message_id for message_id in ids if message_id > last_seen_message_id})
+
+
+def missed_messages(user_id, last_seen_message_id, limit=REPLAY_LIMIT):
+    """
+    Mensajes de las conversaciones del usuario con id > last_seen_message_id,
+    en orden, como máximo `limit`. Devuelve (mensajes, has_more)
+    """
+    # Misma condición sobre el mismo participante: es del usuario y el
+    # mensaje es posterior a su vaciado de historial
+    messages = Message.objects.filter(
+        Q(conversation__participants__cleared_at__isnull=True)
+        | Q(created_at__gt=F('conversation__participants__cleared_at')),
+        conversation__participants__user_id=user_id,
+        id__gt=last_seen_message_id,
+    )
+
+    buffered = _buffered_ids(user_id, last_seen_message_id)
+    if buffered is not None:
+        if not buffered:
+            return [], False
+        messages = messages.filter(id__in=buffered[:limit + 1])
+
+    messages = list(messages.select_related('conversation').order_by('id')[:limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    attach_users(messages, sender='sender_id')
+    return messages, has_more
@@ -5,6 +5,7 @@ from rest_framework import serializers
 from .models import Conversation, ConversationParticipant, Message
 from apps.bookings.models import Booking
 from apps.users.models import User
+from apps.shared.serializers import DynamicFieldsMixin
 
 
 class UserBasicSerializer(serializers.ModelSerializer):
@@ -49,8 +50,8 @@ class ConversationParticipantSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'unread_count', 'last_read_at']
 
 
-class MessageSerializer(serializers.ModelSerializer):
-    """Serializer completo para mensajes"""
+class MessageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer completo para mensajes (admite ?fields=)"""
     
     sender = UserBasicSerializer(read_only=True)
     message_type_display = serializers.CharField(source='get_message_type_display', read_only=True)
@@ -61,9 +62,9 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'conversation', 'conversation_id', 'sender_id', 'sender', 'message_type',
             'message_type_display', 'content', 'file_id', 'booking_action',
-            'is_read', 'created_at'
+            'is_read', 'created_at', 'idempotency_key'
         ]
-        read_only_fields = ['id', 'sender_id', 'is_read', 'created_at']
+        read_only_fields = ['id', 'sender_id', 'is_read', 'created_at', 'idempotency_key']
     
     def validate(self, data):
         """Validaciones personalizadas"""
@@ -90,7 +91,7 @@ class MessageCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Message
-        fields = ['message_type', 'content', 'file_id', 'booking_action']
+        fields = ['message_type', 'content', 'file_id', 'booking_action', 'idempotency_key']
     
     def validate_message_type(self, value):
         """Validar tipo de mensaje"""
@@ -119,8 +120,13 @@ class MessageListSerializer(serializers.ModelSerializer):
         ]
 
 
-class ConversationSerializer(serializers.ModelSerializer):
-    """Serializer completo para conversaciones"""
+class ConversationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer completo para conversaciones (admite ?fields=)"""
+    
+    select_related_fields = {
+        'booking': ['booking__service'], 'booking_service_title': ['booking__service'],
+    }
+    prefetch_related_fields = {'participants': ['participants']}
     
     booking = BookingBasicSerializer(read_only=True)
     participants = ConversationParticipantSerializer(many=True, read_only=True)
@@ -150,8 +156,13 @@ class ConversationSerializer(serializers.ModelSerializer):
         return None
 
 
-class ConversationListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listas de conversaciones"""
+class ConversationListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer simplificado para listas de conversaciones (admite ?fields=)"""
+    
+    select_related_fields = {
+        'booking': ['booking__service'], 'booking_service_title': ['booking__service'],
+        'booking_status': ['booking'], 'service_price': ['booking__service'],
+    }
     
     booking_service_title = serializers.SerializerMethodField()
     booking_status = serializers.CharField(source='booking.status', read_only=True)
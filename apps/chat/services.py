@@ -0,0 +1,75 @@
+"""
+Operaciones del chat compartidas por las views y el consumer WebSocket
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Conversation, ConversationParticipant, Message
+
+
+def _participant_ids(conversation):
+    return list(
+        ConversationParticipant.objects.filter(conversation=conversation).values_list('user_id', flat=True)
+    )
+
+
+def find_duplicate(conversation, sender_id, idempotency_key):
+    """
+    Mensaje ya creado con la misma clave de idempotencia (consulta por el
+    índice único), o None
+    """
+    if not idempotency_key:
+        return None
+    return Message.objects.filter(
+        conversation=conversation,
+        sender_id=sender_id,
+        idempotency_key=idempotency_key
+    ).first()
+
+
+def create_message(conversation, sender_id, idempotency_key=None, **fields):
+    """
+    Crear un mensaje y actualizar la conversación en una transacción:
+    last_message_at, +1 no leído para los demás participantes y reactivar
+    el chat de quien lo había eliminado (con el historial vaciado hasta este
+    mensaje). Son UPDATE por lote, sin leer ni guardar cada participante.
+
+    Con `idempotency_key`, un reintento del mismo envío (por REST o por
+    WebSocket) devuelve el mensaje original sin tocar nada más.
+    Devuelve (mensaje, user_id de los participantes, creado)
+    """
+    duplicate = find_duplicate(conversation, sender_id, idempotency_key)
+    if duplicate:
+        return duplicate, _participant_ids(conversation), False
+
+    try:
+        with transaction.atomic():
+            message = Message.objects.create(
+                conversation=conversation,
+                sender_id=sender_id,
+                idempotency_key=idempotency_key or None,
+                **fields
+            )
+
+            now = timezone.now()
+            Conversation.objects.filter(pk=conversation.pk).update(last_message_at=now)
+            conversation.last_message_at = now
+
+            others = ConversationParticipant.objects.filter(conversation=conversation).exclude(user_id=sender_id)
+            # Reactivar chat si estaba eliminado (soft delete), mostrando solo desde este mensaje
+            others.filter(deleted_at__isnull=False).update(
+                deleted_at=None,
+                cleared_at=message.created_at - timedelta(seconds=1)
+            )
+            others.update(unread_count=F('unread_count') + 1)
+    except IntegrityError:
+        # Otro reintento con la misma clave ganó la carrera
+        duplicate = find_duplicate(conversation, sender_id, idempotency_key)
+        if duplicate is None:
+            raise
+        return duplicate, _participant_ids(conversation), False
+
+    return message, _participant_ids(conversation), True
@@ -0,0 +1,27 @@
+"""
+Signals del chat: buffer de reenvío de mensajes por usuario
+"""
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Message, ConversationParticipant
+from .replay import record_message
+
+
+@receiver(post_save, sender=Message)
+def record_message_for_replay(sender, instance, created, **kwargs):
+    """
+    Anotar el mensaje en el stream de cada participante al confirmar
+    """
+    if not created:
+        return
+    message_id, conversation_id = instance.id, instance.conversation_id
+
+    def record():
+        user_ids = ConversationParticipant.objects.filter(
+            conversation_id=conversation_id
+        ).values_list('user_id', flat=True)
+        record_message(message_id, list(user_ids))
+
+    transaction.on_commit(record)
@@ -0,0 +1,419 @@
+"""
+Tests del chat: reintentos idempotentes, reenvío de mensajes perdidos,
+presencia y frames MessagePack
+"""
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase
+from redis import ConnectionError as RedisConnectionError
+
+from apps.shared import redis_client
+from apps.shared.realtime import user_group
+from apps.shared.testing import (
+    UsersTableMixin, access_token, auth_header, create_user, run_concurrently, use_fake_redis
+)
+from conectaya.authentication.websocket_middleware import JWTAuthMiddlewareStack
+from conectaya.routing import websocket_urlpatterns
+from . import consumers, presence, protocol, replay
+from .models import Conversation, ConversationParticipant, Message
+from .serializers import MessageSerializer
+
+
+CUSTOMER_ID = 2
+PROVIDER_ID = 1
+
+
+class ConversationFixtureMixin(UsersTableMixin):
+    """Conversación entre un cliente y un proveedor, con Redis en memoria"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = use_fake_redis(self)
+        create_user(PROVIDER_ID, role='PROVIDER')
+        create_user(CUSTOMER_ID)
+        self.conversation = Conversation.objects.create()
+        for user_id in (CUSTOMER_ID, PROVIDER_ID):
+            ConversationParticipant.objects.create(conversation=self.conversation, user_id=user_id)
+
+    def unread(self, user_id):
+        return ConversationParticipant.objects.get(
+            conversation=self.conversation, user_id=user_id
+        ).unread_count
+
+
+class MessageRetryRestTests(ConversationFixtureMixin, TestCase):
+    """Reintentar un POST con el mismo Idempotency-Key devuelve el mensaje original"""
+
+    def post(self, content, key):
+        return self.client.post(
+            f'/api/dashboard/chat/conversations/{self.conversation.id}/messages/',
+            {'content': content}, content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY=key, **auth_header(CUSTOMER_ID)
+        )
+
+    def test_retry_returns_the_original_message(self):
+        first = self.post('hola', 'envio-1')
+        retry = self.post('hola', 'envio-1')
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(retry.status_code, 200, retry.content)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(self.unread(PROVIDER_ID), 1)
+
+        unread = self.client.get('/api/dashboard/chat/unread-count/', **auth_header(PROVIDER_ID))
+        self.assertEqual(unread.json()['total_unread_messages'], 1)
+
+    def test_other_key_creates_a_new_message(self):
+        self.post('hola', 'envio-1')
+        second = self.post('hola', 'envio-2')
+
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(self.unread(PROVIDER_ID), 2)
+
+
+class MessageRetryWebSocketTests(ConversationFixtureMixin, TransactionTestCase):
+    """
+    Un reintento por WebSocket se confirma solo a quien lo envía, con el
+    mensaje original y sin volver a sumar no leídos
+    """
+
+    application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, user_id):
+        communicator = WebsocketCommunicator(self.application, f'/ws/chat/?token={access_token(user_id)}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['type'], 'connection_established')
+        return communicator
+
+    async def send_message(self, communicator, key):
+        await communicator.send_to(text_data=json.dumps({
+            'type': 'chat_message',
+            'data': {'chat_id': self.conversation.id, 'content': 'hola', 'idempotency_key': key},
+        }))
+
+    async def test_retry_returns_the_original_message_without_rebroadcast(self):
+        customer = await self.connect(CUSTOMER_ID)
+        provider = await self.connect(PROVIDER_ID)
+        try:
+            await self.send_message(customer, 'envio-1')
+            sent = await customer.receive_json_from()
+            delivered = await provider.receive_json_from()
+            self.assertEqual(sent['type'], 'new_message')
+            self.assertEqual(delivered['data']['id'], sent['data']['id'])
+
+            await self.send_message(customer, 'envio-1')
+            confirmed = await customer.receive_json_from()
+
+            self.assertEqual(confirmed['type'], 'new_message')
+            self.assertEqual(confirmed['data']['id'], sent['data']['id'])
+            self.assertTrue(await provider.receive_nothing())
+        finally:
+            await customer.disconnect()
+            await provider.disconnect()
+
+        self.assertEqual(await Message.objects.acount(), 1)
+        self.assertEqual(
+            (await ConversationParticipant.objects.aget(
+                conversation=self.conversation, user_id=PROVIDER_ID
+            )).unread_count,
+            1
+        )
+
+
+class ReplayTests(ConversationFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(replay, '_lost_writes', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, content):
+        # El mensaje se anota en los streams al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(
+                conversation=self.conversation, sender_id=PROVIDER_ID, content=content
+            )
+
+    def send_while_redis_fails(self, content):
+        with mock.patch.object(replay, 'get_redis', side_effect=RedisConnectionError('caído')):
+            message = self.send(content)
+        # Redis vuelve antes de que venza la pausa tras el fallo
+        redis_client._down_until = 0.0
+        return message
+
+    def test_missed_messages_come_from_the_stream(self):
+        first, second, third = [self.send(text) for text in ('uno', 'dos', 'tres')]
+
+        self.assertEqual(replay._buffered_ids(CUSTOMER_ID, first.id), [second.id, third.id])
+        messages, has_more = replay.missed_messages(CUSTOMER_ID, first.id)
+        self.assertEqual([message.id for message in messages], [second.id, third.id])
+        self.assertFalse(has_more)
+
+    def test_stream_started_after_last_seen_is_not_used(self):
+        first = self.send('uno')
+        self.redis.delete(replay.STREAM_KEY.format(user_id=CUSTOMER_ID),
+                          replay.VALID_SINCE_KEY.format(user_id=CUSTOMER_ID))
+        second = self.send('dos')
+
+        self.assertIsNone(replay._buffered_ids(CUSTOMER_ID, first.id))
+        self.assertEqual(replay._buffered_ids(CUSTOMER_ID, second.id), [])
+
+    def test_lost_write_falls_back_to_the_database(self):
+        first = self.send('uno')
+        lost = self.send_while_redis_fails('dos')
+
+        self.assertIsNone(replay._buffered_ids(CUSTOMER_ID, first.id))
+        messages, _ = replay.missed_messages(CUSTOMER_ID, first.id)
+        self.assertEqual([message.id for message in messages], [lost.id])
+
+    def test_stream_restarts_after_a_lost_write(self):
+        first = self.send('uno')
+        lost = self.send_while_redis_fails('dos')
+        third = self.send('tres')
+        fourth = self.send('cuatro')
+
+        # Desde antes del mensaje perdido: base de datos
+        self.assertIsNone(replay._buffered_ids(CUSTOMER_ID, first.id))
+        messages, _ = replay.missed_messages(CUSTOMER_ID, first.id)
+        self.assertEqual([message.id for message in messages], [lost.id, third.id, fourth.id])
+        # Desde el reinicio del stream: el stream vuelve a servir
+        self.assertEqual(replay._buffered_ids(CUSTOMER_ID, third.id), [fourth.id])
+
+    def test_ack_only_moves_forward(self):
+        replay.store_ack(CUSTOMER_ID, 10)
+        replay.store_ack(CUSTOMER_ID, 7)
+        self.assertEqual(replay.get_ack(CUSTOMER_ID), 10)
+
+        replay.store_ack(CUSTOMER_ID, 12)
+        self.assertEqual(replay.get_ack(CUSTOMER_ID), 12)
+
+    def test_concurrent_acks_keep_the_highest(self):
+        errors = run_concurrently(replay.store_ack, [(CUSTOMER_ID, i) for i in range(1, 41)])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(replay.get_ack(CUSTOMER_ID), 40)
+
+
+class PresenceTests(UsersTableMixin, TestCase):
+    """Presencia por conexión: varios dispositivos, caducidad y Redis caído"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis = use_fake_redis(self)
+
+    def at(self, timestamp):
+        # Solo el reloj de presence: fakeredis usa time.time para caducar claves
+        return mock.patch.object(presence, 'time', mock.Mock(**{'time.return_value': timestamp}))
+
+    def test_user_stays_online_while_any_device_is_connected(self):
+        presence.touch(CUSTOMER_ID, 'movil')
+        presence.touch(CUSTOMER_ID, 'web')
+
+        presence.disconnect(CUSTOMER_ID, 'movil')
+        self.assertTrue(presence.is_online(CUSTOMER_ID))
+
+        presence.disconnect(CUSTOMER_ID, 'web')
+        state = presence.get_presence([CUSTOMER_ID])[CUSTOMER_ID]
+        self.assertFalse(state['online'])
+        self.assertIsNotNone(state['last_seen'])
+
+    def test_connection_without_heartbeat_expires(self):
+        with self.at(1000.0):
+            presence.touch(CUSTOMER_ID, 'movil')
+            presence.touch(PROVIDER_ID, 'web')
+        # Solo el proveedor renueva su conexión
+        with self.at(1000.0 + presence.PRESENCE_TTL - 5):
+            presence.touch(PROVIDER_ID, 'web')
+
+        with self.at(1000.0 + presence.PRESENCE_TTL + 1):
+            states = presence.get_presence([CUSTOMER_ID, PROVIDER_ID])
+
+        self.assertFalse(states[CUSTOMER_ID]['online'])
+        self.assertEqual(states[CUSTOMER_ID]['last_seen'], 1000.0)
+        self.assertTrue(states[PROVIDER_ID]['online'])
+
+    def test_heartbeat_drops_the_user_stale_connections(self):
+        with self.at(1000.0):
+            presence.touch(CUSTOMER_ID, 'colgada')
+        with self.at(1000.0 + presence.PRESENCE_TTL + 1):
+            presence.touch(CUSTOMER_ID, 'movil')
+
+        members = self.redis.zrange(presence.USER_KEY.format(user_id=CUSTOMER_ID), 0, -1)
+        self.assertEqual(members, [b'movil'])
+
+    def test_everyone_is_offline_when_redis_is_down(self):
+        presence.touch(CUSTOMER_ID, 'movil')
+
+        with mock.patch.object(presence, 'get_redis', side_effect=RedisConnectionError('caído')):
+            states = presence.get_presence([CUSTOMER_ID, PROVIDER_ID])
+            presence.touch(PROVIDER_ID, 'web')
+
+        self.assertEqual(states, {
+            CUSTOMER_ID: {'online': False, 'last_seen': None},
+            PROVIDER_ID: {'online': False, 'last_seen': None},
+        })
+        # Tras el fallo no se vuelve a intentar durante la pausa
+        self.assertFalse(presence.is_online(CUSTOMER_ID))
+
+
+class UsersPresenceViewTests(ConversationFixtureMixin, TestCase):
+    """Solo se informa de usuarios con los que se comparte una conversación"""
+
+    url = '/api/dashboard/chat/presence/'
+    STRANGER_ID = 3
+
+    def setUp(self):
+        super().setUp()
+        create_user(self.STRANGER_ID)
+        for user_id in (PROVIDER_ID, self.STRANGER_ID):
+            presence.touch(user_id, f'conexion-{user_id}')
+
+    def get(self, user_ids):
+        return self.client.get(self.url, {'user_ids': user_ids}, **auth_header(CUSTOMER_ID))
+
+    def test_only_users_sharing_a_conversation_are_reported(self):
+        response = self.get(f'{PROVIDER_ID},{self.STRANGER_ID},{CUSTOMER_ID}')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        results = {row['user_id']: row for row in response.json()['results']}
+        self.assertEqual(set(results), {PROVIDER_ID, CUSTOMER_ID})
+        self.assertTrue(results[PROVIDER_ID]['online'])
+        self.assertIsNotNone(results[PROVIDER_ID]['last_seen'])
+        self.assertFalse(results[CUSTOMER_ID]['online'])
+
+    def test_redis_down_reports_everyone_offline(self):
+        with mock.patch.object(presence, 'get_redis', side_effect=RedisConnectionError('caído')):
+            response = self.get(str(PROVIDER_ID))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['results'], [
+            {'user_id': PROVIDER_ID, 'online': False, 'last_seen': None}
+        ])
+
+    def test_invalid_user_ids_are_rejected(self):
+        self.assertEqual(self.get('1,dos').status_code, 400)
+        self.assertEqual(self.get(','.join(str(i) for i in range(101))).status_code, 400)
+
+
+class MsgpackWebSocketTests(ConversationFixtureMixin, TransactionTestCase):
+    """
+    Con el subprotocolo MessagePack los eventos llegan como frames binarios
+    compactos; los clientes JSON reciben lo mismo que antes
+    """
+
+    application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+    async def connect(self, user_id, binary=False, query=''):
+        communicator = WebsocketCommunicator(
+            self.application, f'/ws/chat/?token={access_token(user_id)}{query}',
+            subprotocols=[protocol.MSGPACK_SUBPROTOCOL] if binary else None
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, protocol.MSGPACK_SUBPROTOCOL if binary else None)
+        frame = await self.receive(communicator, binary)
+        self.assertEqual(frame['type'], 'connection_established')
+        return communicator
+
+    async def receive(self, communicator, binary):
+        """Siguiente frame como {'type': ..., 'data': ...}; valida que su formato sea el negociado"""
+        frame = await communicator.receive_from()
+        if binary:
+            self.assertIsInstance(frame, bytes)
+            return protocol.unpack(frame)
+        self.assertIsInstance(frame, str)
+        return json.loads(frame)
+
+    def assertCompact(self, data):
+        self.assertLessEqual(set(data), set(protocol.COMPACT_MESSAGE_KEYS.values()))
+
+    async def test_new_message_is_packed_once_for_binary_clients(self):
+        customer = await self.connect(CUSTOMER_ID, binary=True)
+        provider = await self.connect(PROVIDER_ID, binary=True)
+        observer = await self.connect(CUSTOMER_ID)
+        try:
+            outgoing = protocol.pack('chat_message', {'chat_id': self.conversation.id, 'content': 'hola'})
+            with mock.patch.object(protocol, 'pack', wraps=protocol.pack) as pack:
+                await customer.send_to(bytes_data=outgoing)
+                sent = await customer.receive_from()
+                delivered = await provider.receive_from()
+                as_json = await self.receive(observer, binary=False)
+
+            # Un solo packb en el fan-out, reenviado tal cual a cada conexión binaria
+            self.assertEqual([c.args[0] for c in pack.call_args_list], ['new_message'])
+            self.assertEqual(sent, delivered)
+            frame = protocol.unpack(sent)
+            self.assertEqual(frame['type'], 'new_message')
+            self.assertCompact(frame['data'])
+            self.assertEqual(frame['data']['b'], 'hola')
+            self.assertEqual(frame['data']['s'], CUSTOMER_ID)
+
+            self.assertEqual(as_json['type'], 'new_message')
+            self.assertEqual(as_json['data']['id'], frame['data']['i'])
+            self.assertIn('sender', as_json['data'])
+            self.assertIn('message_type_display', as_json['data'])
+        finally:
+            for communicator in (customer, provider, observer):
+                await communicator.disconnect()
+
+    async def test_conversation_closed_uses_the_packed_frame(self):
+        customer = await self.connect(CUSTOMER_ID, binary=True)
+        observer = await self.connect(CUSTOMER_ID)
+        try:
+            event = protocol.conversation_closed_event({'id': self.conversation.id, 'is_active': False})
+            await get_channel_layer().group_send(user_group(CUSTOMER_ID), event)
+
+            self.assertEqual(await customer.receive_from(), event['packed'])
+            self.assertEqual(await self.receive(observer, binary=False), {
+                'type': 'conversation_closed',
+                'data': {'id': self.conversation.id, 'is_active': False},
+            })
+        finally:
+            await customer.disconnect()
+            await observer.disconnect()
+
+    def create_messages(self):
+        return [
+            Message.objects.create(conversation=self.conversation, sender_id=PROVIDER_ID, content=text).id
+            for text in ('uno', 'dos', 'tres')
+        ]
+
+    async def test_missed_messages_are_compact_for_binary_clients(self):
+        first, second, third = await sync_to_async(self.create_messages)()
+        query = f'&last_seen_message_id={first}'
+
+        with mock.patch.object(consumers, 'MessageSerializer', wraps=MessageSerializer) as serializer:
+            customer = await self.connect(CUSTOMER_ID, binary=True, query=query)
+            try:
+                frame = await self.receive(customer, binary=True)
+            finally:
+                await customer.disconnect()
+
+        # Sin el usuario anidado: solo se serializan los campos compactos
+        self.assertEqual(
+            serializer.call_args.kwargs['context'], {'fields': list(protocol.COMPACT_MESSAGE_KEYS)}
+        )
+        self.assertEqual(frame['type'], 'missed_messages')
+        self.assertFalse(frame['data']['more'])
+        self.assertEqual([message['i'] for message in frame['data']['m']], [second, third])
+        for message in frame['data']['m']:
+            self.assertCompact(message)
+
+        observer = await self.connect(CUSTOMER_ID, query=query)
+        try:
+            as_json = await self.receive(observer, binary=False)
+        finally:
+            await observer.disconnect()
+        self.assertEqual(as_json['type'], 'missed_messages')
+        self.assertFalse(as_json['data']['has_more'])
+        self.assertEqual([message['id'] for message in as_json['data']['messages']], [second, third])
+        self.assertIn('sender', as_json['data']['messages'][0])
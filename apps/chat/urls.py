@@ -30,6 +30,9 @@ urlpatterns = [
     path('stats/', views.chat_stats, name='chat-stats'),
     path('unread-count/', views.conversations_unread_count, name='unread-count'),
     
+    # Presencia (usuarios en línea)
+    path('presence/', views.users_presence, name='users-presence'),
+    
     # Ganancias del proveedor
     path('provider/earnings/', views.get_provider_earnings, name='provider-earnings'),
 ]
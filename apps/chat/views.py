@@ -1,13 +1,17 @@
 """
 Views para el módulo de chat
 """
+import logging
+
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.db.models import Sum, Count, Q
 
 from conectaya.authentication.decorators import jwt_required_drf
+from apps.shared.conditional import conditional_get
 from apps.users.models import User
 from apps.bookings.models import Booking
 from .models import Conversation, ConversationParticipant, Message
@@ -16,6 +20,8 @@ from .serializers import (
     MessageSerializer, MessageListSerializer, MessageCreateSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 
 @api_view(['GET', 'POST'])
 @jwt_required_drf
@@ -35,10 +41,11 @@ def conversations_list_create(request):
                 participants__deleted_at__isnull=True
             ).order_by('-last_message_at')
             
+            context = {'request': request}
             serializer = ConversationListSerializer(
-                conversations, 
+                ConversationListSerializer.setup_queryset(conversations, context), 
                 many=True,
-                context={'request': request}
+                context=context
             )
             return Response({
                 'conversations': serializer.data,
@@ -150,36 +157,22 @@ def conversation_messages(request, conversation_id):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Enviar mensaje
-            from datetime import timedelta
+            # Enviar mensaje (la clave de idempotencia puede venir en el header)
+            from .services import create_message
             data = request.data.copy()
+            if request.headers.get('Idempotency-Key') and not data.get('idempotency_key'):
+                data['idempotency_key'] = request.headers['Idempotency-Key']
             serializer = MessageCreateSerializer(data=data)
             
             if serializer.is_valid():
-                message = serializer.save(
-                    conversation=conversation,
-                    sender_id=user_id
+                # Un reintento con la misma clave devuelve el mensaje original
+                message, _, created = create_message(
+                    conversation, user_id, **serializer.validated_data
                 )
                 
-                # Actualizar timestamp de la conversación
-                conversation.last_message_at = timezone.now()
-                conversation.save()
-                
-                # Incrementar contador de no leídos para otros participantes y reactivar chat si estaba eliminado
-                other_participants = conversation.participants.exclude(user_id=user_id)
-                for other_participant in other_participants:
-                    other_participant.unread_count += 1
-                    # Reactivar chat si estaba eliminado (soft delete)
-                    # y limpiar historial para que solo se vean mensajes nuevos
-                    if other_participant.deleted_at:
-                        other_participant.deleted_at = None
-                        # Establecer cleared_at justo antes del mensaje actual para que este mensaje SÍ se vea
-                        other_participant.cleared_at = message.created_at - timedelta(seconds=1)
-                    other_participant.save()
-                
                 return Response(
                     MessageSerializer(message).data,
-                    status=status.HTTP_201_CREATED
+                    status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
                 )
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
@@ -571,8 +564,16 @@ def conversation_search_messages(request, conversation_id):
         )
 
 
+def _total_unread(user_id):
+    """Sumar los contadores de no leídos en la base de datos"""
+    return ConversationParticipant.objects.filter(user_id=user_id).aggregate(
+        total=Sum('unread_count')
+    )['total'] or 0
+
+
 @api_view(['GET'])
 @jwt_required_drf
+@conditional_get(lambda request: _total_unread(request.jwt_user_id), private=True)
 def conversations_unread_count(request):
     """
     Obtener contador total de mensajes no leídos
@@ -580,9 +581,10 @@ def conversations_unread_count(request):
     try:
         user_id = request.jwt_user_id
         
-        # Sumar todos los contadores de no leídos
-        participants = ConversationParticipant.objects.filter(user_id=user_id)
-        total_unread = sum(p.unread_count for p in participants)
+        # El total ya lo calculó el validador del ETag
+        total_unread = getattr(request, 'conditional_value', None)
+        if total_unread is None:
+            total_unread = _total_unread(user_id)
         
         return Response({
             'total_unread_messages': total_unread
@@ -671,8 +673,13 @@ def create_booking_from_chat(request, conversation_id):
             other_participant.save()
         
         # Enviar por WebSocket en tiempo real
-        from apps.bookings.views import send_booking_message_to_websocket
-        send_booking_message_to_websocket(conversation, message)
+        # El booking ya está creado: un fallo del envío no debe devolver 500
+        from apps.bookings.effects import send_booking_message_to_websocket
+        delivered_to = set()
+        try:
+            delivered_to = send_booking_message_to_websocket(conversation, message)
+        except Exception:
+            logger.exception('Error enviando por WebSocket el mensaje del booking %s', booking.id)
         
         # 🔥 Enviar notificación push al proveedor
         try:
@@ -686,7 +693,9 @@ def create_booking_from_chat(request, conversation_id):
                     "type": "NEW_BOOKING",
                     "booking_id": str(booking.id),
                     "service_id": str(service.id)
-                }
+                },
+                # Omitir solo si la solicitud le llegó por WebSocket y sigue conectado
+                skip_if_online=booking.provider_id in delivered_to
             )
             print(f"🔔 DEBUG: Push notification result={result}")
         except Exception as e:
@@ -807,8 +816,8 @@ def get_provider_earnings(request):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        from apps.users.models import UserProfile
-        from datetime import datetime, timedelta
+        from apps.users.models import UserProfile, EarningsEntry, attach_users
+        from datetime import timedelta
         
         # Obtener o crear perfil
         profile, created = UserProfile.objects.get_or_create(user_id=user_id)
@@ -816,26 +825,25 @@ def get_provider_earnings(request):
         # Ganancias totales
         total_earnings = profile.total_earnings
         
-        # Bookings completados
+        # Ganancias del mes actual (agregado sobre el ledger)
+        current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        monthly_earnings, _ = EarningsEntry.totals(user_id, since=current_month)
+        
+        # Conteos de bookings completados (total y del mes) en una consulta
         completed_bookings = Booking.objects.filter(
             provider_id=user_id,
             status='completed'
-        ).order_by('-completed_at')
-        
-        # Ganancias del mes actual
-        current_month = datetime.now().replace(day=1)
-        monthly_bookings = completed_bookings.filter(
-            completed_at__gte=current_month
         )
-        
-        monthly_earnings = sum(
-            (booking.service_price or booking.service.price or 0) 
-            for booking in monthly_bookings
+        counts = completed_bookings.aggregate(
+            total=Count('id'),
+            monthly=Count('id', filter=Q(completed_at__gte=current_month))
         )
         
         # Últimos servicios completados
+        recent = list(completed_bookings.select_related('service').order_by('-completed_at')[:10])
+        attach_users(recent, customer='customer_id')
         recent_completed = []
-        for booking in completed_bookings[:10]:
+        for booking in recent:
             recent_completed.append({
                 'id': booking.id,
                 'service_title': booking.service.title,
@@ -844,12 +852,24 @@ def get_provider_earnings(request):
                 'customer_name': booking.customer.full_name if booking.customer else 'N/A'
             })
         
+        # Ganancias de los últimos 12 meses, agrupadas por mes
+        since = (current_month - timedelta(days=365)).replace(day=1)
+        monthly_breakdown = [
+            {
+                'month': row['month'].strftime('%Y-%m'),
+                'total': float(row['total']),
+                'count': row['count']
+            }
+            for row in EarningsEntry.monthly_totals(user_id, since=since)
+        ]
+        
         return Response({
             'total_earnings': float(total_earnings),
             'monthly_earnings': float(monthly_earnings),
-            'total_completed_services': completed_bookings.count(),
-            'monthly_completed_services': monthly_bookings.count(),
-            'recent_completed': recent_completed
+            'total_completed_services': counts['total'],
+            'monthly_completed_services': counts['monthly'],
+            'recent_completed': recent_completed,
+            'monthly_breakdown': monthly_breakdown
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -858,3 +878,58 @@ def get_provider_earnings(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+@api_view(['GET'])
+@jwt_required_drf
+def users_presence(request):
+    """
+    Estado en línea de usuarios: GET ?user_ids=1,2,3
+    Solo se informa de usuarios con los que se comparte una conversación
+    """
+    try:
+        from datetime import datetime, timezone as dt_timezone
+        from .presence import get_presence
+        user_id = request.jwt_user_id
+        
+        try:
+            requested = {
+                int(value) for value in request.GET.get('user_ids', '').split(',') if value.strip()
+            }
+        except ValueError:
+            return Response(
+                {'error': 'user_ids debe ser una lista de enteros separados por comas'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(requested) > 100:
+            return Response(
+                {'error': 'Máximo 100 usuarios por consulta'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        visible = set(ConversationParticipant.objects.filter(
+            conversation__participants__user_id=user_id,
+            user_id__in=requested
+        ).values_list('user_id', flat=True))
+        if user_id in requested:
+            visible.add(user_id)
+        
+        presence = get_presence(sorted(visible))
+        return Response({
+            'results': [
+                {
+                    'user_id': uid,
+                    'online': state['online'],
+                    'last_seen': (
+                        datetime.fromtimestamp(state['last_seen'], tz=dt_timezone.utc)
+                        if state['last_seen'] else None
+                    )
+                }
+                for uid, state in presence.items()
+            ]
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
@@ -0,0 +1,129 @@
+"""
+Set de favoritos por usuario en Redis
+
+Cada usuario tiene un set `favorites:user:<id>` con los ids de sus
+servicios favoritos. El set se carga desde la base de datos la primera vez
+que se consulta (incluye el miembro 0 como marca de "cargado", así un
+usuario sin favoritos no vuelve a consultar la BD) y después se mantiene
+write-through desde apps.favorites.services y el signal post_save.
+Si Redis falla se responde directamente desde la tabla favorites.
+
+Cada escritura incrementa además una versión por usuario. La carga lee la
+versión antes de consultar la base de datos y solo guarda el set si la
+versión no cambió y nadie lo cargó mientras tanto: una escritura que llega
+durante la consulta no queda pisada por una lectura anterior a ella.
+"""
+from redis import RedisError
+
+from apps.shared.redis_client import get_redis, mark_redis_down
+from .models import Favorite
+
+
+FAVORITES_KEY = 'favorites:user:{user_id}'
+VERSION_KEY = 'favorites:user:{user_id}:version'
+FAVORITES_TTL = 60 * 60  # 1 hora, acota el desfase si falla una escritura
+LOADED_MARKER = 0
+
+# Solo se modifica el set si ya estaba cargado: un SADD sobre una clave
+# inexistente crearía un set parcial que parecería completo. La versión
+# avanza siempre, para invalidar una carga en curso
+_UPDATE_IF_LOADED = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call(ARGV[1], KEYS[1], ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return 0
+"""
+
+# Guardar el set cargado (ARGV[3..]) solo si la versión sigue siendo la
+# leída antes de la consulta (ARGV[1]) y el set no apareció mientras tanto
+_STORE_IF_UNCHANGED = """
+if redis.call('EXISTS', KEYS[1]) == 1 or (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SADD', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def _key(user_id):
+    return FAVORITES_KEY.format(user_id=user_id)
+
+
+def _version_key(user_id):
+    return VERSION_KEY.format(user_id=user_id)
+
+
+def _load_from_db(user_id):
+    return set(Favorite.objects.filter(user_id=user_id).values_list('service_id', flat=True))
+
+
+def _warm(client, user_id):
+    """
+    Cargar el set desde la base de datos. Si hubo escrituras durante la
+    consulta no se guarda (la próxima lectura vuelve a cargarlo)
+    """
+    version = client.get(_version_key(user_id))
+    service_ids = _load_from_db(user_id)
+    client.eval(
+        _STORE_IF_UNCHANGED, 2, _key(user_id), _version_key(user_id),
+        version if version is not None else '', FAVORITES_TTL, LOADED_MARKER, *service_ids
+    )
+    return service_ids
+
+
+def get_favorite_ids(user_id):
+    """
+    Ids de los servicios favoritos del usuario (set de int)
+    """
+    try:
+        client = get_redis()
+        members = client.smembers(_key(user_id))
+        if members:
+            return {int(member) for member in members} - {LOADED_MARKER}
+        return _warm(client, user_id)
+    except RedisError as e:
+        mark_redis_down(e)
+        return _load_from_db(user_id)
+
+
+def is_favorite(user_id, service_id):
+    """
+    Verificar si un servicio está en favoritos (SISMEMBER)
+    """
+    try:
+        client = get_redis()
+        pipe = client.pipeline()
+        pipe.exists(_key(user_id))
+        pipe.sismember(_key(user_id), service_id)
+        loaded, member = pipe.execute()
+        if loaded:
+            return bool(member)
+        return service_id in _warm(client, user_id)
+    except RedisError as e:
+        mark_redis_down(e)
+        return Favorite.objects.filter(user_id=user_id, service_id=service_id).exists()
+
+
+def _update(command, user_id, service_id):
+    try:
+        get_redis().eval(
+            _UPDATE_IF_LOADED, 2, _key(user_id), _version_key(user_id), command, service_id, FAVORITES_TTL
+        )
+    except RedisError as e:
+        # El TTL del set acota el tiempo que puede quedar desfasado
+        mark_redis_down(e)
+
+
+def cache_favorite_added(user_id, service_id):
+    """Agregar el servicio al set del usuario (si está cargado)"""
+    _update('SADD', user_id, service_id)
+
+
+def cache_favorite_removed(user_id, service_id):
+    """Quitar el servicio del set del usuario (si está cargado)"""
+    _update('SREM', user_id, service_id)
+
@@ -5,10 +5,14 @@ from rest_framework import serializers
 from .models import Favorite
 from apps.services.serializers import ServiceListSerializer
 from apps.services.models import Service
+from apps.shared.serializers import DynamicFieldsMixin
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Serializer completo para favorites"""
+class FavoriteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer completo para favorites (admite ?fields=)"""
+    
+    select_related_fields = {'service': ['service__category']}
+    prefetch_related_fields = {'service': ['service__images']}
     
     service = ServiceListSerializer(read_only=True)
     
@@ -36,8 +40,13 @@ class FavoriteCreateSerializer(serializers.ModelSerializer):
         return Favorite.objects.create(**validated_data)
 
 
-class FavoriteListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listas de favorites"""
+class FavoriteListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer simplificado para listas de favorites (admite ?fields=)"""
+    
+    select_related_fields = {
+        'service_id': ['service'], 'service_title': ['service'], 'service_price': ['service'],
+        'service_rating': ['service'], 'provider_name': ['service'], 'category_name': ['service__category'],
+    }
     
     service_id = serializers.IntegerField(source='service.id', read_only=True)
     service_title = serializers.CharField(source='service.title', read_only=True)
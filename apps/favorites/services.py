@@ -0,0 +1,65 @@
+"""
+Operaciones de favoritos con mantenimiento atómico de Service.favorites_count
+
+Las altas se apoyan en el unique_together (user_id, service) para ser
+idempotentes y el contador se ajusta con F(), sin recontar la tabla. El
+set de favoritos en Redis (apps.favorites.cache) se actualiza al confirmar
+la transacción.
+Los desvíos se corrigen con:
+    python manage.py recalculate_service_counters --only favorites
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from apps.services.models import Service
+from apps.shared.versions import bump_provider_version
+from .cache import cache_favorite_removed
+from .models import Favorite
+
+
+def add_favorite(user_id, service):
+    """
+    Agregar un servicio a favoritos.
+    Devuelve (favorite, created); si ya existía devuelve (None, False).
+    Otros errores de integridad (p. ej. el servicio se eliminó) se propagan
+    """
+    try:
+        with transaction.atomic():
+            # El incremento de favorites_count lo hace el signal post_save
+            favorite = Favorite.objects.create(user_id=user_id, service=service)
+    except IntegrityError:
+        # Solo la violación del unique_together significa "ya estaba"
+        if not Favorite.objects.filter(user_id=user_id, service_id=service.pk).exists():
+            raise
+        return None, False
+    return favorite, True
+
+
+def remove_favorite(user_id, service_id):
+    """
+    Quitar un servicio de favoritos con un solo DELETE.
+    Devuelve True si existía
+    """
+    with transaction.atomic():
+        deleted, _ = Favorite.objects.filter(user_id=user_id, service_id=service_id).delete()
+        if deleted:
+            Service.objects.filter(pk=service_id).update(
+                favorites_count=Greatest(F('favorites_count') - 1, 0)
+            )
+            transaction.on_commit(lambda: cache_favorite_removed(user_id, service_id))
+            bump_provider_version(
+                Service.objects.filter(pk=service_id).values_list('provider_id', flat=True).first()
+            )
+    return bool(deleted)
+
+
+def toggle_favorite(user_id, service):
+    """
+    Alternar el favorito: primero intenta el DELETE y solo inserta si no
+    había fila. Devuelve el nuevo estado (True = en favoritos)
+    """
+    if remove_favorite(user_id, service.id):
+        return False
+    add_favorite(user_id, service)
+    return True
@@ -1,27 +1,30 @@
 """
 Signals para favoritos
 """
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
 from django.dispatch import receiver
+from apps.services.models import Service
+from apps.shared.versions import bump_provider_version
+from .cache import cache_favorite_added
 from .models import Favorite
 
 
 @receiver(post_save, sender=Favorite)
 def on_favorite_added(sender, instance, created, **kwargs):
     """
-    Incrementar contador de favoritos
-    """
-    if created:
-        service = instance.service
-        service.favorites_count = service.favorites.count()
-        service.save(update_fields=['favorites_count'])
-
+    Incrementar contador de favoritos y actualizar el set en Redis
 
-@receiver(post_delete, sender=Favorite)
-def on_favorite_removed(sender, instance, **kwargs):
+    Las bajas no usan signal (impediría el DELETE directo): el decremento
+    lo hace apps.favorites.services.remove_favorite
     """
-    Decrementar contador de favoritos
-    """
-    service = instance.service
-    service.favorites_count = service.favorites.count()
-    service.save(update_fields=['favorites_count'])
+    if created:
+        Service.objects.filter(pk=instance.service_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+        transaction.on_commit(
+            lambda: cache_favorite_added(instance.user_id, instance.service_id)
+        )
+        # favorites_count aparece en el perfil público del proveedor
+        bump_provider_version(instance.service.provider_id)
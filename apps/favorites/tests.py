@@ -0,0 +1,95 @@
+"""
+Tests de las operaciones de favoritos
+"""
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
+
+from apps.services.models import Service
+from apps.shared.testing import use_fake_redis
+from . import cache
+from .models import Favorite
+from .services import add_favorite
+
+
+class AddFavoriteTests(TransactionTestCase):
+
+    def setUp(self):
+        self.service = Service.objects.create(
+            provider_id=1, title='Gasfitería', description='Reparaciones', price=50
+        )
+
+    def test_duplicate_returns_not_created(self):
+        favorite, created = add_favorite(2, self.service)
+        self.assertTrue(created)
+        self.assertEqual(favorite.service_id, self.service.id)
+
+        self.assertEqual(add_favorite(2, self.service), (None, False))
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.favorites_count, 1)
+
+    def test_deleted_service_is_not_reported_as_duplicate(self):
+        service_id = self.service.id
+        self.service.delete()
+
+        with self.assertRaises(IntegrityError):
+            add_favorite(2, Service(id=service_id))
+        self.assertFalse(Favorite.objects.exists())
+
+
+class FavoriteCacheTests(TestCase):
+
+    def setUp(self):
+        self.redis = use_fake_redis(self)
+        self.services = [
+            Service.objects.create(
+                provider_id=1, title=f'Servicio {i}', description='Descripción', price=50
+            )
+            for i in range(3)
+        ]
+        Favorite.objects.create(user_id=2, service=self.services[0])
+
+    def cached_ids(self):
+        return {int(member) for member in self.redis.smembers(cache._key(2))} - {cache.LOADED_MARKER}
+
+    def test_set_is_loaded_and_kept_write_through(self):
+        self.assertEqual(cache.get_favorite_ids(2), {self.services[0].id})
+
+        cache.cache_favorite_added(2, self.services[1].id)
+        cache.cache_favorite_removed(2, self.services[0].id)
+
+        self.assertEqual(cache.get_favorite_ids(2), {self.services[1].id})
+
+    def test_write_during_the_load_is_not_overwritten(self):
+        load_from_db = cache._load_from_db
+        added = self.services[1]
+
+        def load_then_concurrent_add(user_id):
+            # La lectura ve la base de datos antes del alta concurrente
+            service_ids = load_from_db(user_id)
+            Favorite.objects.create(user_id=2, service=added)
+            cache.cache_favorite_added(2, added.id)
+            return service_ids
+
+        with mock.patch.object(cache, '_load_from_db', side_effect=load_then_concurrent_add):
+            self.assertEqual(cache.get_favorite_ids(2), {self.services[0].id})
+
+        # La carga desactualizada no se guardó: la siguiente lectura recarga
+        self.assertFalse(self.redis.exists(cache._key(2)))
+        self.assertEqual(cache.get_favorite_ids(2), {self.services[0].id, added.id})
+        self.assertEqual(self.cached_ids(), {self.services[0].id, added.id})
+
+    def test_load_does_not_replace_a_set_loaded_meanwhile(self):
+        load_from_db = cache._load_from_db
+
+        def load_while_another_request_loads(user_id):
+            service_ids = load_from_db(user_id)
+            self.redis.sadd(cache._key(2), cache.LOADED_MARKER, self.services[2].id)
+            return service_ids
+
+        with mock.patch.object(cache, '_load_from_db', side_effect=load_while_another_request_loads):
+            cache.get_favorite_ids(2)
+
+        self.assertEqual(self.cached_ids(), {self.services[2].id})
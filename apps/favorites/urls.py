@@ -13,6 +13,7 @@ urlpatterns = [
     
     # Utilidades
     path('check/<int:service_id>/', views.favorite_check, name='favorite_check'),
+    path('check-many/', views.favorite_check_many, name='favorite_check_many'),
     path('toggle/<int:service_id>/', views.favorite_toggle, name='favorite_toggle'),
     path('stats/', views.favorites_stats, name='favorites_stats'),
 ]
@@ -5,19 +5,36 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Sum
 
 from conectaya.authentication.decorators import jwt_required_drf
+from apps.shared.conditional import conditional_get
+from apps.shared.versions import catalog_validator
 from apps.users.models import User
 from apps.services.models import Service
 from .models import Favorite
+from .services import add_favorite, remove_favorite, toggle_favorite
+from .cache import get_favorite_ids, is_favorite as cached_is_favorite
 from .serializers import (
     FavoriteSerializer, FavoriteListSerializer, 
     FavoriteCreateSerializer, FavoriteCheckSerializer
 )
 
 
+def _favorites_version(request):
+    """
+    Validador: versión del catálogo (datos de los servicios) + huella de
+    los favoritos del usuario (cantidad y suma de ids)
+    """
+    favorites = Favorite.objects.filter(user_id=request.jwt_user_id).aggregate(
+        total=Count('id'), ids=Sum('id')
+    )
+    return f"{catalog_validator()}:{request.jwt_user_id}:{favorites['total']}:{favorites['ids']}"
+
+
 @api_view(['GET', 'POST'])
 @jwt_required_drf
+@conditional_get(_favorites_version, private=True)
 def favorites_list_create(request):
     """
     GET: Lista favoritos del usuario autenticado
@@ -36,7 +53,10 @@ def favorites_list_create(request):
             if category:
                 favorites = favorites.filter(service__category__slug=category)
             
-            serializer = FavoriteSerializer(favorites, many=True)
+            context = {'request': request}
+            serializer = FavoriteSerializer(
+                FavoriteSerializer.setup_queryset(favorites, context), many=True, context=context
+            )
             return Response({
                 'favorites': serializer.data,
                 'count': favorites.count()
@@ -50,18 +70,6 @@ def favorites_list_create(request):
             if serializer.is_valid():
                 service = serializer.validated_data['service']
                 
-                # Verificar que no esté ya en favoritos
-                existing_favorite = Favorite.objects.filter(
-                    user_id=user_id, 
-                    service=service
-                ).first()
-                
-                if existing_favorite:
-                    return Response(
-                        {'error': 'El servicio ya está en favoritos'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
                 # No se puede agregar el propio servicio a favoritos
                 if service.provider_id == user_id:
                     return Response(
@@ -69,7 +77,13 @@ def favorites_list_create(request):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                favorite = serializer.save(user_id=user_id)
+                # El unique_together hace idempotente el alta
+                favorite, created = add_favorite(user_id, service)
+                if not created:
+                    return Response(
+                        {'error': 'El servicio ya está en favoritos'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
                 
                 return Response(
                     FavoriteSerializer(favorite).data,
@@ -94,13 +108,11 @@ def favorite_remove(request, service_id):
         user_id = request.jwt_user_id
         service = get_object_or_404(Service, id=service_id)
         
-        favorite = get_object_or_404(
-            Favorite, 
-            user_id=user_id, 
-            service=service
-        )
-        
-        favorite.delete()
+        if not remove_favorite(user_id, service.id):
+            return Response(
+                {'error': 'El servicio no está en favoritos'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
         return Response(
             {'message': 'Servicio removido de favoritos'},
@@ -124,10 +136,7 @@ def favorite_check(request, service_id):
         user_id = request.jwt_user_id
         service = get_object_or_404(Service, id=service_id)
         
-        is_favorite = Favorite.objects.filter(
-            user_id=user_id, 
-            service=service
-        ).exists()
+        is_favorite = cached_is_favorite(user_id, service.id)
         
         return Response({
             'service_id': service_id,
@@ -141,6 +150,57 @@ def favorite_check(request, service_id):
         )
 
 
+# Máximo de servicios por consulta en check-many
+CHECK_MANY_LIMIT = 100
+
+
+@api_view(['POST'])
+@jwt_required_drf
+def favorite_check_many(request):
+    """
+    Verificar varios servicios en una sola petición
+    Body: {"service_ids": [1, 2, 3]}
+    """
+    try:
+        user_id = request.jwt_user_id
+        service_ids = request.data.get('service_ids')
+        
+        if not isinstance(service_ids, list):
+            return Response(
+                {'error': 'service_ids debe ser una lista'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(service_ids) > CHECK_MANY_LIMIT:
+            return Response(
+                {'error': f'Máximo {CHECK_MANY_LIMIT} servicios por consulta'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            service_ids = [int(service_id) for service_id in service_ids]
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'service_ids debe contener solo enteros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        favorite_ids = get_favorite_ids(user_id)
+        
+        return Response({
+            'favorites': {
+                str(service_id): service_id in favorite_ids
+                for service_id in service_ids
+            }
+        }, status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @api_view(['GET'])
 @jwt_required_drf
 def favorites_stats(request):
@@ -212,25 +272,16 @@ def favorite_toggle(request, service_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        favorite = Favorite.objects.filter(
-            user_id=user_id, 
-            service=service
-        ).first()
+        # DELETE primero; solo se inserta si no existía
+        is_favorite = toggle_favorite(user_id, service)
         
-        if favorite:
-            # Quitar de favoritos
-            favorite.delete()
+        if not is_favorite:
             return Response({
                 'service_id': service_id,
                 'is_favorite': False,
                 'message': 'Servicio removido de favoritos'
             }, status=status.HTTP_200_OK)
         else:
-            # Agregar a favoritos
-            favorite = Favorite.objects.create(
-                user_id=user_id,
-                service=service
-            )
             return Response({
                 'service_id': service_id,
                 'is_favorite': True,
@@ -17,15 +17,21 @@ if not firebase_admin._apps:
         cred_dict = json.loads(firebase_credentials_json)
         cred = credentials.Certificate(cred_dict)
         logger.info("🔥 Firebase inicializado desde variable de entorno")
-    else:
+    elif os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
         # Opción 2: Usar archivo local (para desarrollo)
         cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
         logger.info("🔥 Firebase inicializado desde archivo local")
+    else:
+        # Sin credenciales (p. ej. tests): los envíos fallan y se registran
+        cred = None
+        logger.warning("⚠️ Firebase sin credenciales, no se enviarán notificaciones push")
     
-    firebase_admin.initialize_app(cred)
+    if cred:
+        firebase_admin.initialize_app(cred)
 
 
-def send_push_notification(user_id: int, title: str, message: str, data: dict = None):
+def send_push_notification(user_id: int, title: str, message: str, data: dict = None,
+                           skip_if_online: bool = False):
     """
     Envía una notificación push a un usuario específico
     
@@ -34,11 +40,18 @@ def send_push_notification(user_id: int, title: str, message: str, data: dict =
         title: Título de la notificación
         message: Mensaje de la notificación
         data: Datos adicionales (opcional)
+        skip_if_online: No enviar si el usuario tiene el chat abierto
+            (usarlo cuando el mismo evento ya le llega por WebSocket)
     
     Returns:
         bool: True si se envió exitosamente, False en caso contrario
     """
     from apps.notifications.models import DeviceToken
+    from apps.chat.presence import is_online
+    
+    if skip_if_online and is_online(user_id):
+        logger.info(f"⏭️ Push omitida, user_id={user_id} está conectado: {title}")
+        return False
     
     # Log de entrada para debug
     print(f"📤 Intentando enviar push a user_id={user_id}: {title}")
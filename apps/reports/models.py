@@ -4,6 +4,7 @@ Modelos de reportes
 from django.db import models
 from apps.bookings.models import Booking
 from apps.services.models import Service
+from apps.users.models import cached_user
 
 
 class Report(models.Model):
@@ -50,3 +51,17 @@ class Report(models.Model):
             models.Index(fields=['reporter_id']),
             models.Index(fields=['reported_user_id']),
         ]
+    
+    # Usuarios por id, consultados una sola vez por instancia (ver attach_users)
+    
+    @property
+    def reporter(self):
+        return cached_user(self, 'reporter', self.reporter_id)
+    
+    @property
+    def reported_user(self):
+        return cached_user(self, 'reported_user', self.reported_user_id)
+    
+    @property
+    def admin_user(self):
+        return cached_user(self, 'admin_user', self.admin_user_id)
@@ -22,11 +22,25 @@ def on_report_status_change(sender, instance, created, **kwargs):
     
     elif instance.status == 'resolved' and instance.resolved_at:
         # Reporte resuelto - notificar al reportador
-        SpringBootClient.create_notification(
-            user_id=instance.reporter_id,
-            notification_type='REPORT_RESOLVED',
-            title='Reporte resuelto',
-            message='Tu reporte ha sido revisado y resuelto',
-            link_url=f'/reports/{instance.id}',
-            related_id=instance.id
-        )
+        notify_report_resolved(instance.id, instance.reporter_id)
+
+
+def notify_report_resolved(report_id, reporter_id):
+    """Notificar al reportador que su reporte fue resuelto"""
+    SpringBootClient.create_notification(
+        user_id=reporter_id,
+        notification_type='REPORT_RESOLVED',
+        title='Reporte resuelto',
+        message='Tu reporte ha sido revisado y resuelto',
+        link_url=f'/reports/{report_id}',
+        related_id=report_id
+    )
+
+
+def notify_reports_resolved(reports):
+    """
+    Tarea en bloque: notificar los reportes resueltos en una acción
+    masiva. `reports` es una lista de (report_id, reporter_id)
+    """
+    for report_id, reporter_id in reports:
+        notify_report_resolved(report_id, reporter_id)
@@ -0,0 +1,56 @@
+"""
+Tests de la actualización en bloque de reportes
+"""
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.shared.testing import UsersTableMixin, auth_header, create_user
+from .models import Report
+
+
+class AdminReportsBulkUpdateTests(UsersTableMixin, TestCase):
+
+    url = '/api/dashboard/reports/admin/bulk/'
+
+    def setUp(self):
+        create_user(99, role='ADMIN')
+        create_user(2)
+        self.open_report = Report.objects.create(
+            reporter_id=2, reported_user_id=5, reason='spam', description='Mensajes repetidos'
+        )
+        self.closed_report = Report.objects.create(
+            reporter_id=3, reported_user_id=5, reason='fraud', description='Cobro doble',
+            status='dismissed'
+        )
+        patcher = mock.patch('apps.reports.views.run_in_background')
+        self.run_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, data, user_id=99):
+        return self.client.post(self.url, data, content_type='application/json', **auth_header(user_id))
+
+    def test_resolve_outcome_per_id(self):
+        response = self.post({
+            'ids': [self.open_report.pk, self.closed_report.pk, 999],
+            'action': 'resolved',
+            'admin_notes': 'Usuario advertido'
+        })
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([item['result'] for item in response.json()['results']],
+                         ['updated', 'unchanged', 'not_found'])
+        self.open_report.refresh_from_db()
+        self.assertEqual(self.open_report.status, 'resolved')
+        self.assertEqual(self.open_report.admin_user_id, 99)
+        self.assertEqual(self.open_report.admin_notes, 'Usuario advertido')
+        self.assertIsNotNone(self.open_report.resolved_at)
+        # Solo se notifica al autor del reporte que cambió
+        self.run_in_background.assert_called_once()
+        self.assertEqual(self.run_in_background.call_args.args[1], [(self.open_report.pk, 2)])
+
+    def test_only_admins_can_call_it(self):
+        response = self.post({'ids': [self.open_report.pk], 'action': 'resolved'}, user_id=2)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Report.objects.get(pk=self.open_report.pk).status, 'open')
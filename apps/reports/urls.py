@@ -13,6 +13,7 @@ urlpatterns = [
     
     # Admin endpoints
     path('admin/', views.admin_reports_list, name='admin_reports_list'),
+    path('admin/bulk/', views.admin_reports_bulk_update, name='admin_reports_bulk_update'),
     path('admin/<int:report_id>/', views.admin_report_update, name='admin_report_update'),
     path('admin/<int:report_id>/resolve/', views.admin_report_resolve, name='admin_report_resolve'),
     path('admin/stats/', views.admin_reports_stats, name='admin_reports_stats'),
@@ -5,11 +5,17 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from conectaya.authentication.decorators import jwt_required_drf
-from apps.users.models import User
+from apps.shared.background import run_in_background
+from apps.shared.bulk import parse_bulk_request, bulk_update, updated_ids, bulk_response_data
+from apps.shared.pagination import KeysetPagination
+from apps.users.models import User, attach_users
 from .models import Report
+from .signals import notify_reports_resolved
 from .serializers import (
     ReportSerializer, ReportListSerializer, ReportCreateSerializer,
     ReportModerationSerializer
@@ -108,7 +114,9 @@ def report_detail(request, report_id):
 @jwt_required_drf
 def admin_reports_list(request):
     """
-    Lista todos los reportes para moderación (solo admin)
+    Cola de moderación de reportes (solo admin), paginada por cursor
+    Query params: status (default open), reason, cursor, page_size,
+    count=exact|approximate|none
     """
     try:
         user_id = request.jwt_user_id
@@ -124,7 +132,7 @@ def admin_reports_list(request):
         status_filter = request.GET.get('status', 'open')
         reason_filter = request.GET.get('reason')
         
-        reports = Report.objects.all()
+        reports = Report.objects.select_related('service', 'booking')
         
         if status_filter:
             reports = reports.filter(status=status_filter)
@@ -132,12 +140,20 @@ def admin_reports_list(request):
         if reason_filter:
             reports = reports.filter(reason=reason_filter)
         
-        reports = reports.order_by('-created_at')
+        # Paginación por cursor sobre (created_at, id)
+        paginator = KeysetPagination()
+        try:
+            page = paginator.paginate_queryset(reports, request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = ReportModerationSerializer(reports, many=True)
+        # Reportadores y reportados de toda la página en una sola consulta
+        attach_users(page, reporter='reporter_id', reported_user='reported_user_id')
+        
+        serializer = ReportModerationSerializer(page, many=True)
         return Response({
             'reports': serializer.data,
-            'count': reports.count()
+            **paginator.get_pagination_data()
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -238,6 +254,67 @@ def admin_report_resolve(request, report_id):
         )
 
 
+
+# Acciones en bloque: estado destino de los reportes
+BULK_REPORT_ACTIONS = ['in_review', 'resolved', 'dismissed']
+CLOSED_REPORT_STATUSES = ['resolved', 'dismissed']
+
+
+@api_view(['POST'])
+@jwt_required_drf
+def admin_reports_bulk_update(request):
+    """
+    Cambiar el estado de varios reportes en una sola petición (solo admin)
+    Body: {"ids": [1, 2, 3], "action": "in_review" | "resolved" | "dismissed",
+           "admin_notes": "..."}
+
+    Los reportes ya cerrados no se vuelven a resolver. Las notificaciones a
+    los reportadores se envían en una sola tarea en segundo plano.
+    """
+    try:
+        user_id = request.jwt_user_id
+        user = get_object_or_404(User, id=user_id)
+        
+        if user.role != 'ADMIN':
+            return Response(
+                {'error': 'Acceso denegado'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            ids, action = parse_bulk_request(request.data, BULK_REPORT_ACTIONS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        now = timezone.now()
+        values = {'status': action, 'admin_user_id': user_id, 'updated_at': now}
+        if 'admin_notes' in request.data:
+            values['admin_notes'] = request.data.get('admin_notes') or ''
+        
+        if action in CLOSED_REPORT_STATUSES:
+            values['resolved_at'] = now
+            unchanged = Q(status__in=CLOSED_REPORT_STATUSES)
+        else:
+            unchanged = Q(status=action)
+        
+        with transaction.atomic():
+            outcomes = bulk_update(Report.objects.all(), ids, values, unchanged=unchanged)
+            
+            if action == 'resolved':
+                resolved = list(
+                    Report.objects.filter(id__in=updated_ids(outcomes)).values_list('id', 'reporter_id')
+                )
+                if resolved:
+                    run_in_background(notify_reports_resolved, resolved)
+        
+        return Response(bulk_response_data(action, outcomes), status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['GET'])
 @jwt_required_drf
 def admin_reports_stats(request):
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['is_flagged', '-created_at'], name='reviews_is_flag_961ce9_idx'),
+        ),
+    ]
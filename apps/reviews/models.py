@@ -5,7 +5,7 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from apps.services.models import Service
 from apps.bookings.models import Booking
-from apps.users.models import User
+from apps.users.models import cached_user
 
 
 class Review(models.Model):
@@ -34,6 +34,7 @@ class Review(models.Model):
         indexes = [
             models.Index(fields=['service', '-created_at']),
             models.Index(fields=['reviewer_id']),
+            models.Index(fields=['is_flagged', '-created_at']),  # Cola de moderación
         ]
         constraints = [
             models.UniqueConstraint(
@@ -44,7 +45,5 @@ class Review(models.Model):
     
     @property
     def reviewer(self):
-        try:
-            return User.objects.get(id=self.reviewer_id)
-        except User.DoesNotExist:
-            return None
+        """Autor de la reseña (se consulta una sola vez por instancia, ver attach_users)"""
+        return cached_user(self, 'reviewer', self.reviewer_id)
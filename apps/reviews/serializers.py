@@ -6,6 +6,7 @@ from .models import Review
 from apps.services.models import Service
 from apps.bookings.models import Booking
 from apps.users.models import User
+from apps.shared.serializers import DynamicFieldsMixin
 
 
 class ReviewerSerializer(serializers.ModelSerializer):
@@ -32,8 +33,10 @@ class BookingBasicSerializer(serializers.ModelSerializer):
         fields = ['id', 'booking_date', 'status']
 
 
-class ReviewSerializer(serializers.ModelSerializer):
-    """Serializer completo para reviews"""
+class ReviewSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer completo para reviews (admite ?fields=)"""
+    
+    select_related_fields = {'service': ['service'], 'booking': ['booking']}
     
     reviewer = ReviewerSerializer(read_only=True)
     service = ServiceBasicSerializer(read_only=True)
@@ -117,8 +120,10 @@ class ReviewUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
-class ReviewListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listas de reviews"""
+class ReviewListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer simplificado para listas de reviews (admite ?fields=)"""
+    
+    select_related_fields = {'service_title': ['service'], 'provider_name': ['service']}
     
     reviewer_name = serializers.CharField(source='reviewer.full_name', read_only=True)
     service_title = serializers.CharField(source='service.title', read_only=True)
@@ -132,8 +137,10 @@ class ReviewListSerializer(serializers.ModelSerializer):
         ]
 
 
-class ReviewModerationSerializer(serializers.ModelSerializer):
-    """Serializer para moderación de reviews (admin)"""
+class ReviewModerationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer para moderación de reviews (admin, admite ?fields=)"""
+    
+    select_related_fields = {'service': ['service']}
     
     reviewer = ReviewerSerializer(read_only=True)
     service = ServiceBasicSerializer(read_only=True)
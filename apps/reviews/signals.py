@@ -1,30 +1,96 @@
 """
 Signals para sincronización automática de reviews
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Review
 from apps.services.models import Service
+from apps.users.models import ProviderStats
 from apps.shared.springboot_client import SpringBootClient
 
 
+# Campos que afectan a los contadores de rating del servicio
+RATING_FIELDS = {'rating', 'is_visible', 'service', 'service_id'}
+
+
+def _rating_contribution(is_visible, rating):
+    """
+    Aporte de una review a (reviews_count, rating_sum) del servicio
+    """
+    if is_visible:
+        return 1, rating
+    return 0, 0
+
+
+def _apply_rating_delta(service_id, provider_id, count_delta, sum_delta):
+    """
+    Ajustar los contadores de rating del servicio y del proveedor
+    """
+    if not count_delta and not sum_delta:
+        return
+    Service.apply_rating_delta(service_id, count_delta, sum_delta)
+    ProviderStats.apply_delta(provider_id, total_reviews=count_delta, rating_sum=sum_delta)
+
+
+def _provider_of(service_id):
+    return Service.objects.filter(pk=service_id).values_list('provider_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Review)
+def track_review_rating_state(sender, instance, update_fields=None, **kwargs):
+    """
+    Guardar el estado previo de los campos de rating antes de actualizar
+    """
+    instance._previous_rating_state = None
+    instance._rating_fields_untouched = (
+        update_fields is not None and not RATING_FIELDS.intersection(update_fields)
+    )
+    if instance._rating_fields_untouched:
+        return
+    
+    if instance.pk:
+        instance._previous_rating_state = Review.objects.filter(pk=instance.pk).values(
+            'service_id', 'rating', 'is_visible'
+        ).first()
+    # Solo al crear o al cambiar de servicio puede llegar a un proveedor sin fila
+    previous = instance._previous_rating_state
+    if previous is None or previous['service_id'] != instance.service_id:
+        ProviderStats.ensure(instance.service.provider_id)
+
+
 @receiver(post_save, sender=Review)
 def on_review_created_or_updated(sender, instance, created, **kwargs):
     """
     Cuando se crea o actualiza una review:
-    1. Actualizar rating del Service
+    1. Ajustar el rating del Service y del proveedor con el delta (solo si cambió algo relevante)
     2. Actualizar reputación del proveedor en Spring Boot
     3. Notificar al proveedor
     """
-    # Actualizar rating del servicio
-    service = instance.service
-    reviews = service.reviews.filter(is_visible=True)
-    service.reviews_count = reviews.count()
-    service.rating_sum = sum(r.rating for r in reviews)
-    service.rating_avg = service.rating_sum / service.reviews_count if service.reviews_count > 0 else 0
-    service.save(update_fields=['reviews_count', 'rating_sum', 'rating_avg'])
+    previous = getattr(instance, '_previous_rating_state', None)
+    
+    if created or previous is None:
+        if not getattr(instance, '_rating_fields_untouched', False):
+            count, total = _rating_contribution(instance.is_visible, instance.rating)
+            _apply_rating_delta(instance.service_id, instance.service.provider_id, count, total)
+    else:
+        old_count, old_total = _rating_contribution(previous['is_visible'], previous['rating'])
+        new_count, new_total = _rating_contribution(instance.is_visible, instance.rating)
+        
+        if previous['service_id'] != instance.service_id:
+            # La review cambió de servicio: se resta del anterior y se suma al nuevo
+            _apply_rating_delta(
+                previous['service_id'], _provider_of(previous['service_id']), -old_count, -old_total
+            )
+            _apply_rating_delta(instance.service_id, instance.service.provider_id, new_count, new_total)
+        elif new_count != old_count or new_total != old_total:
+            _apply_rating_delta(
+                instance.service_id, instance.service.provider_id,
+                new_count - old_count, new_total - old_total
+            )
     
     if created:
+        service = instance.service
+        
         # Actualizar reputación del proveedor en Spring Boot
         SpringBootClient.update_reputation(
             user_id=service.provider_id,
@@ -46,11 +112,8 @@ def on_review_created_or_updated(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=Review)
 def on_review_deleted(sender, instance, **kwargs):
     """
-    Recalcular rating cuando se elimina una review
+    Descontar la review eliminada del rating del servicio y del proveedor
     """
-    service = instance.service
-    reviews = service.reviews.filter(is_visible=True)
-    service.reviews_count = reviews.count()
-    service.rating_sum = sum(r.rating for r in reviews)
-    service.rating_avg = service.rating_sum / service.reviews_count if service.reviews_count > 0 else 0
-    service.save(update_fields=['reviews_count', 'rating_sum', 'rating_avg'])
+    count, total = _rating_contribution(instance.is_visible, instance.rating)
+    if count:
+        _apply_rating_delta(instance.service_id, _provider_of(instance.service_id), -count, -total)
@@ -0,0 +1,167 @@
+"""
+Tests de los contadores de rating mantenidos por los signals de reviews
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase
+
+from apps.services.models import Service
+from apps.shared.testing import (
+    UsersTableMixin, auth_header, create_user, mock_springboot, run_concurrently
+)
+from apps.users.models import ProviderStats
+from .models import Review
+
+
+PROVIDER_ID = 1
+
+
+class ReviewRatingConcurrencyTests(TransactionTestCase):
+    """
+    Altas, ediciones y bajas de reseñas en paralelo no deben perder
+    incrementos en Service ni en ProviderStats
+    """
+
+    def setUp(self):
+        mock_springboot(self)
+        self.service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+        self.other_service = Service.objects.create(
+            provider_id=PROVIDER_ID, title='Electricidad', description='Instalaciones', price=80
+        )
+
+    def assertCountersMatchReviews(self):
+        """Los contadores desnormalizados coinciden con recalcularlos desde reviews"""
+        for service in (self.service, self.other_service):
+            service.refresh_from_db()
+            visible = Review.objects.filter(service=service, is_visible=True).aggregate(
+                total=Count('id'), rating_total=Sum('rating')
+            )
+            rating_total = visible['rating_total'] or 0
+            self.assertEqual(service.reviews_count, visible['total'])
+            self.assertEqual(service.rating_sum, rating_total)
+            expected_avg = Decimal('0.00')
+            if visible['total']:
+                expected_avg = (Decimal(rating_total) / visible['total']).quantize(
+                    Decimal('0.01'), rounding=ROUND_HALF_UP
+                )
+            self.assertEqual(service.rating_avg, expected_avg)
+
+        stats = ProviderStats.objects.get(provider_id=PROVIDER_ID)
+        expected = ProviderStats.compute([PROVIDER_ID])[PROVIDER_ID]
+        self.assertEqual(stats.total_reviews, expected['total_reviews'])
+        self.assertEqual(stats.rating_sum, expected['rating_sum'])
+
+    def test_concurrent_creates(self):
+        def create(reviewer_id, rating):
+            Review.objects.create(reviewer_id=reviewer_id, service=self.service, rating=rating)
+
+        errors = run_concurrently(create, [(100 + i, i % 5 + 1) for i in range(40)])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Review.objects.count(), 40)
+        self.assertCountersMatchReviews()
+        self.assertEqual(ProviderStats.objects.get(provider_id=PROVIDER_ID).total_reviews, 40)
+
+    def test_concurrent_updates_hides_moves_and_deletes(self):
+        reviews = [
+            Review.objects.create(reviewer_id=100 + i, service=self.service, rating=i % 5 + 1)
+            for i in range(40)
+        ]
+
+        def change(review_id, operation):
+            review = Review.objects.get(pk=review_id)
+            if operation == 'rate':
+                review.rating = 6 - review.rating
+                review.save()
+            elif operation == 'hide':
+                review.is_visible = False
+                review.save()
+            elif operation == 'move':
+                review.service = self.other_service
+                review.save()
+            elif operation == 'flag':
+                # No toca los campos de rating: no debe mover los contadores
+                review.is_flagged = True
+                review.save(update_fields=['is_flagged', 'updated_at'])
+            else:
+                review.delete()
+
+        operations = ['rate', 'hide', 'move', 'flag', 'delete']
+        errors = run_concurrently(change, [
+            (review.pk, operations[index % len(operations)])
+            for index, review in enumerate(reviews)
+        ])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Review.objects.count(), 32)
+        self.assertCountersMatchReviews()
+
+
+class AdminReviewsBulkModerateTests(UsersTableMixin, TestCase):
+    """La moderación en bloque (UPDATE sin signals) recalcula rating y ProviderStats"""
+
+    url = '/api/dashboard/reviews/admin/bulk/'
+
+    def setUp(self):
+        mock_springboot(self)
+        create_user(99, role='ADMIN')
+        self.services = [
+            Service.objects.create(
+                provider_id=provider_id, title='Servicio', description='Descripción', price=50
+            )
+            for provider_id in (1, 2)
+        ]
+        self.reviews = [
+            Review.objects.create(reviewer_id=100 + i, service=self.services[i % 2], rating=i % 5 + 1)
+            for i in range(6)
+        ]
+
+    def moderate(self, ids, action):
+        response = self.client.post(
+            self.url, {'ids': ids, 'action': action},
+            content_type='application/json', **auth_header(99)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def assertCountersMatchReviews(self):
+        for service in self.services:
+            service.refresh_from_db()
+            visible = Review.objects.filter(service=service, is_visible=True).aggregate(
+                total=Count('id'), rating_total=Sum('rating')
+            )
+            self.assertEqual(service.reviews_count, visible['total'])
+            self.assertEqual(service.rating_sum, visible['rating_total'] or 0)
+        for provider_id, expected in ProviderStats.compute([1, 2]).items():
+            stats = ProviderStats.objects.get(provider_id=provider_id)
+            self.assertEqual(stats.total_reviews, expected['total_reviews'])
+            self.assertEqual(stats.rating_sum, expected['rating_sum'])
+
+    def test_hide_and_show_recompute_the_counters(self):
+        hidden = [self.reviews[0].pk, self.reviews[1].pk, self.reviews[2].pk]
+
+        data = self.moderate(hidden + [999], 'hide')
+
+        self.assertEqual(data['summary'], {'updated': 3, 'unchanged': 0, 'forbidden': 0, 'not_found': 1})
+        self.assertEqual(Review.objects.filter(is_visible=False).count(), 3)
+        self.assertCountersMatchReviews()
+        self.assertEqual(ProviderStats.objects.get(provider_id=1).total_reviews, 1)
+
+        data = self.moderate([self.reviews[0].pk, self.reviews[3].pk], 'show')
+
+        self.assertEqual(
+            [item['result'] for item in data['results']], ['updated', 'unchanged']
+        )
+        self.assertCountersMatchReviews()
+
+    def test_unflag_does_not_touch_the_counters(self):
+        Review.objects.filter(pk=self.reviews[0].pk).update(is_flagged=True, flagged_reason='spam')
+
+        data = self.moderate([self.reviews[0].pk, self.reviews[1].pk], 'unflag')
+
+        self.assertEqual([item['result'] for item in data['results']], ['updated', 'unchanged'])
+        self.assertFalse(Review.objects.filter(is_flagged=True).exists())
+        self.assertCountersMatchReviews()
@@ -19,5 +19,6 @@ urlpatterns = [
     
     # Admin endpoints
     path('admin/', views.admin_reviews_list, name='admin_reviews_list'),
+    path('admin/bulk/', views.admin_reviews_bulk_moderate, name='admin_reviews_bulk_moderate'),
     path('admin/<int:review_id>/', views.admin_review_moderate, name='admin_review_moderate'),
 ]
@@ -5,11 +5,17 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Count, Max
+from django.utils import timezone
 
 from conectaya.authentication.decorators import jwt_required_drf
-from apps.users.models import User
+from apps.shared.bulk import parse_bulk_request, bulk_update, updated_ids, bulk_response_data
+from apps.shared.conditional import conditional_get
+from apps.shared.pagination import KeysetPagination
+from apps.users.models import User, ProviderStats, attach_users
 from apps.services.models import Service
+from apps.services.counters import recalculate_counters
 from apps.bookings.models import Booking
 from .models import Review
 from .serializers import (
@@ -45,7 +51,10 @@ def reviews_list_create(request):
                 reviews = Review.objects.filter(reviewer_id=user_id, is_visible=True)
                 reviews = reviews.order_by('-created_at')
             
-            serializer = ReviewListSerializer(reviews, many=True)
+            context = {'request': request}
+            serializer = ReviewListSerializer(
+                ReviewListSerializer.setup_queryset(reviews, context), many=True, context=context
+            )
             return Response({
                 'reviews': serializer.data,
                 'count': reviews.count()
@@ -159,7 +168,26 @@ def review_detail(request, review_id):
         )
 
 
+def _service_reviews_version(request, service_id):
+    """
+    Validador: estado del servicio + cantidad y última modificación de sus reseñas
+    """
+    service = Service.objects.filter(
+        id=service_id, is_active=True, is_published=True
+    ).values('updated_at', 'reviews_count', 'rating_avg').first()
+    if service is None:
+        return None
+    reviews = Review.objects.filter(service_id=service_id, is_visible=True).aggregate(
+        total=Count('id'), last_update=Max('updated_at')
+    )
+    return (
+        f"{service['updated_at']}:{service['reviews_count']}:{service['rating_avg']}:"
+        f"{reviews['total']}:{reviews['last_update']}"
+    )
+
+
 @api_view(['GET'])
+@conditional_get(_service_reviews_version)
 def service_reviews(request, service_id):
     """
     Lista reviews de un servicio específico (público)
@@ -177,7 +205,10 @@ def service_reviews(request, service_id):
         if rating_filter:
             reviews = reviews.filter(rating=rating_filter)
         
-        serializer = ReviewSerializer(reviews, many=True)
+        context = {'request': request}
+        serializer = ReviewSerializer(
+            ReviewSerializer.setup_queryset(reviews, context), many=True, context=context
+        )
         return Response({
             'reviews': serializer.data,
             'count': reviews.count(),
@@ -217,7 +248,8 @@ def review_flag(request, review_id):
         
         review.is_flagged = True
         review.flagged_reason = reason
-        review.save()
+        # Solo campos de moderación: no dispara el recálculo del rating
+        review.save(update_fields=['is_flagged', 'flagged_reason', 'updated_at'])
         
         return Response(
             {'message': 'Review reportada correctamente'},
@@ -237,7 +269,8 @@ def review_flag(request, review_id):
 @jwt_required_drf
 def admin_reviews_list(request):
     """
-    Lista todas las reviews para moderación (solo admin)
+    Cola de moderación de reviews (solo admin), paginada por cursor
+    Query params: flagged=true, cursor, page_size, count=exact|approximate|none
     """
     try:
         user_id = request.jwt_user_id
@@ -252,16 +285,25 @@ def admin_reviews_list(request):
         # Filtros
         flagged_only = request.GET.get('flagged') == 'true'
         
-        reviews = Review.objects.all()
+        context = {'request': request}
+        reviews = ReviewModerationSerializer.setup_queryset(Review.objects.all(), context)
         if flagged_only:
             reviews = reviews.filter(is_flagged=True)
         
-        reviews = reviews.order_by('-created_at')
+        # Paginación por cursor sobre (created_at, id)
+        paginator = KeysetPagination()
+        try:
+            page = paginator.paginate_queryset(reviews, request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Autores de toda la página en una sola consulta
+        attach_users(page, reviewer='reviewer_id')
         
-        serializer = ReviewModerationSerializer(reviews, many=True)
+        serializer = ReviewModerationSerializer(page, many=True, context=context)
         return Response({
             'reviews': serializer.data,
-            'count': reviews.count()
+            **paginator.get_pagination_data()
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -309,3 +351,65 @@ def admin_review_moderate(request, review_id):
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+# Acciones de moderación en bloque: valores a escribir en cada review
+BULK_REVIEW_ACTIONS = {
+    'hide': {'is_visible': False, 'is_flagged': False},
+    'show': {'is_visible': True},
+    'unflag': {'is_flagged': False, 'flagged_reason': None},
+}
+
+
+@api_view(['POST'])
+@jwt_required_drf
+def admin_reviews_bulk_moderate(request):
+    """
+    Moderar varias reviews en una sola petición (solo admin)
+    Body: {"ids": [1, 2, 3], "action": "hide" | "show" | "unflag"}
+
+    hide oculta la review y da por atendida su marca. El rating de los
+    servicios y las estadísticas de sus proveedores se recalculan una sola
+    vez para todo el bloque.
+    """
+    try:
+        user_id = request.jwt_user_id
+        user = get_object_or_404(User, id=user_id)
+        
+        if user.role != 'ADMIN':
+            return Response(
+                {'error': 'Acceso denegado'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            ids, action = parse_bulk_request(request.data, BULK_REVIEW_ACTIONS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        values = BULK_REVIEW_ACTIONS[action]
+        with transaction.atomic():
+            outcomes = bulk_update(
+                Review.objects.all(), ids,
+                dict(values, updated_at=timezone.now()),
+                unchanged=Q(**values)
+            )
+            changed = updated_ids(outcomes)
+            
+            # Solo la visibilidad afecta a los contadores de rating
+            if changed and 'is_visible' in values:
+                service_ids = set(
+                    Review.objects.filter(id__in=changed).values_list('service_id', flat=True)
+                )
+                recalculate_counters(['ratings'], service_ids)
+                ProviderStats.recompute_many(
+                    Service.objects.filter(id__in=service_ids).values_list('provider_id', flat=True)
+                )
+        
+        return Response(bulk_response_data(action, outcomes), status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
@@ -0,0 +1,57 @@
+"""
+Cache en proceso del listado público de categorías
+
+Las categorías solo cambian desde los endpoints admin y los conteos solo
+al publicar/despublicar, activar o borrar servicios, así que el listado se
+guarda en memoria del proceso junto con la versión `categories`
+(apps.shared.versions) con la que se construyó. Cada petición compara la
+versión actual y solo reconstruye cuando cambió.
+"""
+import time
+
+from django.db.models import Count, Q
+
+from apps.shared.versions import get_version, CATEGORIES_VERSION
+from .models import Category
+
+
+# Límite de antigüedad por si hay cambios hechos fuera de Django
+CATEGORIES_MAX_AGE = 60 * 10
+
+# (versión, momento de construcción, payload)
+_cached = None
+
+
+def _build_payload():
+    """Categorías activas con el conteo de servicios publicados (una consulta)"""
+    from .serializers import CategorySerializer
+
+    categories = Category.objects.filter(is_active=True).annotate(
+        annotated_services_count=Count(
+            'services',
+            filter=Q(services__is_published=True, services__is_active=True)
+        )
+    ).order_by('order', 'name')
+
+    data = [dict(item) for item in CategorySerializer(categories, many=True).data]
+    return {
+        'categories': data,
+        'count': len(data)
+    }
+
+
+def get_public_categories(version=None):
+    """
+    Listado público de categorías, reconstruido solo si cambió la versión
+    """
+    global _cached
+    if version is None:
+        version = get_version(CATEGORIES_VERSION)
+
+    cached = _cached
+    if cached and cached[0] == version and time.monotonic() - cached[1] < CATEGORIES_MAX_AGE:
+        return cached[2]
+
+    payload = _build_payload()
+    _cached = (version, time.monotonic(), payload)
+    return payload
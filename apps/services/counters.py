@@ -0,0 +1,225 @@
+"""
+Recalculo de contadores desnormalizados de Service
+
+Los contadores (reviews_count, rating_sum, rating_avg, favorites_count,
+bookings_count) se mantienen por deltas desde los signals; este módulo los
+recalcula desde las tablas origen para reparar posibles desvíos.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from apps.bookings.models import Booking
+from apps.favorites.models import Favorite
+from apps.reviews.models import Review
+from .models import Service
+
+
+# Grupos de contadores que se pueden recalcular por separado
+COUNTER_FIELDS = {
+    'ratings': ['reviews_count', 'rating_sum', 'rating_avg'],
+    'favorites': ['favorites_count'],
+    'bookings': ['bookings_count'],
+}
+
+# bookings_count cuenta las contrataciones completadas del servicio
+COUNTED_BOOKING_STATUS = 'completed'
+
+CHUNK_SIZE = 1000
+
+
+def _rating_avg(rating_sum, reviews_count):
+    if not reviews_count:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / Decimal(reviews_count)).quantize(
+        Decimal('0.01'), rounding=ROUND_HALF_UP
+    )
+
+
+def _expected_values(group, service_ids):
+    """
+    Valores correctos de un grupo de contadores para los servicios dados
+    (una sola consulta agrupada)
+    """
+    if group == 'ratings':
+        rows = Review.objects.filter(
+            service_id__in=service_ids, is_visible=True
+        ).values('service_id').annotate(total=Count('id'), rating_total=Sum('rating'))
+        expected = {
+            row['service_id']: (
+                row['total'],
+                row['rating_total'] or 0,
+                _rating_avg(row['rating_total'] or 0, row['total'])
+            )
+            for row in rows
+        }
+        default = (0, 0, Decimal('0.00'))
+    elif group == 'favorites':
+        rows = Favorite.objects.filter(
+            service_id__in=service_ids
+        ).values('service_id').annotate(total=Count('id'))
+        expected = {row['service_id']: (row['total'],) for row in rows}
+        default = (0,)
+    else:
+        rows = Booking.objects.filter(
+            service_id__in=service_ids, status=COUNTED_BOOKING_STATUS
+        ).values('service_id').annotate(total=Count('id'))
+        expected = {row['service_id']: (row['total'],) for row in rows}
+        default = (0,)
+
+    return {service_id: expected.get(service_id, default) for service_id in service_ids}
+
+
+def services_touched_since(since):
+    """
+    IDs de servicios con reseñas, favoritos o bookings modificados desde `since`
+
+    Los borrados no dejan rastro, así que el modo incremental no detecta
+    desvíos causados solo por eliminaciones.
+    """
+    service_ids = set(Review.objects.filter(updated_at__gte=since).values_list('service_id', flat=True))
+    service_ids.update(Favorite.objects.filter(created_at__gte=since).values_list('service_id', flat=True))
+    service_ids.update(Booking.objects.filter(updated_at__gte=since).values_list('service_id', flat=True))
+    service_ids.update(Service.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+    return service_ids
+
+
+def find_drift(group, service_ids=None):
+    """
+    Recorre los servicios por bloques y devuelve los que tienen el grupo de
+    contadores desfasado: lista de (service_id, valores_actuales, valores_correctos)
+    """
+    fields = COUNTER_FIELDS[group]
+    services = Service.objects.order_by('id')
+    if service_ids is not None:
+        services = services.filter(id__in=service_ids)
+
+    drift = []
+    last_id = 0
+    while True:
+        chunk = list(services.filter(id__gt=last_id).values_list('id', *fields)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        expected = _expected_values(group, [row[0] for row in chunk])
+        for row in chunk:
+            current = tuple(row[1:])
+            if current != expected[row[0]]:
+                drift.append((row[0], current, expected[row[0]]))
+
+    return drift
+
+
+# UPDATE ... FROM por grupo (PostgreSQL). Cada subconsulta agrupa una sola
+# vez la tabla origen y solo se escriben las filas que realmente cambian.
+_POSTGRES_UPDATES = {
+    'ratings': """
+        UPDATE {services} AS s
+        SET reviews_count = t.reviews_count,
+            rating_sum = t.rating_sum,
+            rating_avg = t.rating_avg
+        FROM (
+            SELECT sv.id,
+                   COALESCE(r.total, 0) AS reviews_count,
+                   COALESCE(r.rating_total, 0) AS rating_sum,
+                   COALESCE(ROUND(r.rating_total::numeric / NULLIF(r.total, 0), 2), 0) AS rating_avg
+            FROM {services} sv
+            LEFT JOIN (
+                SELECT service_id, COUNT(*) AS total, SUM(rating) AS rating_total
+                FROM {reviews}
+                WHERE is_visible
+                GROUP BY service_id
+            ) r ON r.service_id = sv.id
+            {where}
+        ) t
+        WHERE s.id = t.id
+          AND (s.reviews_count IS DISTINCT FROM t.reviews_count
+               OR s.rating_sum IS DISTINCT FROM t.rating_sum
+               OR s.rating_avg IS DISTINCT FROM t.rating_avg)
+    """,
+    'favorites': """
+        UPDATE {services} AS s
+        SET favorites_count = t.favorites_count
+        FROM (
+            SELECT sv.id, COALESCE(f.total, 0) AS favorites_count
+            FROM {services} sv
+            LEFT JOIN (
+                SELECT service_id, COUNT(*) AS total
+                FROM {favorites}
+                GROUP BY service_id
+            ) f ON f.service_id = sv.id
+            {where}
+        ) t
+        WHERE s.id = t.id
+          AND s.favorites_count IS DISTINCT FROM t.favorites_count
+    """,
+    'bookings': """
+        UPDATE {services} AS s
+        SET bookings_count = t.bookings_count
+        FROM (
+            SELECT sv.id, COALESCE(b.total, 0) AS bookings_count
+            FROM {services} sv
+            LEFT JOIN (
+                SELECT service_id, COUNT(*) AS total
+                FROM {bookings}
+                WHERE status = %s
+                GROUP BY service_id
+            ) b ON b.service_id = sv.id
+            {where}
+        ) t
+        WHERE s.id = t.id
+          AND s.bookings_count IS DISTINCT FROM t.bookings_count
+    """,
+}
+
+
+def _recalculate_postgres(group, service_ids):
+    params = [COUNTED_BOOKING_STATUS] if group == 'bookings' else []
+    where = ''
+    if service_ids is not None:
+        where = 'WHERE sv.id = ANY(%s)'
+        params.append(list(service_ids))
+
+    sql = _POSTGRES_UPDATES[group].format(
+        services=Service._meta.db_table,
+        reviews=Review._meta.db_table,
+        favorites=Favorite._meta.db_table,
+        bookings=Booking._meta.db_table,
+        where=where,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _recalculate_chunked(group, service_ids):
+    fields = COUNTER_FIELDS[group]
+    to_update = []
+    for service_id, _current, expected in find_drift(group, service_ids):
+        service = Service(id=service_id)
+        for field, value in zip(fields, expected):
+            setattr(service, field, value)
+        to_update.append(service)
+
+    Service.objects.bulk_update(to_update, fields, batch_size=CHUNK_SIZE)
+    return len(to_update)
+
+
+def recalculate_counters(groups=None, service_ids=None):
+    """
+    Recalcular los grupos de contadores indicados (todos por defecto).
+    Devuelve {grupo: servicios_actualizados}
+    """
+    groups = groups or list(COUNTER_FIELDS)
+    if service_ids is not None and not service_ids:
+        return {group: 0 for group in groups}
+
+    recalculate = _recalculate_postgres if connection.vendor == 'postgresql' else _recalculate_chunked
+
+    updated = {}
+    with transaction.atomic():
+        for group in groups:
+            updated[group] = recalculate(group, service_ids)
+    return updated
@@ -0,0 +1,75 @@
+"""
+Recalcula los contadores desnormalizados de los servicios
+
+Uso:
+    python manage.py recalculate_service_counters
+    python manage.py recalculate_service_counters --dry-run
+    python manage.py recalculate_service_counters --since 2025-01-31 --only ratings
+"""
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.services.counters import (
+    COUNTER_FIELDS, find_drift, recalculate_counters, services_touched_since
+)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula reviews_count, rating_sum, rating_avg, favorites_count y bookings_count de los servicios'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar los servicios desfasados, sin escribir cambios'
+        )
+        parser.add_argument(
+            '--since',
+            help='Solo servicios con reseñas/favoritos/bookings modificados desde esta fecha (ISO)'
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            choices=list(COUNTER_FIELDS),
+            help='Grupo de contadores a recalcular (se puede repetir)'
+        )
+
+    def _parse_since(self, value):
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Fecha inválida para --since: {value}')
+            since = datetime.combine(day, time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def handle(self, *args, **options):
+        groups = options['only'] or list(COUNTER_FIELDS)
+
+        service_ids = None
+        if options['since']:
+            service_ids = services_touched_since(self._parse_since(options['since']))
+            self.stdout.write(f'{len(service_ids)} servicios modificados desde {options["since"]}')
+
+        if options['dry_run']:
+            for group in groups:
+                drift = find_drift(group, service_ids) if service_ids is None or service_ids else []
+                fields = COUNTER_FIELDS[group]
+                for service_id, current, expected in drift:
+                    changes = ', '.join(
+                        f'{field}: {old} -> {new}'
+                        for field, old, new in zip(fields, current, expected)
+                        if old != new
+                    )
+                    self.stdout.write(f'[{group}] servicio {service_id}: {changes}')
+                self.stdout.write(f'[{group}] {len(drift)} servicios desfasados')
+            return
+
+        updated = recalculate_counters(groups, service_ids)
+        for group, count in updated.items():
+            self.stdout.write(self.style.SUCCESS(f'[{group}] {count} servicios actualizados'))
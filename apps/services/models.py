@@ -1,9 +1,12 @@
 """
 Modelos de servicios
 """
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, FloatField, Value, When
+from django.db.models.functions import Cast
 from django.utils.text import slugify
-from apps.users.models import User
+from apps.users.models import cached_user
 
 
 class Category(models.Model):
@@ -77,11 +80,75 @@ class Service(models.Model):
     
     @property
     def provider(self):
-        """Helper para obtener el proveedor"""
-        try:
-            return User.objects.get(id=self.provider_id)
-        except User.DoesNotExist:
-            return None
+        """Helper para obtener el proveedor (se consulta una sola vez por instancia)"""
+        return cached_user(self, 'provider', self.provider_id)
+    
+    def sync_images(self, file_ids):
+        """
+        Sincronizar las imágenes con la lista de file_ids (en orden) aplicando
+        solo las diferencias: bulk_create para las nuevas, un único DELETE
+        para las que sobran y bulk_update para los cambios de orden
+        """
+        with transaction.atomic():
+            existing = {}
+            for image in self.images.all():
+                existing.setdefault(image.file_id, []).append(image)
+            
+            to_create = []
+            to_update = []
+            for index, file_id in enumerate(file_ids):
+                matches = existing.get(file_id)
+                if matches:
+                    image = matches.pop(0)
+                    if image.order != index:
+                        image.order = index
+                        to_update.append(image)
+                else:
+                    to_create.append(ServiceImage(service=self, file_id=file_id, order=index))
+            
+            to_delete = [image.id for images in existing.values() for image in images]
+            
+            if to_delete:
+                ServiceImage.objects.filter(id__in=to_delete).delete()
+            if to_update:
+                ServiceImage.objects.bulk_update(to_update, ['order'])
+            if to_create:
+                ServiceImage.objects.bulk_create(to_create)
+            
+            changed = bool(to_delete or to_update or to_create)
+            if changed:
+                # Las imágenes aparecen en el perfil público del proveedor y en el catálogo
+                from apps.shared.versions import bump_provider_version
+                bump_provider_version(self.provider_id, catalog=True)
+        
+        return changed
+    
+    @classmethod
+    def apply_rating_delta(cls, service_id, count_delta, sum_delta):
+        """
+        Ajustar reviews_count/rating_sum de forma atómica con F() y
+        recalcular rating_avg en SQL, sin releer las reseñas del servicio
+        """
+        if not count_delta and not sum_delta:
+            return 0
+        
+        new_count = F('reviews_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        
+        # rating_avg va primero para que se evalúe con los valores previos
+        # de la fila también en motores que aplican el SET en orden (MySQL)
+        return cls.objects.filter(pk=service_id).update(
+            rating_avg=Case(
+                When(
+                    reviews_count__gt=-count_delta,
+                    then=Cast(new_sum, FloatField()) / new_count
+                ),
+                default=Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+            reviews_count=new_count,
+            rating_sum=new_sum,
+        )
 
 
 class ServiceImage(models.Model):
@@ -1,82 +1,160 @@
 """
 Vista para obtener el perfil público de un proveedor
 """
+import hashlib
+
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from django.shortcuts import get_object_or_404
-from django.db.models import Avg
+from django.core.cache import cache
 
-from apps.users.models import User, UserProfile
+from apps.users.models import User, UserProfile, ProviderStats
 from apps.services.models import Service
-from apps.bookings.models import Booking
+from apps.shared.conditional import conditional_headers, etag_matches
+from apps.shared.versions import get_version, provider_version_name
+
+
+# Render anónimo cacheado por versión del proveedor
+PROFILE_CACHE_KEY = 'provider_profile:{provider_id}:v{version}:p{page}:s{page_size}'
+PROFILE_CACHE_TTL = 60 * 5  # Acota cambios hechos fuera de Django (p. ej. Spring Boot)
+
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 50
+
+
+def _int_param(request, name, default):
+    try:
+        return max(int(request.GET.get(name, default)), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+def _render_profile(provider_id, page, page_size):
+    """
+    Construir la parte anónima del perfil (sin is_favorite del usuario).
+    Devuelve None si el proveedor no existe o no está activo
+    """
+    provider = User.objects.filter(id=provider_id, role='PROVIDER', is_active=True).first()
+    if provider is None:
+        return None
+
+    # Obtener perfil
+    try:
+        profile = UserProfile.objects.get(user_id=provider_id)
+        profile_image = profile.avatar_file_id if hasattr(profile, 'avatar_file_id') else None
+        banner_image = profile.banner_file_id if hasattr(profile, 'banner_file_id') else None
+        bio = profile.bio or ""
+    except UserProfile.DoesNotExist:
+        profile_image = None
+        banner_image = None
+        bio = ""
+
+    # Servicios del proveedor (paginados)
+    services = Service.objects.filter(
+        provider_id=provider_id,
+        is_published=True,
+        is_active=True
+    ).order_by('-created_at')
+
+    total_count = services.count()
+    total_pages = (total_count + page_size - 1) // page_size
+    start_index = (page - 1) * page_size
+
+    page_services = list(
+        services.select_related('category').prefetch_related('images')[start_index:start_index + page_size]
+    )
+    for service in page_services:
+        service._provider = provider
+
+    # Estadísticas desnormalizadas del proveedor (una sola fila)
+    stats = ProviderStats.for_provider(provider_id)
+
+    from apps.services.serializers import ServiceListSerializer
+    services_data = [dict(item) for item in ServiceListSerializer(page_services, many=True).data]
+
+    return {
+        'user': {
+            'id': provider.id,
+            'full_name': provider.full_name,
+            'email': provider.email,
+            'role': provider.role,
+            'created_at': provider.created_at
+        },
+        'profile_image': profile_image,
+        'banner_image': banner_image,
+        'bio': bio,
+        'average_rating': round(stats.average_rating, 1) if stats.average_rating else 0,
+        # Servicios activos y publicados, como antes de ProviderStats
+        'total_services': total_count,
+        'completed_services': stats.completed_bookings,
+        'services': services_data,
+        'services_pagination': {
+            'count': total_count,
+            'total_pages': total_pages,
+            'current_page': page,
+            'page_size': page_size,
+            'has_next': page < total_pages,
+            'has_previous': page > 1
+        },
+        'achievements': []  # Placeholder para futuros logros
+    }
 
 
 @api_view(['GET'])
 def provider_public_profile(request, provider_id):
     """
     Obtiene el perfil público completo de un proveedor
-    Incluye: información del usuario, perfil, servicios, estadísticas
+    Incluye: información del usuario, perfil, servicios (paginados), estadísticas
+
+    La parte anónima se cachea por versión del proveedor y se responde con
+    un ETag fuerte; If-None-Match devuelve 304 sin construir la respuesta.
+    El ETag sale solo de la versión, la página y (con usuario) un resumen
+    de sus favoritos, así se compara antes de leer la caché o renderizar.
     """
     try:
-        # Obtener proveedor
-        provider = get_object_or_404(User, id=provider_id, role='PROVIDER', is_active=True)
-        
-        # Obtener perfil
-        try:
-            profile = UserProfile.objects.get(user_id=provider_id)
-            profile_image = profile.avatar_file_id if hasattr(profile, 'avatar_file_id') else None
-            banner_image = profile.banner_file_id if hasattr(profile, 'banner_file_id') else None
-            bio = profile.bio or ""
-        except UserProfile.DoesNotExist:
-            profile_image = None
-            banner_image = None
-            bio = ""
-        
-        # Obtener servicios del proveedor
-        services = Service.objects.filter(
-            provider_id=provider_id,
-            is_published=True,
-            is_active=True
-        ).order_by('-created_at')
-        
-        # Calcular estadísticas
-        total_services = services.count()
-        
-        # Rating promedio del proveedor (promedio de todos sus servicios)
-        avg_rating = services.aggregate(Avg('rating_avg'))['rating_avg__avg'] or 0
-        
-        # Servicios completados
-        completed_services = Booking.objects.filter(
-            provider_id=provider_id,
-            status='COMPLETED'
-        ).count()
-        
-        # Serializar servicios
-        from apps.services.serializers import ServiceListSerializer
-        services_data = ServiceListSerializer(services, many=True, context={'request': request}).data
-        
-        # Construir respuesta
-        response_data = {
-            'user': {
-                'id': provider.id,
-                'full_name': provider.full_name,
-                'email': provider.email,
-                'role': provider.role,
-                'created_at': provider.created_at
-            },
-            'profile_image': profile_image,
-            'banner_image': banner_image,
-            'bio': bio,
-            'average_rating': round(avg_rating, 1) if avg_rating else 0,
-            'total_services': total_services,
-            'completed_services': completed_services,
-            'services': services_data,
-            'achievements': []  # Placeholder para futuros logros
-        }
-        
-        return Response(response_data, status=status.HTTP_200_OK)
-        
+        page = _int_param(request, 'page', 1)
+        page_size = min(_int_param(request, 'page_size', DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+
+        version = get_version(provider_version_name(provider_id))
+        etag = f'p{provider_id}-v{version}-{page}-{page_size}'
+
+        # Favoritos del usuario autenticado (set en Redis): el resumen de
+        # todo el set no depende de qué servicios trae la página
+        user_id = getattr(request, 'jwt_user_id', None)
+        favorite_ids = None
+        if user_id:
+            from apps.favorites.cache import get_favorite_ids
+            favorite_ids = get_favorite_ids(user_id)
+            favorites = ','.join(str(service_id) for service_id in sorted(favorite_ids))
+            etag += '-f' + hashlib.md5(favorites.encode()).hexdigest()[:12]
+
+        headers = conditional_headers(f'"{etag}"', private=bool(user_id))
+
+        if etag_matches(request, headers['ETag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache_key = PROFILE_CACHE_KEY.format(
+            provider_id=provider_id, version=version, page=page, page_size=page_size
+        )
+        response_data = cache.get(cache_key)
+        if response_data is None:
+            response_data = _render_profile(provider_id, page, page_size)
+            if response_data is None:
+                return Response(
+                    {'error': 'Proveedor no encontrado'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            cache.set(cache_key, response_data, PROFILE_CACHE_TTL)
+
+        # Superponer is_favorite del usuario autenticado
+        if favorite_ids is not None:
+            response_data = dict(response_data, services=[
+                dict(item, is_favorite=item['id'] in favorite_ids)
+                for item in response_data['services']
+            ])
+
+        return Response(response_data, status=status.HTTP_200_OK, headers=headers)
+
     except Exception as e:
         print(f"Error en provider_public_profile: {str(e)}")
         import traceback
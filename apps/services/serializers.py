@@ -5,6 +5,21 @@ from rest_framework import serializers
 from django.db import models
 from .models import Service, Category, ServiceImage
 from apps.users.models import User
+from apps.shared.serializers import DynamicFieldsMixin
+
+
+def _context_favorite_ids(context):
+    """
+    Ids favoritos del usuario autenticado, resueltos una sola vez por
+    serialización (el contexto es compartido por todos los items de la lista)
+    """
+    request = context.get('request')
+    if not request or not hasattr(request, 'jwt_user_id'):
+        return None
+    if '_favorite_ids' not in context:
+        from apps.favorites.cache import get_favorite_ids
+        context['_favorite_ids'] = get_favorite_ids(request.jwt_user_id)
+    return context['_favorite_ids']
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -18,6 +33,10 @@ class CategorySerializer(serializers.ModelSerializer):
     
     def get_services_count(self, obj):
         """Contar servicios asociados a esta categoría"""
+        # Usar el conteo anotado en la consulta si viene (evita un COUNT por fila)
+        count = getattr(obj, 'annotated_services_count', None)
+        if count is not None:
+            return count
         return obj.services.count()
 
 
@@ -59,8 +78,11 @@ class ProviderSerializer(serializers.ModelSerializer):
         fields = ['id', 'full_name', 'email', 'phone_number']
 
 
-class ServiceSerializer(serializers.ModelSerializer):
-    """Serializer para servicios"""
+class ServiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer para servicios (admite ?fields=)"""
+    
+    select_related_fields = {'category_name': ['category']}
+    prefetch_related_fields = {'images': ['images']}
     
     category_name = serializers.CharField(source='category.name', read_only=True)
     provider = ProviderSerializer(read_only=True)
@@ -134,14 +156,8 @@ class ServiceSerializer(serializers.ModelSerializer):
     
     def get_is_favorite(self, obj):
         """Check if service is favorited by current user"""
-        request = self.context.get('request')
-        if request and hasattr(request, 'jwt_user_id'):
-            from apps.favorites.models import Favorite
-            return Favorite.objects.filter(
-                user_id=request.jwt_user_id,
-                service=obj
-            ).exists()
-        return False
+        favorite_ids = _context_favorite_ids(self.context)
+        return favorite_ids is not None and obj.id in favorite_ids
     
     def get_requests_count(self, obj):
         """Get total number of bookings/requests for this service"""
@@ -174,14 +190,9 @@ class ServiceSerializer(serializers.ModelSerializer):
         # Crear el servicio
         service = Service.objects.create(**validated_data)
         
-        # Crear las imágenes del servicio si hay file_ids
+        # Crear las imágenes del servicio si hay file_ids (en bloque)
         if image_file_ids:
-            for index, file_id in enumerate(image_file_ids):
-                ServiceImage.objects.create(
-                    service=service,
-                    file_id=file_id,
-                    order=index
-                )
+            service.sync_images(image_file_ids)
         
         return service
     
@@ -204,24 +215,18 @@ class ServiceSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         
-        # Actualizar las imágenes del servicio si se proporcionaron nuevos file_ids
+        # Sincronizar las imágenes si se proporcionaron file_ids (solo diferencias)
         if image_file_ids is not None:
-            # Eliminar imágenes existentes
-            instance.images.all().delete()
-            
-            # Crear nuevas imágenes
-            for index, file_id in enumerate(image_file_ids):
-                ServiceImage.objects.create(
-                    service=instance,
-                    file_id=file_id,
-                    order=index
-                )
+            instance.sync_images(image_file_ids)
         
         return instance
 
 
-class ServiceListSerializer(serializers.ModelSerializer):
-    """Serializer simplificado para listas de servicios"""
+class ServiceListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Serializer simplificado para listas de servicios (admite ?fields=)"""
+    
+    select_related_fields = {'category_name': ['category']}
+    prefetch_related_fields = {'images': ['images']}
     
     category_name = serializers.CharField(source='category.name', read_only=True)
     provider_name = serializers.CharField(source='provider.full_name', read_only=True)
@@ -240,12 +245,6 @@ class ServiceListSerializer(serializers.ModelSerializer):
     
     def get_is_favorite(self, obj):
         """Check if service is favorited by current user"""
-        request = self.context.get('request')
-        if request and hasattr(request, 'jwt_user_id'):
-            from apps.favorites.models import Favorite
-            return Favorite.objects.filter(
-                user_id=request.jwt_user_id,
-                service=obj
-            ).exists()
-        return False
+        favorite_ids = _context_favorite_ids(self.context)
+        return favorite_ids is not None and obj.id in favorite_ids
 
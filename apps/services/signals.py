@@ -0,0 +1,87 @@
+"""
+Signals para servicios
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Service
+from apps.users.models import ProviderStats
+from apps.shared.versions import (
+    bump_catalog_version, bump_categories_version, bump_provider_version
+)
+
+
+def _is_listed(is_active, is_published):
+    """Un servicio cuenta como activo si está activo y publicado"""
+    return 1 if is_active and is_published else 0
+
+
+@receiver(pre_save, sender=Service)
+def track_service_state(sender, instance, **kwargs):
+    """
+    Guardar el estado previo (activo/publicado/proveedor/categoría) antes de actualizar
+    """
+    instance._previous_state = None
+    if instance.pk:
+        instance._previous_state = Service.objects.filter(pk=instance.pk).values(
+            'provider_id', 'is_active', 'is_published', 'category_id'
+        ).first()
+    # Solo un proveedor nuevo para el servicio puede no tener fila todavía
+    previous = instance._previous_state
+    if previous is None or previous['provider_id'] != instance.provider_id:
+        ProviderStats.ensure(instance.provider_id)
+
+
+@receiver(post_save, sender=Service)
+def update_provider_active_services(sender, instance, created, **kwargs):
+    """
+    Ajustar active_services del proveedor cuando el servicio se activa,
+    desactiva, publica o despublica
+    """
+    previous = getattr(instance, '_previous_state', None)
+    listed = _is_listed(instance.is_active, instance.is_published)
+    
+    # Cualquier cambio del servicio invalida el perfil público del proveedor y el catálogo
+    bump_provider_version(instance.provider_id, catalog=True)
+    
+    if previous is None:
+        bump_categories_version()
+        ProviderStats.apply_delta(instance.provider_id, active_services=listed)
+        return
+    
+    # Los conteos por categoría solo cambian al publicar/activar o mover de categoría
+    if (previous['is_active'] != instance.is_active
+            or previous['is_published'] != instance.is_published
+            or previous['category_id'] != instance.category_id):
+        bump_categories_version()
+    
+    was_listed = _is_listed(previous['is_active'], previous['is_published'])
+    if previous['provider_id'] != instance.provider_id:
+        bump_provider_version(previous['provider_id'], catalog=True)
+        ProviderStats.apply_delta(previous['provider_id'], active_services=-was_listed)
+        ProviderStats.apply_delta(instance.provider_id, active_services=listed)
+    else:
+        ProviderStats.apply_delta(instance.provider_id, active_services=listed - was_listed)
+
+
+@receiver(post_delete, sender=Service)
+def on_service_deleted(sender, instance, **kwargs):
+    """
+    Descontar el servicio eliminado de los servicios activos del proveedor
+    """
+    ProviderStats.apply_delta(
+        instance.provider_id,
+        active_services=-_is_listed(instance.is_active, instance.is_published)
+    )
+    bump_provider_version(instance.provider_id, catalog=True)
+    bump_categories_version()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def on_category_changed(sender, instance, **kwargs):
+    """
+    Las categorías forman parte del catálogo público (cubre los endpoints
+    admin de alta, edición, borrado y activación)
+    """
+    bump_catalog_version()
+    bump_categories_version()
@@ -0,0 +1,175 @@
+"""
+Tests del ETag del catálogo público de servicios y del perfil del proveedor
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from apps.favorites.services import add_favorite, remove_favorite
+from apps.reviews.models import Review
+from apps.shared.testing import (
+    UsersTableMixin, auth_header, create_user, mock_springboot, use_fake_redis
+)
+from apps.shared.versions import CATALOG_COUNTERS_MAX_AGE
+from apps.users.models import ProviderStats
+from .models import Category, Service
+
+
+CATALOG_URL = '/api/dashboard/services/public/'
+
+
+class CatalogVersionTests(UsersTableMixin, TestCase):
+
+    def setUp(self):
+        use_fake_redis(self)
+        mock_springboot(self)
+        create_user(1, role='PROVIDER')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service = Service.objects.create(
+                provider_id=1, title='Gasfitería', description='Reparaciones', price=50,
+                is_published=True
+            )
+
+    def catalog_etag(self):
+        response = self.client.get(CATALOG_URL)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response['ETag']
+
+    def assertCatalogStatus(self, etag, expected_status):
+        response = self.client.get(CATALOG_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, expected_status)
+
+    def test_counter_changes_keep_the_catalog_etag(self):
+        etag = self.catalog_etag()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_favorite(2, self.service)
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_favorite(2, self.service.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(reviewer_id=2, service=self.service, rating=5)
+
+        self.assertCatalogStatus(etag, 304)
+
+    def test_counter_staleness_is_bounded(self):
+        with mock.patch('apps.shared.versions.time') as clock:
+            clock.time.return_value = 1_000_000.0
+            etag = self.catalog_etag()
+            with self.captureOnCommitCallbacks(execute=True):
+                add_favorite(2, self.service)
+            self.assertCatalogStatus(etag, 304)
+
+            clock.time.return_value += CATALOG_COUNTERS_MAX_AGE
+            response = self.client.get(CATALOG_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['services'][0]['favorites_count'], 1)
+
+    def test_service_changes_invalidate_the_catalog_etag(self):
+        etag = self.catalog_etag()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.title = 'Gasfitería 24h'
+            self.service.save()
+
+        self.assertCatalogStatus(etag, 200)
+
+    def test_unpublishing_invalidates_the_catalog_etag(self):
+        etag = self.catalog_etag()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.is_published = False
+            self.service.save()
+
+        self.assertCatalogStatus(etag, 200)
+
+
+class ProviderProfileETagTests(UsersTableMixin, TestCase):
+
+    url = '/api/providers/1/profile/'
+
+    def setUp(self):
+        use_fake_redis(self)
+        mock_springboot(self)
+        cache.clear()
+        create_user(1, role='PROVIDER')
+        create_user(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service = Service.objects.create(
+                provider_id=1, title='Gasfitería', description='Reparaciones', price=50,
+                is_published=True
+            )
+
+    def get(self, etag=None, user_id=None):
+        headers = auth_header(user_id) if user_id else {}
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(self.url, **headers)
+
+    def test_matching_etag_is_answered_without_rendering(self):
+        etag = self.get()['ETag']
+        cache.clear()
+
+        with mock.patch('apps.services.provider_profile_view._render_profile') as render:
+            response = self.get(etag)
+
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+    def test_favorites_change_the_user_etag(self):
+        etag = self.get(user_id=2)['ETag']
+        self.assertEqual(self.get(etag, user_id=2).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_favorite(2, self.service)
+
+        response = self.get(etag, user_id=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['services'][0]['is_favorite'])
+
+
+class AdminServicesBulkStatusTests(UsersTableMixin, TestCase):
+
+    def setUp(self):
+        use_fake_redis(self)
+        mock_springboot(self)
+        create_user(99, role='ADMIN')
+        self.services = [
+            Service.objects.create(
+                provider_id=1, title=f'Servicio {i}', description='Descripción', price=50,
+                is_published=True
+            )
+            for i in range(3)
+        ]
+
+    def post(self, url, ids, action):
+        response = self.client.post(
+            url, {'ids': ids, 'action': action},
+            content_type='application/json', **auth_header(99)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['result'] for item in response.json()['results']]
+
+    def test_unpublish_recomputes_active_services(self):
+        self.assertEqual(ProviderStats.objects.get(provider_id=1).active_services, 3)
+        Service.objects.filter(pk=self.services[2].pk).update(is_published=False)
+
+        results = self.post(
+            '/api/dashboard/services/admin/bulk/status/',
+            [self.services[0].pk, self.services[2].pk, 999], 'unpublish'
+        )
+
+        self.assertEqual(results, ['updated', 'unchanged', 'not_found'])
+        self.assertEqual(ProviderStats.objects.get(provider_id=1).active_services, 1)
+
+    def test_categories_bulk_status(self):
+        category = Category.objects.create(name='Hogar', slug='hogar')
+
+        results = self.post(
+            '/api/dashboard/services/admin/categories/bulk/status/', [category.pk, 999], 'deactivate'
+        )
+
+        self.assertEqual(results, ['updated', 'not_found'])
+        category.refresh_from_db()
+        self.assertFalse(category.is_active)
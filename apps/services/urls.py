@@ -22,5 +22,9 @@ urlpatterns = [
     path('admin/categories/', views.admin_categories_list_create, name='admin_categories_list_create'),
     path('admin/categories/<int:category_id>/', views.admin_category_detail, name='admin_category_detail'),
     path('admin/categories/<int:category_id>/toggle-status/', views.admin_category_toggle_status, name='admin_category_toggle_status'),
+    path('admin/categories/bulk/status/', views.admin_categories_bulk_status, name='admin_categories_bulk_status'),
+    
+    # Admin - Moderación de servicios
+    path('admin/bulk/status/', views.admin_services_bulk_status, name='admin_services_bulk_status'),
 ]
 
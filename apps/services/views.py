@@ -5,14 +5,37 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Count
+from django.utils import timezone
 
 from conectaya.authentication.decorators import jwt_required_drf
-from apps.users.models import User
+from apps.users.models import User, ProviderStats
+from apps.shared.bulk import parse_bulk_request, bulk_update, updated_ids, bulk_response_data
+from apps.shared.conditional import conditional_get, is_authenticated_request
+from apps.shared.versions import (
+    get_version, catalog_validator, bump_catalog_version, bump_categories_version,
+    CATEGORIES_VERSION
+)
 from .models import Service, Category
 from .serializers import ServiceSerializer, CategorySerializer
 
 
+def _categories_version(request, *args, **kwargs):
+    """Validador: versión del listado de categorías"""
+    return get_version(CATEGORIES_VERSION)
+
+
+def _catalog_version_for_user(request, *args, **kwargs):
+    """Validador: versión del catálogo + favoritos del usuario autenticado"""
+    version = catalog_validator()
+    user_id = getattr(request, 'jwt_user_id', None)
+    if not user_id:
+        return version
+    from apps.favorites.cache import get_favorite_ids
+    return f'{version}:{user_id}:{sorted(get_favorite_ids(user_id))}'
+
+
 @api_view(['GET', 'POST'])
 @jwt_required_drf
 def services_list_create(request):
@@ -66,10 +89,11 @@ def services_list_create(request):
             start_index = (page - 1) * page_size
             end_index = start_index + page_size
             
-            # Obtener servicios de la página actual
-            paginated_services = services[start_index:end_index]
+            # Obtener servicios de la página actual (relaciones según ?fields=)
+            context = {'request': request}
+            paginated_services = ServiceSerializer.setup_queryset(services, context)[start_index:end_index]
             
-            serializer = ServiceSerializer(paginated_services, many=True)
+            serializer = ServiceSerializer(paginated_services, many=True, context=context)
             return Response({
                 'services': serializer.data,
                 'count': total_count,
@@ -168,6 +192,7 @@ def service_detail(request, service_id):
 
 
 @api_view(['GET'])
+@conditional_get(_catalog_version_for_user, private=is_authenticated_request)
 def services_public_list(request):
     """
     Lista pública de servicios (para clientes)
@@ -215,12 +240,14 @@ def services_public_list(request):
         start_index = (page - 1) * page_size
         end_index = start_index + page_size
         
-        # Obtener servicios de la página actual
-        paginated_services = services[start_index:end_index]
-        
         # Use ServiceListSerializer with context for is_favorite
         from .serializers import ServiceListSerializer
-        serializer = ServiceListSerializer(paginated_services, many=True, context={'request': request})
+        context = {'request': request}
+        
+        # Obtener servicios de la página actual (relaciones según ?fields=)
+        paginated_services = ServiceListSerializer.setup_queryset(services, context)[start_index:end_index]
+        
+        serializer = ServiceListSerializer(paginated_services, many=True, context=context)
         
         response_data = {
             'services': serializer.data,
@@ -245,17 +272,15 @@ def services_public_list(request):
 
 
 @api_view(['GET'])
+@conditional_get(_categories_version)
 def categories_list(request):
     """
-    Lista todas las categorías activas
+    Lista todas las categorías activas (con conteo de servicios publicados)
     """
     try:
-        categories = Category.objects.filter(is_active=True).order_by('order', 'name')
-        serializer = CategorySerializer(categories, many=True)
-        return Response({
-            'categories': serializer.data,
-            'count': categories.count()
-        }, status=status.HTTP_200_OK)
+        from .category_cache import get_public_categories
+        payload = get_public_categories(getattr(request, 'conditional_value', None))
+        return Response(payload, status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response(
@@ -289,7 +314,7 @@ def admin_categories_list_create(request):
             search = request.GET.get('search', '')
             status_filter = request.GET.get('status', '')
             
-            categories = Category.objects.all()
+            categories = Category.objects.annotate(annotated_services_count=Count('services'))
             
             if search:
                 categories = categories.filter(
@@ -460,7 +485,7 @@ def admin_categories_list_create(request):
             search = request.GET.get('search', '')
             status_filter = request.GET.get('status', '')
             
-            categories = Category.objects.all()
+            categories = Category.objects.annotate(annotated_services_count=Count('services'))
             
             if search:
                 categories = categories.filter(
@@ -605,6 +630,113 @@ def admin_category_toggle_status(request, category_id):
         )
 
 
+
+# Acciones en bloque: valor de is_active a escribir
+BULK_CATEGORY_ACTIONS = {
+    'activate': True,
+    'deactivate': False,
+}
+
+
+@api_view(['POST'])
+@jwt_required_drf
+def admin_categories_bulk_status(request):
+    """
+    Activar/desactivar varias categorías en una sola petición (solo admin)
+    Body: {"ids": [1, 2, 3], "action": "activate" | "deactivate"}
+    """
+    try:
+        user_id = request.jwt_user_id
+        user = get_object_or_404(User, id=user_id)
+        
+        if user.role != 'ADMIN':
+            return Response(
+                {'error': 'No tienes permisos para gestionar categorías'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            ids, action = parse_bulk_request(request.data, BULK_CATEGORY_ACTIONS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        is_active = BULK_CATEGORY_ACTIONS[action]
+        with transaction.atomic():
+            outcomes = bulk_update(
+                Category.objects.all(), ids, {'is_active': is_active},
+                unchanged=Q(is_active=is_active)
+            )
+            if updated_ids(outcomes):
+                bump_catalog_version()
+                bump_categories_version()
+        
+        return Response(bulk_response_data(action, outcomes), status=status.HTTP_200_OK)
+    
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+# Acciones en bloque sobre servicios: campos a escribir
+BULK_SERVICE_ACTIONS = {
+    'activate': {'is_active': True},
+    'deactivate': {'is_active': False},
+    'publish': {'is_published': True},
+    'unpublish': {'is_published': False},
+}
+
+
+@api_view(['POST'])
+@jwt_required_drf
+def admin_services_bulk_status(request):
+    """
+    Moderar varios servicios en una sola petición (solo admin)
+    Body: {"ids": [1, 2, 3], "action": "activate" | "deactivate" | "publish" | "unpublish"}
+
+    Los servicios activos de cada proveedor afectado se recalculan una
+    sola vez para todo el bloque.
+    """
+    try:
+        user_id = request.jwt_user_id
+        user = get_object_or_404(User, id=user_id)
+        
+        if user.role != 'ADMIN':
+            return Response(
+                {'error': 'Acceso denegado'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            ids, action = parse_bulk_request(request.data, BULK_SERVICE_ACTIONS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        values = BULK_SERVICE_ACTIONS[action]
+        with transaction.atomic():
+            outcomes = bulk_update(
+                Service.objects.all(), ids,
+                dict(values, updated_at=timezone.now()),
+                unchanged=Q(**values)
+            )
+            changed = updated_ids(outcomes)
+            if changed:
+                # Recalcula active_services e invalida el perfil de cada proveedor
+                ProviderStats.recompute_many(
+                    Service.objects.filter(id__in=changed).values_list('provider_id', flat=True)
+                )
+                bump_catalog_version()
+                bump_categories_version()
+        
+        return Response(bulk_response_data(action, outcomes), status=status.HTTP_200_OK)
+    
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['GET'])
 @jwt_required_drf
 def service_stats(request, service_id):
@@ -0,0 +1,36 @@
+"""
+Ejecución de tareas en segundo plano dentro del proceso
+
+Para efectos derivados que no deben retrasar la respuesta (llamadas a
+Spring Boot, notificaciones). Las tareas se encolan al confirmar la
+transacción y corren en un pool pequeño de hilos; un error se registra
+en el log y no afecta a la petición que la originó.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='background-job')
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Error en tarea en segundo plano %s', func.__name__)
+    finally:
+        # Cada hilo abre sus propias conexiones a la base de datos
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Ejecutar func(*args, **kwargs) en segundo plano después del commit
+    (si la transacción se revierte, la tarea no se ejecuta)
+    """
+    transaction.on_commit(lambda: _executor.submit(_run, func, args, kwargs))
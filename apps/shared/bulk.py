@@ -0,0 +1,96 @@
+"""
+Utilidades para acciones de moderación en bloque
+
+Una acción en bloque recibe {"ids": [...], "action": "..."}, se aplica con
+un único UPDATE sobre las filas que realmente cambian y responde el
+resultado de cada id: updated, unchanged, forbidden o not_found.
+"""
+
+# Máximo de ids por petición
+BULK_MAX_IDS = 500
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+FORBIDDEN = 'forbidden'
+NOT_FOUND = 'not_found'
+
+
+def parse_bulk_request(data, actions):
+    """
+    Validar el cuerpo de la petición. Devuelve (ids, action) con los ids
+    sin duplicados y en el orden recibido; lanza ValueError si es inválido
+    """
+    action = data.get('action')
+    if action not in actions:
+        raise ValueError(f"Acción inválida. Opciones: {', '.join(actions)}")
+
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids debe ser una lista no vacía')
+    if len(ids) > BULK_MAX_IDS:
+        raise ValueError(f'Máximo {BULK_MAX_IDS} ids por petición')
+
+    try:
+        ids = list(dict.fromkeys(int(item_id) for item_id in ids))
+    except (TypeError, ValueError):
+        raise ValueError('ids debe contener solo enteros')
+
+    return ids, action
+
+
+def bulk_update(queryset, ids, values, unchanged=None, forbidden=None):
+    """
+    Aplicar `values` a las filas de `ids` con un solo UPDATE
+
+    - unchanged: Q de las filas que ya están en el estado pedido (no se tocan)
+    - forbidden: Q de las filas que no se pueden modificar con esta acción
+
+    Debe llamarse dentro de transaction.atomic(): las filas se bloquean
+    antes de decidir cuáles cambian. Devuelve {id: resultado}.
+    """
+    rows = queryset.filter(id__in=ids).select_for_update()
+    found = set(rows.values_list('id', flat=True))
+
+    blocked = set()
+    if forbidden is not None:
+        blocked = set(rows.filter(forbidden).values_list('id', flat=True))
+
+    already = set()
+    if unchanged is not None:
+        already = set(rows.filter(unchanged).values_list('id', flat=True)) - blocked
+
+    to_update = found - blocked - already
+    if to_update:
+        queryset.model.objects.filter(id__in=to_update).update(**values)
+
+    outcomes = {}
+    for item_id in ids:
+        if item_id not in found:
+            outcomes[item_id] = NOT_FOUND
+        elif item_id in blocked:
+            outcomes[item_id] = FORBIDDEN
+        elif item_id in already:
+            outcomes[item_id] = UNCHANGED
+        else:
+            outcomes[item_id] = UPDATED
+    return outcomes
+
+
+def updated_ids(outcomes):
+    """Ids que cambiaron en la acción"""
+    return [item_id for item_id, outcome in outcomes.items() if outcome == UPDATED]
+
+
+def bulk_response_data(action, outcomes):
+    """Cuerpo de respuesta: resultado por id más el resumen"""
+    summary = {outcome: 0 for outcome in (UPDATED, UNCHANGED, FORBIDDEN, NOT_FOUND)}
+    for outcome in outcomes.values():
+        summary[outcome] += 1
+    return {
+        'action': action,
+        'results': [
+            {'id': item_id, 'result': outcome}
+            for item_id, outcome in outcomes.items()
+        ],
+        'summary': summary
+    }
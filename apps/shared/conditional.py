@@ -0,0 +1,100 @@
+"""
+Soporte de peticiones condicionales (ETag / If-None-Match) para vistas GET
+
+Uso:
+    @api_view(['GET'])
+    @jwt_required_drf
+    @conditional_get(lambda request: f'{get_version(...)}', private=True)
+    def mi_vista(request):
+        ...
+
+El validador debe ser barato (un contador de versión, un aggregate de
+COUNT/MAX...): si el ETag coincide se responde 304 sin ejecutar la vista
+ni los serializers.
+"""
+import hashlib
+import logging
+from functools import wraps
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Los clientes pueden guardar la respuesta pero deben revalidarla siempre
+PUBLIC_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+
+def make_etag(*parts):
+    """ETag fuerte a partir de las partes del validador"""
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    """Verificar If-None-Match contra el ETag actual"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return etag in etags or '*' in etags
+
+
+def conditional_headers(etag, private):
+    # Vary siempre: la misma URL puede responder distinto con o sin token
+    return {
+        'ETag': etag,
+        'Cache-Control': PRIVATE_CACHE_CONTROL if private else PUBLIC_CACHE_CONTROL,
+        'Vary': 'Authorization',
+    }
+
+
+def is_authenticated_request(request):
+    """Las respuestas con datos del usuario (is_favorite...) son privadas"""
+    return bool(getattr(request, 'jwt_user_id', None))
+
+
+def conditional_get(validator, private=False):
+    """
+    Decorador para vistas GET de DRF (va debajo de @api_view y de
+    @jwt_required_drf, así el validador puede usar request.jwt_user_id).
+
+    validator(request, *args, **kwargs) devuelve el valor que identifica
+    la versión del recurso, o None para responder sin ETag. Los query
+    params forman parte del ETag (filtros y paginación).
+    `private` puede ser un booleano o una función (request) -> bool.
+    El valor calculado queda en request.conditional_value por si la vista
+    puede reutilizarlo.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            try:
+                value = validator(request, *args, **kwargs)
+            except Exception:
+                # Sin validador se responde normalmente (sin ETag)
+                logger.exception('Error en el validador de %s', view_func.__name__)
+                value = None
+            if value is None:
+                return view_func(request, *args, **kwargs)
+            request.conditional_value = value
+
+            is_private = private(request) if callable(private) else private
+            etag = make_etag(value, request.GET.urlencode())
+            headers = conditional_headers(etag, is_private)
+
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                for name, header_value in headers.items():
+                    response[name] = header_value
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,64 @@
+"""
+Métricas de tiempo en memoria del proceso
+
+`timed(name)` mide un bloque y acumula por nombre: cantidad, errores,
+tiempo total y máximo; `increment(name)` lleva contadores simples (p. ej.
+envíos descartados). Cada medición también se registra en el log
+(logger 'apps.shared.metrics') para poder enviarla a un agregador externo.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats = {}
+_counters = {}
+
+
+def _record(name, elapsed_ms, failed):
+    with _lock:
+        stats = _stats.setdefault(name, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['errors'] += int(failed)
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    logger.info('%s %.1fms%s', name, elapsed_ms, ' (error)' if failed else '')
+
+
+@contextmanager
+def timed(name):
+    """Medir la duración del bloque bajo `name` (también si lanza una excepción)"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        _record(name, (time.perf_counter() - start) * 1000, failed)
+
+
+def increment(name, amount=1):
+    """Sumar `amount` al contador `name`"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+    logger.info('%s +%s', name, amount)
+
+
+def counters():
+    """Copia de los contadores acumulados"""
+    with _lock:
+        return dict(_counters)
+
+
+def snapshot():
+    """Copia de las métricas acumuladas, con el promedio por nombre"""
+    with _lock:
+        return {
+            name: dict(stats, avg_ms=stats['total_ms'] / stats['count'] if stats['count'] else 0.0)
+            for name, stats in _stats.items()
+        }
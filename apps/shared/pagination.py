@@ -1,6 +1,13 @@
 """
 Paginación personalizada
 """
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from rest_framework.pagination import PageNumberPagination
 
 
@@ -11,3 +18,130 @@ class StandardPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class KeysetPagination:
+    """
+    Paginación por cursor (keyset) en orden descendente por (created_at, id)
+
+    Cada página filtra por "después del último elemento visto" en lugar de
+    usar OFFSET, así que el costo no crece con la profundidad y un elemento
+    nuevo no desplaza las páginas siguientes. El cursor es opaco para el
+    cliente: se devuelve en `next_cursor` y se envía en `?cursor=`.
+
+    El total se puede pedir con `?count=exact` (por defecto),
+    `?count=approximate` (estimación del planner en PostgreSQL) o
+    `?count=none`. Con `none` no se cuenta nada, aunque el llamador tenga
+    el total calculado: la vista debe consultar get_count_mode antes de
+    calcularlo.
+    """
+    page_size = 20
+    max_page_size = 100
+    ordering_field = 'created_at'
+    count_modes = ('exact', 'approximate', 'none')
+    
+    def __init__(self, ordering_field=None):
+        if ordering_field:
+            self.ordering_field = ordering_field
+        self.next_cursor = None
+        self.count = None
+        self.count_is_approximate = False
+    
+    @staticmethod
+    def encode_cursor(value, pk):
+        raw = json.dumps([value.isoformat(), pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Devuelve (valor, id); lanza ValueError si el cursor es inválido"""
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+            return parsed, int(pk)
+        except (TypeError, ValueError, binascii.Error):
+            raise ValueError('Cursor inválido')
+    
+    @classmethod
+    def get_count_mode(cls, request):
+        """Modo de conteo pedido en ?count=; lanza ValueError si es inválido"""
+        count_mode = request.GET.get('count', 'exact')
+        if count_mode not in cls.count_modes:
+            raise ValueError('count debe ser exact, approximate o none')
+        return count_mode
+    
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get('page_size', self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+    
+    def paginate_queryset(self, queryset, request, count=None):
+        """
+        Devuelve la lista de objetos de la página pedida. Si el llamador ya
+        conoce el total (p. ej. de una consulta agrupada) lo pasa en `count`;
+        con ?count=none se ignora. Lanza ValueError si el cursor o el modo
+        de conteo son inválidos
+        """
+        field = self.ordering_field
+        count_mode = self.get_count_mode(request)
+        
+        if count_mode == 'none':
+            self.count = None
+        elif count is not None:
+            self.count = count
+        elif count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'approximate':
+            self.count, self.count_is_approximate = estimate_count(queryset)
+        
+        cursor = request.GET.get('cursor')
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            )
+        
+        page_size = self.get_page_size(request)
+        items = list(queryset.order_by(f'-{field}', '-pk')[:page_size + 1])
+        if len(items) > page_size:
+            items = items[:page_size]
+            last = items[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field), last.pk)
+        return items
+    
+    def get_pagination_data(self):
+        """Campos de paginación para agregar a la respuesta"""
+        return {
+            'count': self.count,
+            'count_is_approximate': self.count_is_approximate,
+            'next_cursor': self.next_cursor,
+            'has_more': self.next_cursor is not None
+        }
+
+
+# Por debajo de este número la estimación no compensa: se cuenta exacto
+APPROXIMATE_COUNT_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    """
+    Total aproximado de un queryset: filas estimadas por el planner de
+    PostgreSQL (EXPLAIN, sin ejecutar la consulta). Si la estimación es
+    pequeña o la base no es PostgreSQL se hace el COUNT exacto.
+    Devuelve (total, es_aproximado)
+    """
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate, True
+    return queryset.count(), False
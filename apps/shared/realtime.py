@@ -0,0 +1,88 @@
+"""
+Envío de eventos a varios grupos del channel layer (fan-out)
+
+Todos los group_send de un envío corren en una sola tarea async: desde
+código síncrono se cruza async_to_sync una vez (no una por destinatario) y
+las publicaciones a Redis salen concurrentes sobre el pool de conexiones
+del channel layer. El evento se arma una vez y se comparte entre grupos.
+El envío completo tiene un tiempo máximo: si Redis está lento, los grupos
+pendientes se descartan (métrica realtime.fanout.dropped) en lugar de
+bloquear la petición.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from apps.shared.metrics import increment, timed
+
+logger = logging.getLogger(__name__)
+
+# Segundos máximos para entregar un evento a todos los grupos
+FANOUT_TIMEOUT = 1.0
+
+
+def user_group(user_id):
+    """Grupo personal de un usuario (al que se une cada conexión WebSocket)"""
+    return f'user_{user_id}'
+
+
+async def send_to_groups(groups, event, timeout=FANOUT_TIMEOUT, channel_layer=None):
+    """
+    Enviar `event` a todos los `groups` de forma concurrente. Devuelve el
+    conjunto de grupos entregados; los que no terminan a tiempo o fallan se
+    cuentan como descartados
+    """
+    groups = list(dict.fromkeys(groups))
+    channel_layer = channel_layer or get_channel_layer()
+    if not groups:
+        return set()
+    if channel_layer is None:
+        logger.warning('Channel layer no configurado')
+        increment('realtime.fanout.dropped', len(groups))
+        return set()
+
+    async def send(group):
+        await channel_layer.group_send(group, event)
+        return group
+
+    tasks = [asyncio.ensure_future(send(group)) for group in groups]
+    with timed(f"realtime.fanout.{event.get('type', 'event')}"):
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    delivered = {task.result() for task in done if not task.exception()}
+    dropped = len(groups) - len(delivered)
+    if dropped:
+        increment('realtime.fanout.dropped', dropped)
+        logger.warning(
+            'Fan-out %s: %s de %s grupos descartados', event.get('type'), dropped, len(groups)
+        )
+    return delivered
+
+
+async def group_send_many(groups, event, timeout=FANOUT_TIMEOUT, channel_layer=None):
+    """Como send_to_groups, pero devuelve el número de grupos entregados"""
+    return len(await send_to_groups(groups, event, timeout=timeout, channel_layer=channel_layer))
+
+
+def deliver(groups, event, timeout=FANOUT_TIMEOUT):
+    """
+    Versión síncrona de send_to_groups para views, signals y tareas en
+    segundo plano: devuelve los grupos entregados. Nunca lanza: un error
+    del channel layer se registra y cuenta como descarte
+    """
+    groups = list(groups)
+    try:
+        return async_to_sync(send_to_groups)(groups, event, timeout=timeout)
+    except Exception:
+        logger.exception('Error en fan-out %s', event.get('type'))
+        increment('realtime.fanout.dropped', len(groups))
+        return set()
+
+
+def fan_out(groups, event, timeout=FANOUT_TIMEOUT):
+    """Como deliver, pero devuelve el número de grupos entregados"""
+    return len(deliver(groups, event, timeout=timeout))
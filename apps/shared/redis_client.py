@@ -0,0 +1,49 @@
+"""
+Cliente Redis compartido para caches y contadores
+
+Usa el mismo servidor que el channel layer (settings.REDIS_URL). Si Redis
+no responde, los llamadores deben capturar redis.RedisError y caer a la
+base de datos; tras un fallo se deja de intentar durante unos segundos
+para no pagar el timeout de conexión en cada request.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Segundos sin intentar conectar después de un fallo
+RETRY_AFTER_FAILURE = 10
+
+_client = None
+_down_until = 0.0
+
+
+def get_redis():
+    """
+    Obtener el cliente Redis (pool de conexiones compartido por proceso).
+    Lanza redis.ConnectionError si Redis se marcó como caído hace poco
+    """
+    global _client
+    if time.monotonic() < _down_until:
+        raise redis.ConnectionError('Redis no disponible temporalmente')
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+    return _client
+
+
+def mark_redis_down(error=None):
+    """
+    Registrar un fallo de Redis y suspender los intentos por un momento
+    """
+    global _down_until
+    if time.monotonic() < _down_until:
+        return
+    _down_until = time.monotonic() + RETRY_AFTER_FAILURE
+    logger.warning('Redis no disponible, usando base de datos: %s', error)
@@ -0,0 +1,109 @@
+"""
+Serializers compartidos: selección de campos (?fields=) y expansión (?expand=)
+"""
+from rest_framework import serializers
+
+
+def _split_param(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return {name.strip() for name in value if name and name.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Mixin para ModelSerializer que permite pedir solo algunos campos y
+    expandir relaciones:
+
+    - ?fields=id,title,images  devuelve solo esos campos. Los campos que
+      no se piden se quitan del serializer antes de serializar, así que
+      sus SerializerMethodField y serializers anidados no se calculan.
+    - ?expand=service  reemplaza el campo por el serializer declarado en
+      `expandable_fields` (p. ej. el servicio completo en lugar del compacto).
+
+    Los parámetros se leen del request solo en el serializer raíz (los
+    anidados no heredan el ?fields= de la respuesta); también se pueden
+    pasar en el contexto como context['fields'] / context['expand'].
+
+    Para ajustar la consulta a los campos pedidos, cada serializer declara
+    `select_related_fields` / `prefetch_related_fields` ({campo: [lookups]})
+    y la vista llama a `Serializer.setup_queryset(queryset, context)`.
+    """
+    expandable_fields = {}
+    select_related_fields = {}
+    prefetch_related_fields = {}
+    # Prefetch adicional cuando una relación se pide expandida
+    expanded_prefetch_fields = {}
+
+    @staticmethod
+    def _requested(context, name):
+        """Valores de ?<name>= (o context[name]) como set, o None si no se pidió"""
+        if name in context:
+            return _split_param(context[name])
+        request = context.get('request')
+        if request is None:
+            return None
+        return _split_param(request.GET.get(name))
+
+    def _is_root(self):
+        root = self.root
+        if root is self:
+            return True
+        return isinstance(root, serializers.ListSerializer) and root.child is self
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_root():
+            return fields
+
+        for name in self._requested(self.context, 'expand') or ():
+            if name in self.expandable_fields:
+                fields[name] = self.build_expanded_field(name)
+
+        # Solo al serializar la salida: en escritura se necesitan todos los campos
+        only = self._requested(self.context, 'fields')
+        if only and not hasattr(self, 'initial_data'):
+            for name in set(fields) - only:
+                fields.pop(name)
+        return fields
+
+    def build_expanded_field(self, name):
+        serializer_class = self.expandable_fields[name]
+        return serializer_class(read_only=True)
+
+    @classmethod
+    def requested_fields(cls, context):
+        """Campos que se van a serializar según ?fields= (None si son todos)"""
+        return cls._requested(context, 'fields')
+
+    @classmethod
+    def setup_queryset(cls, queryset, context):
+        """
+        Agregar select_related/prefetch_related solo para los campos que se
+        van a serializar
+        """
+        only = cls.requested_fields(context)
+        expand = cls._requested(context, 'expand') or set()
+
+        def wanted(field):
+            return only is None or field in only
+
+        select = []
+        for field, lookups in cls.select_related_fields.items():
+            if wanted(field):
+                select.extend(lookups)
+        prefetch = []
+        for field, lookups in cls.prefetch_related_fields.items():
+            if wanted(field):
+                prefetch.extend(lookups)
+        for field in expand:
+            if wanted(field):
+                prefetch.extend(cls.expanded_prefetch_fields.get(field, []))
+
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -0,0 +1,130 @@
+"""
+Utilidades para los tests
+
+La tabla `users` pertenece a Spring Boot (User.Meta.managed = False), así
+que las migraciones no la crean en la base de tests: UsersTableMixin la
+crea antes de la clase de tests y borra las filas al terminar cada test
+(el flush de TransactionTestCase no la incluye).
+"""
+import threading
+import time
+from unittest import mock
+
+import jwt
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from apps.users.models import User
+
+
+def ensure_users_table():
+    """Crear la tabla users en la base de tests si aún no existe"""
+    if User._meta.db_table in connection.introspection.table_names():
+        return
+    with connection.schema_editor() as editor:
+        editor.create_model(User)
+
+
+def create_user(user_id, role='CUSTOMER', **fields):
+    """Usuario de Spring Boot con los campos mínimos"""
+    defaults = {
+        'full_name': f'Usuario {user_id}',
+        'email': f'user{user_id}@example.com',
+        'password': 'x',
+        'role': role,
+        'provider_status': 'APPROVED' if role == 'PROVIDER' else 'NONE',
+        'is_active': True,
+        'created_at': timezone.now(),
+    }
+    defaults.update(fields)
+    return User.objects.create(id=user_id, **defaults)
+
+
+def access_token(user_id):
+    """Access token como el que emite Spring Boot"""
+    now = int(time.time())
+    return jwt.encode(
+        {'sub': str(user_id), 'userId': user_id, 'iat': now, 'exp': now + 3600},
+        settings.JWT_SECRET_KEY,
+        algorithm='HS256'
+    )
+
+
+def auth_header(user_id):
+    """Header Authorization para el cliente de tests"""
+    return {'HTTP_AUTHORIZATION': f'Bearer {access_token(user_id)}'}
+
+
+def use_fake_redis(test_case):
+    """
+    Reemplazar el cliente Redis compartido por uno en memoria (fakeredis)
+    durante el test; devuelve ese cliente
+    """
+    import fakeredis
+    from apps.shared import redis_client
+
+    client = fakeredis.FakeRedis()
+    for name, value in (('_client', client), ('_down_until', 0.0)):
+        patcher = mock.patch.object(redis_client, name, value)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    return client
+
+
+def mock_springboot(test_case):
+    """
+    Reemplazar las llamadas HTTP a Spring Boot durante el test; devuelve
+    los mocks por nombre de método
+    """
+    patcher = mock.patch.multiple(
+        'apps.shared.springboot_client.SpringBootClient',
+        update_reputation=mock.DEFAULT,
+        create_notification=mock.DEFAULT,
+        get_setting=mock.DEFAULT,
+        get_reputation=mock.DEFAULT,
+    )
+    mocks = patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return mocks
+
+
+def run_concurrently(func, calls):
+    """
+    Ejecutar func(*args) para cada args de `calls`, cada uno en su hilo y
+    arrancando a la vez (barrera). Devuelve las excepciones lanzadas
+    """
+    barrier = threading.Barrier(len(calls))
+    errors = []
+
+    def run(args):
+        try:
+            barrier.wait()
+            func(*args)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # Cada hilo abre su propia conexión a la base de datos
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(args,)) for args in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class UsersTableMixin:
+    """Mixin para TestCase/TransactionTestCase que usan User"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Antes de super(): TestCase abre una transacción y SQLite no admite
+        # cambios de esquema dentro de ella
+        ensure_users_table()
+        super().setUpClass()
+
+    def tearDown(self):
+        User.objects.all().delete()
+        super().tearDown()
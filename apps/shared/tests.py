@@ -0,0 +1,89 @@
+"""
+Tests del fan-out de eventos a grupos del channel layer y de la validación
+de acciones en bloque
+"""
+import asyncio
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.shared.bulk import BULK_MAX_IDS, parse_bulk_request
+from apps.shared.metrics import counters
+from apps.shared.realtime import fan_out
+
+
+class FakeChannelLayer:
+    """Channel layer que tarda en los grupos `slow` y falla en los `broken`"""
+
+    def __init__(self, slow=(), broken=()):
+        self.slow = set(slow)
+        self.broken = set(broken)
+        self.received = []
+
+    async def group_send(self, group, event):
+        if group in self.slow:
+            await asyncio.sleep(5)
+        if group in self.broken:
+            raise ConnectionError('Redis caído')
+        self.received.append((group, event))
+
+
+def _dropped():
+    return counters().get('realtime.fanout.dropped', 0)
+
+
+class FanOutTests(SimpleTestCase):
+
+    event = {'type': 'chat.message', 'message': {'id': 1}}
+
+    def fan_out_with(self, layer, groups):
+        with mock.patch('apps.shared.realtime.get_channel_layer', return_value=layer):
+            return fan_out(groups, self.event, timeout=0.2)
+
+    def test_slow_group_is_dropped_without_blocking_the_others(self):
+        layer = FakeChannelLayer(slow={'user_2'})
+        dropped_before = _dropped()
+
+        start = time.perf_counter()
+        delivered = self.fan_out_with(layer, ['user_1', 'user_2', 'user_3'])
+
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual(delivered, 2)
+        self.assertEqual(_dropped(), dropped_before + 1)
+        self.assertEqual(
+            sorted(group for group, _ in layer.received), ['user_1', 'user_3']
+        )
+        self.assertTrue(all(event is self.event for _, event in layer.received))
+
+    def test_failing_group_is_counted_as_dropped(self):
+        layer = FakeChannelLayer(broken={'user_1'})
+        dropped_before = _dropped()
+
+        delivered = self.fan_out_with(layer, ['user_1', 'user_2', 'user_2'])
+
+        # Los grupos repetidos se envían una sola vez
+        self.assertEqual(delivered, 1)
+        self.assertEqual(_dropped(), dropped_before + 1)
+        self.assertEqual([group for group, _ in layer.received], ['user_2'])
+
+
+class ParseBulkRequestTests(SimpleTestCase):
+
+    actions = ['activate', 'deactivate']
+
+    def test_ids_are_deduplicated_in_order(self):
+        ids, action = parse_bulk_request({'ids': [3, '1', 3, 2], 'action': 'activate'}, self.actions)
+
+        self.assertEqual((ids, action), ([3, 1, 2], 'activate'))
+
+    def test_invalid_requests(self):
+        for data in (
+            {'ids': [1], 'action': 'delete'},
+            {'ids': [], 'action': 'activate'},
+            {'ids': 1, 'action': 'activate'},
+            {'ids': [1, 'x'], 'action': 'activate'},
+            {'ids': list(range(BULK_MAX_IDS + 1)), 'action': 'activate'},
+        ):
+            with self.assertRaises(ValueError):
+                parse_bulk_request(data, self.actions)
@@ -0,0 +1,114 @@
+"""
+Contadores de versión por recurso
+
+Sirven para invalidar caches y construir ETags: cada cambio en el recurso
+incrementa su versión (INCR en Redis) y todo lo cacheado con la versión
+anterior deja de usarse. Si Redis no está disponible se usa la cache de
+Django del proceso.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from redis import RedisError
+
+from .redis_client import get_redis, mark_redis_down
+
+
+VERSION_KEY = '{name}:version'
+
+
+def _initial_version():
+    # Basada en el reloj: si Redis pierde la clave, la nueva versión nunca
+    # coincide con una anterior (un ETag viejo no valida contenido nuevo)
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """
+    Versión actual del recurso `name` (p. ej. 'provider:42')
+    """
+    key = VERSION_KEY.format(name=name)
+    try:
+        client = get_redis()
+        value = client.get(key)
+        if value is None:
+            client.set(key, _initial_version(), nx=True)
+            value = client.get(key)
+        return int(value)
+    except RedisError as e:
+        mark_redis_down(e)
+        cache.add(key, _initial_version(), None)
+        return cache.get(key)
+
+
+def bump_version(name):
+    """
+    Incrementar la versión del recurso `name`
+    """
+    key = VERSION_KEY.format(name=name)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.set(key, _initial_version(), nx=True)
+        pipe.incr(key)
+        return pipe.execute()[-1]
+    except RedisError as e:
+        mark_redis_down(e)
+        cache.add(key, _initial_version(), None)
+        return cache.incr(key)
+
+
+def bump_version_on_commit(name):
+    """
+    Incrementar la versión cuando se confirme la transacción actual, para
+    que nadie cachee con la versión nueva datos aún no confirmados
+    """
+    transaction.on_commit(lambda: bump_version(name))
+
+
+# Catálogo público: categorías y listado de servicios. Cambia con los datos
+# de cada fila (servicio, publicación, imágenes, nombre del proveedor); los
+# contadores (rating, reseñas, favoritos, bookings) no lo incrementan para
+# no invalidar el listado en cada interacción: el validador del catálogo
+# (catalog_validator) cambia además cada CATALOG_COUNTERS_MAX_AGE segundos
+CATALOG_VERSION = 'catalog'
+
+# Segundos máximos que un cliente puede ver contadores desactualizados en
+# el catálogo revalidando con If-None-Match
+CATALOG_COUNTERS_MAX_AGE = 60
+
+# Listado de categorías con sus conteos de servicios publicados
+CATEGORIES_VERSION = 'categories'
+
+
+def provider_version_name(provider_id):
+    """Recurso que agrupa el perfil público del proveedor y sus servicios"""
+    return f'provider:{provider_id}'
+
+
+def catalog_validator():
+    """
+    Valor para el ETag del catálogo: su versión y el intervalo actual de
+    CATALOG_COUNTERS_MAX_AGE, que acota cuánto puede durar un 304 con
+    contadores viejos
+    """
+    return f'{get_version(CATALOG_VERSION)}:{int(time.time() // CATALOG_COUNTERS_MAX_AGE)}'
+
+
+def bump_catalog_version():
+    bump_version_on_commit(CATALOG_VERSION)
+
+
+def bump_categories_version():
+    bump_version_on_commit(CATEGORIES_VERSION)
+
+
+def bump_provider_version(provider_id, catalog=False):
+    """
+    Invalidar el perfil del proveedor. Con `catalog` también el catálogo
+    público: solo para cambios que se ven en sus filas (ver CATALOG_VERSION)
+    """
+    if provider_id:
+        bump_version_on_commit(provider_version_name(provider_id))
+        if catalog:
+            bump_catalog_version()
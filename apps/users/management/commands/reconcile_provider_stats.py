@@ -0,0 +1,88 @@
+"""
+Recalcula la tabla provider_stats desde services, bookings y reviews
+
+Uso:
+    python manage.py reconcile_provider_stats
+    python manage.py reconcile_provider_stats --dry-run
+    python manage.py reconcile_provider_stats --provider 42
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.users.models import ProviderStats
+from apps.services.models import Service
+from apps.bookings.models import Booking
+
+
+CHUNK_SIZE = 500
+STATS_FIELDS = ['completed_bookings', 'total_reviews', 'rating_sum', 'active_services', 'lifetime_revenue']
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los agregados de provider_stats y corrige los desvíos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo mostrar las diferencias, sin escribir cambios'
+        )
+        parser.add_argument(
+            '--provider',
+            type=int,
+            action='append',
+            help='ID de proveedor a recalcular (se puede repetir)'
+        )
+
+    def handle(self, *args, **options):
+        if options['provider']:
+            provider_ids = set(options['provider'])
+        else:
+            provider_ids = set(Service.objects.values_list('provider_id', flat=True).distinct())
+            provider_ids.update(Booking.objects.values_list('provider_id', flat=True).distinct())
+            provider_ids.update(ProviderStats.objects.values_list('provider_id', flat=True))
+
+        provider_ids = sorted(provider_ids)
+        created = updated = 0
+
+        for start in range(0, len(provider_ids), CHUNK_SIZE):
+            chunk = provider_ids[start:start + CHUNK_SIZE]
+            expected = ProviderStats.compute(chunk)
+            existing = {
+                stats.provider_id: stats
+                for stats in ProviderStats.objects.filter(provider_id__in=chunk)
+            }
+
+            to_create = []
+            to_update = []
+            for provider_id in chunk:
+                values = expected[provider_id]
+                stats = existing.get(provider_id)
+                if stats is None:
+                    to_create.append(ProviderStats(provider_id=provider_id, **values))
+                    continue
+
+                changes = {
+                    field: (getattr(stats, field), value)
+                    for field, value in values.items()
+                    if getattr(stats, field) != value
+                }
+                if changes:
+                    if options['dry_run']:
+                        diff = ', '.join(f'{field}: {old} -> {new}' for field, (old, new) in changes.items())
+                        self.stdout.write(f'Proveedor {provider_id}: {diff}')
+                    for field, value in values.items():
+                        setattr(stats, field, value)
+                    to_update.append(stats)
+
+            created += len(to_create)
+            updated += len(to_update)
+            if not options['dry_run']:
+                with transaction.atomic():
+                    ProviderStats.objects.bulk_create(to_create, ignore_conflicts=True)
+                    ProviderStats.objects.bulk_update(to_update, STATS_FIELDS)
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{len(provider_ids)} proveedores revisados: {created} filas nuevas, {updated} corregidas'
+        ))
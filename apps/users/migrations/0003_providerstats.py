@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_total_earnings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider_id', models.BigIntegerField(unique=True)),
+                ('completed_bookings', models.IntegerField(default=0)),
+                ('total_reviews', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('active_services', models.IntegerField(default=0)),
+                ('lifetime_revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'provider_stats',
+            },
+        ),
+    ]
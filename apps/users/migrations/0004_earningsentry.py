@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_earnings(apps, schema_editor):
+    """
+    Un ingreso por cada booking ya completado. total_earnings no se toca:
+    ya incluye estos bookings
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    EarningsEntry = apps.get_model('users', 'EarningsEntry')
+
+    completed = Booking.objects.filter(status='completed').annotate(
+        amount=Coalesce('service_price', 'service__price'),
+        earned_at=Coalesce('completed_at', 'updated_at')
+    ).values_list('id', 'provider_id', 'amount', 'earned_at')
+
+    entries = [
+        EarningsEntry(provider_id=provider_id, booking_id=booking_id, amount=amount, created_at=earned_at)
+        for booking_id, provider_id, amount, earned_at in completed.iterator()
+        if amount and amount > 0
+    ]
+    EarningsEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_providerstats'),
+        ('bookings', '0003_booking_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarningsEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider_id', models.BigIntegerField()),
+                ('booking_id', models.BigIntegerField(unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'earnings_entries',
+                'indexes': [models.Index(fields=['provider_id', 'created_at'], name='earnings_en_provide_e54ede_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_earnings, migrations.RunPython.noop),
+    ]
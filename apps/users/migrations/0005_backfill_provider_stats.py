@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_provider_stats(apps, schema_editor):
+    """
+    Una fila por proveedor con servicios o bookings, para que los deltas de
+    los signals no tengan que crear filas bajo concurrencia
+    """
+    Service = apps.get_model('services', 'Service')
+    Booking = apps.get_model('bookings', 'Booking')
+    Review = apps.get_model('reviews', 'Review')
+    ProviderStats = apps.get_model('users', 'ProviderStats')
+
+    stats = {}
+
+    def row(provider_id):
+        return stats.setdefault(provider_id, {
+            'completed_bookings': 0,
+            'total_reviews': 0,
+            'rating_sum': 0,
+            'active_services': 0,
+            'lifetime_revenue': Decimal('0.00'),
+        })
+
+    services = Service.objects.values('provider_id').annotate(
+        active=Count('id', filter=Q(is_active=True, is_published=True))
+    )
+    for values in services:
+        row(values['provider_id'])['active_services'] = values['active']
+
+    bookings = Booking.objects.values('provider_id').annotate(
+        total=Count('id', filter=Q(status='completed')),
+        revenue=Sum(Coalesce('service_price', 'service__price'), filter=Q(status='completed'))
+    )
+    for values in bookings:
+        row(values['provider_id']).update(
+            completed_bookings=values['total'],
+            lifetime_revenue=values['revenue'] or Decimal('0.00')
+        )
+
+    reviews = Review.objects.filter(is_visible=True).values('service__provider_id').annotate(
+        total=Count('id'),
+        rating_total=Sum('rating')
+    )
+    for values in reviews:
+        row(values['service__provider_id']).update(
+            total_reviews=values['total'],
+            rating_sum=values['rating_total'] or 0
+        )
+
+    ProviderStats.objects.bulk_create(
+        [ProviderStats(provider_id=provider_id, **values) for provider_id, values in stats.items()],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_earningsentry'),
+        ('services', '0001_initial'),
+        ('reviews', '0002_review_reviews_is_flag_961ce9_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_provider_stats, migrations.RunPython.noop),
+    ]
@@ -71,6 +71,40 @@ class User(models.Model):
         return True
 
 
+
+def cached_user(instance, name, user_id):
+    """
+    Usuario `user_id` de la instancia, consultado una sola vez y guardado en
+    `instance._<name>` (la misma cache que llena attach_users). Es la base
+    de las propiedades `reviewer`, `customer`, `sender`, etc. de los modelos
+    """
+    cache_attr = f'_{name}'
+    if cache_attr not in instance.__dict__:
+        instance.__dict__[cache_attr] = User.objects.filter(id=user_id).first() if user_id else None
+    return instance.__dict__[cache_attr]
+
+
+def attach_users(instances, **fields):
+    """
+    Cargar en una sola consulta los usuarios referenciados por id en una
+    lista de instancias, p. ej. attach_users(reviews, reviewer='reviewer_id').
+    Cada usuario queda en `instance._<nombre>`, la cache de cached_user;
+    los que ya estaban cargados no se vuelven a consultar
+    """
+    pending = [
+        (instance, f'_{name}', id_attr)
+        for instance in instances
+        for name, id_attr in fields.items()
+        if f'_{name}' not in instance.__dict__
+    ]
+    user_ids = {getattr(instance, id_attr) for instance, _, id_attr in pending}
+    user_ids.discard(None)
+    users = User.objects.in_bulk(user_ids) if user_ids else {}
+    for instance, cache_attr, id_attr in pending:
+        setattr(instance, cache_attr, users.get(getattr(instance, id_attr)))
+    return instances
+
+
 class UserProfile(models.Model):
     """
     Perfil extendido del usuario (datos adicionales del marketplace)
@@ -110,11 +144,276 @@ class UserProfile(models.Model):
         except User.DoesNotExist:
             return None
     
-    def add_earnings(self, amount):
-        """Incrementar ganancias del proveedor"""
+    @classmethod
+    def add_earnings(cls, user_id, amount):
+        """
+        Incrementar ganancias del proveedor con un UPDATE atómico (F()), sin
+        leer y reescribir el perfil: dos incrementos simultáneos no se pisan.
+        Normalmente se llama desde EarningsEntry.record
+        """
+        from decimal import Decimal
+        if not amount or amount <= 0:
+            return False
+        cls.objects.get_or_create(user_id=user_id)
+        cls.objects.filter(user_id=user_id).update(
+            total_earnings=models.F('total_earnings') + Decimal(str(amount))
+        )
+        return True
+
+
+class EarningsEntry(models.Model):
+    """
+    Ledger de ganancias del proveedor: una fila por booking completado,
+    solo se agregan filas. `UserProfile.total_earnings` es el acumulado y
+    los totales por periodo se calculan agregando sobre (provider_id, created_at)
+    """
+    provider_id = models.BigIntegerField()  # FK a Spring Boot
+    booking_id = models.BigIntegerField(unique=True)  # Un ingreso por booking
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()  # Momento en que se completó el booking
+    
+    class Meta:
+        db_table = 'earnings_entries'
+        indexes = [
+            models.Index(fields=['provider_id', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.amount} for provider {self.provider_id} (booking {self.booking_id})"
+    
+    @classmethod
+    def record(cls, provider_id, booking_id, amount, created_at=None):
+        """
+        Registrar el ingreso de un booking y sumarlo a total_earnings en la
+        misma transacción. Es idempotente: si el booking ya estaba en el
+        ledger no se vuelve a sumar. Devuelve True si se registró
+        """
+        from decimal import Decimal
+        from django.db import IntegrityError, transaction
+        from django.utils import timezone
+        
+        if not amount or amount <= 0:
+            return False
+        amount = Decimal(str(amount))
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    provider_id=provider_id,
+                    booking_id=booking_id,
+                    amount=amount,
+                    created_at=created_at or timezone.now()
+                )
+                UserProfile.add_earnings(provider_id, amount)
+        except IntegrityError:
+            return False
+        return True
+    
+    @classmethod
+    def totals(cls, provider_id, since=None, until=None):
+        """
+        Total y número de ingresos del proveedor en [since, until)
+        """
+        from django.db.models import Count, Sum
+        
+        entries = cls.objects.filter(provider_id=provider_id)
+        if since:
+            entries = entries.filter(created_at__gte=since)
+        if until:
+            entries = entries.filter(created_at__lt=until)
+        result = entries.aggregate(total=Sum('amount'), count=Count('id'))
+        return result['total'] or 0, result['count']
+    
+    @classmethod
+    def monthly_totals(cls, provider_id, since=None):
+        """
+        Ingresos agrupados por mes: [{'month': date, 'total': Decimal, 'count': int}]
+        """
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncMonth
+        
+        entries = cls.objects.filter(provider_id=provider_id)
+        if since:
+            entries = entries.filter(created_at__gte=since)
+        return list(
+            entries.annotate(month=TruncMonth('created_at'))
+            .values('month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by('month')
+        )
+
+
+class ProviderStats(models.Model):
+    """
+    Agregados desnormalizados por proveedor (una fila por proveedor)
+
+    Se mantienen por deltas desde los signals de bookings, reviews y
+    services; `reconcile_provider_stats` los recalcula desde las tablas origen.
+    """
+    provider_id = models.BigIntegerField(unique=True)  # FK a Spring Boot
+    completed_bookings = models.IntegerField(default=0)
+    total_reviews = models.IntegerField(default=0)  # Reseñas visibles en sus servicios
+    rating_sum = models.IntegerField(default=0)
+    active_services = models.IntegerField(default=0)  # Activos y publicados
+    lifetime_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'provider_stats'
+    
+    def __str__(self):
+        return f"Stats of provider {self.provider_id}"
+    
+    @property
+    def average_rating(self):
+        """Rating promedio ponderado por número de reseñas"""
+        if not self.total_reviews:
+            return 0.0
+        return self.rating_sum / self.total_reviews
+    
+    @classmethod
+    def compute(cls, provider_ids):
+        """
+        Calcular los agregados desde las tablas origen para varios proveedores
+        (una consulta agrupada por tabla). Devuelve {provider_id: {campo: valor}}
+        """
         from decimal import Decimal
-        if amount and amount > 0:
-            self.total_earnings += Decimal(str(amount))
-            self.save()
-            return True
-        return False
+        from django.db.models import Count, Sum, Q
+        from django.db.models.functions import Coalesce
+        from apps.services.models import Service
+        from apps.bookings.models import Booking
+        from apps.reviews.models import Review
+        
+        stats = {
+            provider_id: {
+                'completed_bookings': 0,
+                'total_reviews': 0,
+                'rating_sum': 0,
+                'active_services': 0,
+                'lifetime_revenue': Decimal('0.00'),
+            }
+            for provider_id in provider_ids
+        }
+        
+        services = Service.objects.filter(
+            provider_id__in=provider_ids
+        ).values('provider_id').annotate(
+            active=Count('id', filter=Q(is_active=True, is_published=True))
+        )
+        for row in services:
+            stats[row['provider_id']]['active_services'] = row['active']
+        
+        bookings = Booking.objects.filter(
+            provider_id__in=provider_ids, status='completed'
+        ).values('provider_id').annotate(
+            total=Count('id'),
+            revenue=Sum(Coalesce('service_price', 'service__price'))
+        )
+        for row in bookings:
+            stats[row['provider_id']]['completed_bookings'] = row['total']
+            stats[row['provider_id']]['lifetime_revenue'] = row['revenue'] or Decimal('0.00')
+        
+        reviews = Review.objects.filter(
+            service__provider_id__in=provider_ids, is_visible=True
+        ).values('service__provider_id').annotate(
+            total=Count('id'),
+            rating_total=Sum('rating')
+        )
+        for row in reviews:
+            stats[row['service__provider_id']]['total_reviews'] = row['total']
+            stats[row['service__provider_id']]['rating_sum'] = row['rating_total'] or 0
+        
+        return stats
+    
+    @classmethod
+    def recompute(cls, provider_id):
+        """Recalcular y guardar la fila de un proveedor"""
+        values = cls.compute([provider_id])[provider_id]
+        stats, _ = cls.objects.update_or_create(provider_id=provider_id, defaults=values)
+        return stats
+    
+    @classmethod
+    def recompute_many(cls, provider_ids):
+        """
+        Recalcular y guardar las filas de varios proveedores (acciones en
+        bloque): agregados agrupados y escritura con bulk_create/bulk_update
+        """
+        from apps.shared.versions import bump_provider_version
+    
+        provider_ids = set(provider_id for provider_id in provider_ids if provider_id)
+        if not provider_ids:
+            return
+        expected = cls.compute(provider_ids)
+        existing = {
+            stats.provider_id: stats
+            for stats in cls.objects.filter(provider_id__in=provider_ids)
+        }
+    
+        to_create = []
+        for provider_id, values in expected.items():
+            stats = existing.get(provider_id)
+            if stats is None:
+                to_create.append(cls(provider_id=provider_id, **values))
+                continue
+            for field, value in values.items():
+                setattr(stats, field, value)
+    
+        cls.objects.bulk_create(to_create, ignore_conflicts=True)
+        if existing:
+            fields = list(next(iter(expected.values())))
+            cls.objects.bulk_update(existing.values(), fields)
+        for provider_id in provider_ids:
+            bump_provider_version(provider_id)
+    
+    @classmethod
+    def ensure(cls, provider_id):
+        """
+        Crear la fila del proveedor desde las tablas origen si aún no existe.
+        Los signals la llaman antes de crear un servicio, booking o review (o
+        de moverlo a otro proveedor), así el delta del cambio siempre se
+        aplica sobre una fila que todavía no lo incluye (recalcular después
+        de escribir pisaría deltas concurrentes). Para el resto de
+        proveedores la fila ya existe (migración users/0005)
+        """
+        from django.db import IntegrityError, transaction
+
+        if not provider_id or cls.objects.filter(provider_id=provider_id).exists():
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(provider_id=provider_id, **cls.compute([provider_id])[provider_id])
+        except IntegrityError:
+            pass  # Otra petición la creó a la vez
+
+    @classmethod
+    def for_provider(cls, provider_id):
+        """
+        Obtener la fila del proveedor para lectura. Si no existe se devuelve
+        calculada y sin guardar: las filas las crean ensure y
+        reconcile_provider_stats, no los GET (que también la piden para
+        perfiles de clientes)
+        """
+        try:
+            return cls.objects.get(provider_id=provider_id)
+        except cls.DoesNotExist:
+            return cls(provider_id=provider_id, **cls.compute([provider_id])[provider_id])
+    
+    @classmethod
+    def apply_delta(cls, provider_id, **deltas):
+        """
+        Aplicar incrementos atómicos con F(), p. ej. apply_delta(5, total_reviews=1).
+        Si el proveedor aún no tiene fila (no pasó por ensure) se calcula
+        completa, ya con el cambio incluido
+        """
+        from apps.shared.versions import bump_provider_version
+        
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+        updated = cls.objects.filter(provider_id=provider_id).update(
+            **{field: models.F(field) + value for field, value in deltas.items()}
+        )
+        if not updated:
+            cls.recompute(provider_id)
+        # Las estadísticas forman parte del perfil público cacheado
+        bump_provider_version(provider_id)
@@ -188,33 +188,22 @@ class UserProfilePublicSerializer(serializers.ModelSerializer):
             representation['user']['phone_number'] = instance.user.phone_number
         return representation
 
+    def _provider_stats(self, obj):
+        """Fila de ProviderStats del perfil (se lee una sola vez)"""
+        if not hasattr(obj, '_provider_stats'):
+            from .models import ProviderStats
+            obj._provider_stats = ProviderStats.for_provider(obj.user_id)
+        return obj._provider_stats
+
     def get_completed_services_count(self, obj):
-        from apps.bookings.models import Booking
-        return Booking.objects.filter(
-            provider_id=obj.user_id,
-            status='completed'
-        ).count()
+        return self._provider_stats(obj).completed_bookings
 
     def get_average_rating(self, obj):
-        from apps.services.models import Service
-        # Solo considerar servicios que tienen reseñas
-        services = Service.objects.filter(
-            provider_id=obj.user_id, 
-            reviews_count__gt=0
-        )
-        
-        if not services.exists():
-            return 0.0
-        
-        total_rating = sum(s.rating_avg for s in services)
-        return round(total_rating / services.count(), 1)
+        # Promedio ponderado por número de reseñas
+        return round(self._provider_stats(obj).average_rating, 1)
 
     def get_total_reviews(self, obj):
-        from apps.reviews.models import Review
-        return Review.objects.filter(
-            service__provider_id=obj.user_id,
-            is_visible=True
-        ).count()
+        return self._provider_stats(obj).total_reviews
 
 
 class UserListSerializer(serializers.ModelSerializer):
@@ -0,0 +1,24 @@
+"""
+Signals para usuarios y perfiles
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import User, UserProfile
+from apps.shared.versions import bump_provider_version
+
+
+@receiver(post_save, sender=User)
+def on_user_updated(sender, instance, created, **kwargs):
+    """
+    El nombre del proveedor aparece en su perfil público cacheado y en el catálogo
+    """
+    if instance.role == 'PROVIDER':
+        bump_provider_version(instance.id, catalog=True)
+
+
+@receiver(post_save, sender=UserProfile)
+def on_profile_updated(sender, instance, created, **kwargs):
+    """
+    Bio y avatar forman parte del perfil público cacheado
+    """
+    bump_provider_version(instance.user_id)
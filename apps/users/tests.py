@@ -0,0 +1,244 @@
+"""
+Tests de los modelos de usuarios y de las estadísticas del proveedor
+"""
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+
+from apps.bookings.models import Booking
+from apps.bookings.state_machine import InvalidTransition, transition
+from apps.reports.models import Report
+from apps.reviews.models import Review
+from apps.services.models import Service
+from apps.shared.testing import (
+    UsersTableMixin, auth_header, create_user, mock_springboot, run_concurrently
+)
+from .models import EarningsEntry, ProviderStats, User, UserProfile, attach_users
+
+
+class CachedUserTests(UsersTableMixin, TestCase):
+
+    def setUp(self):
+        mock_springboot(self)
+        self.provider = create_user(1, role='PROVIDER')
+        self.customer = create_user(2)
+        self.service = Service.objects.create(
+            provider_id=1, title='Gasfitería', description='Reparaciones', price=50
+        )
+
+    def test_user_is_queried_once_per_instance(self):
+        review = Review.objects.create(reviewer_id=2, service=self.service, rating=5)
+        review = Review.objects.get(pk=review.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(review.reviewer, self.customer)
+            self.assertEqual(review.reviewer, self.customer)
+
+    def test_missing_user_is_cached_as_none(self):
+        report = Report(reporter_id=2, reported_user_id=99)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(report.reporter, self.customer)
+            self.assertIsNone(report.reported_user)
+            self.assertIsNone(report.reported_user)
+        with self.assertNumQueries(0):
+            self.assertIsNone(report.admin_user)
+
+    def test_attach_users_fills_the_same_cache(self):
+        services = [Service.objects.get(pk=self.service.pk)]
+
+        with self.assertNumQueries(1):
+            attach_users(services, provider='provider_id')
+        with self.assertNumQueries(0):
+            self.assertEqual(services[0].provider, self.provider)
+
+
+class ProviderStatsEnsureTests(TestCase):
+    """La fila de ProviderStats solo se asegura al crear o al cambiar de proveedor"""
+
+    def setUp(self):
+        mock_springboot(self)
+        self.service = Service.objects.create(
+            provider_id=1, title='Gasfitería', description='Reparaciones', price=50
+        )
+        patcher = mock.patch.object(ProviderStats, 'ensure')
+        self.ensure = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_updates_do_not_check_the_row(self):
+        self.service.title = 'Gasfitería 24h'
+        self.service.save()
+        booking = Booking.objects.create(service=self.service, customer_id=2, provider_id=1)
+        booking.booking_notes = 'Tocar el timbre'
+        booking.save()
+        review = Review.objects.create(reviewer_id=2, service=self.service, rating=4)
+        review.rating = 5
+        review.save()
+
+        # Solo las dos altas (booking y review)
+        self.assertEqual(self.ensure.call_args_list, [mock.call(1), mock.call(1)])
+
+    def test_new_provider_gets_its_row(self):
+        self.service.provider_id = 3
+        self.service.save()
+        other = Service.objects.create(
+            provider_id=4, title='Electricidad', description='Instalaciones', price=80
+        )
+        review = Review.objects.create(reviewer_id=2, service=self.service, rating=4)
+        self.ensure.reset_mock()
+
+        review.service = other
+        review.save()
+
+        self.ensure.assert_called_once_with(4)
+
+
+class ProviderStatsReadTests(UsersTableMixin, TestCase):
+    """Las lecturas no crean filas de ProviderStats"""
+
+    def setUp(self):
+        mock_springboot(self)
+        self.provider = create_user(1, role='PROVIDER')
+        self.customer = create_user(2)
+
+    def test_missing_row_is_computed_without_saving(self):
+        with mock.patch.object(ProviderStats, 'ensure'):
+            service = Service.objects.create(
+                provider_id=1, title='Gasfitería', description='Reparaciones', price=50,
+                is_published=True
+            )
+            Review.objects.create(reviewer_id=2, service=service, rating=4)
+        ProviderStats.objects.all().delete()
+
+        stats = ProviderStats.for_provider(1)
+
+        self.assertIsNone(stats.pk)
+        self.assertEqual((stats.active_services, stats.total_reviews, stats.rating_sum), (1, 1, 4))
+        self.assertFalse(ProviderStats.objects.exists())
+
+    def test_customer_public_profile_does_not_create_a_row(self):
+        response = self.client.get('/api/dashboard/users/profile/2/', **auth_header(1))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['completed_services_count'], 0)
+        self.assertFalse(ProviderStats.objects.filter(provider_id=2).exists())
+
+
+class ConcurrentCompletionTests(TransactionTestCase):
+    """
+    Completar bookings del mismo proveedor en paralelo: un ingreso por
+    booking en el ledger y ni total_earnings ni ProviderStats pierden sumas
+    """
+
+    PROVIDER_ID = 1
+
+    def setUp(self):
+        mock_springboot(self)
+        # Los efectos (chat, push) no son parte de lo que se mide aquí
+        patcher = mock.patch('apps.bookings.effects.run_in_background')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.service = Service.objects.create(
+            provider_id=self.PROVIDER_ID, title='Gasfitería', description='Reparaciones', price=50
+        )
+        UserProfile.objects.create(user_id=self.PROVIDER_ID, total_earnings=Decimal('10.00'))
+
+    def create_bookings(self, count):
+        # La mitad con precio pactado, la otra mitad con el precio del servicio
+        return [
+            Booking.objects.create(
+                service=self.service, customer_id=100 + i, provider_id=self.PROVIDER_ID,
+                status='accepted', service_price=Decimal('75.00') if i % 2 else None
+            )
+            for i in range(count)
+        ]
+
+    def complete(self, booking_id):
+        transition(Booking.objects.get(pk=booking_id), 'completed', actor_id=self.PROVIDER_ID)
+
+    def assertEarnings(self, bookings):
+        expected = sum(booking.service_price or self.service.price for booking in bookings)
+        entries = EarningsEntry.objects.filter(provider_id=self.PROVIDER_ID)
+        self.assertEqual(entries.count(), len(bookings))
+        self.assertEqual(entries.aggregate(total=Sum('amount'))['total'], expected)
+
+        profile = UserProfile.objects.get(user_id=self.PROVIDER_ID)
+        self.assertEqual(profile.total_earnings, Decimal('10.00') + expected)
+
+        stats = ProviderStats.objects.get(provider_id=self.PROVIDER_ID)
+        self.assertEqual(stats.completed_bookings, len(bookings))
+        self.assertEqual(stats.lifetime_revenue, expected)
+
+    def test_concurrent_completes(self):
+        bookings = self.create_bookings(100)
+
+        errors = run_concurrently(self.complete, [(booking.pk,) for booking in bookings])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Booking.objects.filter(status='completed').count(), 100)
+        self.assertEarnings(bookings)
+
+    def test_duplicate_completes_are_counted_once(self):
+        bookings = self.create_bookings(20)
+
+        errors = run_concurrently(self.complete, [(booking.pk,) for booking in bookings] * 2)
+
+        # Por booking, solo una de las dos peticiones aplica la transición
+        self.assertEqual(len(errors), 20)
+        self.assertTrue(all(isinstance(error, InvalidTransition) for error in errors))
+        self.assertEarnings(bookings)
+
+
+class AdminUsersBulkStatusTests(UsersTableMixin, TestCase):
+
+    url = '/api/dashboard/users/admin/bulk/status/'
+
+    def setUp(self):
+        mock_springboot(self)
+        self.admin = create_user(1, role='ADMIN')
+        self.other_admin = create_user(3, role='ADMIN')
+        self.customer = create_user(2)
+        self.inactive = create_user(4, is_active=False)
+
+    def post(self, data, user_id=1):
+        return self.client.post(self.url, data, content_type='application/json', **auth_header(user_id))
+
+    def test_outcome_per_id(self):
+        response = self.post({'ids': [2, 4, 1, 3, 999, 2], 'action': 'deactivate'})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['results'], [
+            {'id': 2, 'result': 'updated'},
+            {'id': 4, 'result': 'unchanged'},
+            {'id': 1, 'result': 'forbidden'},
+            {'id': 3, 'result': 'forbidden'},
+            {'id': 999, 'result': 'not_found'},
+        ])
+        self.assertEqual(
+            response.json()['summary'],
+            {'updated': 1, 'unchanged': 1, 'forbidden': 2, 'not_found': 1}
+        )
+        self.assertEqual(
+            dict(User.objects.values_list('id', 'is_active')),
+            {1: True, 2: False, 3: True, 4: False}
+        )
+
+    def test_admins_and_self_cannot_be_bulk_disabled(self):
+        response = self.post({'ids': [1, 3], 'action': 'deactivate'})
+
+        self.assertEqual(response.json()['summary']['forbidden'], 2)
+        self.assertFalse(User.objects.filter(id__in=[1, 3], is_active=False).exists())
+
+    def test_only_admins_can_call_it(self):
+        response = self.post({'ids': [4], 'action': 'activate'}, user_id=2)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.objects.get(id=4).is_active)
+
+    def test_invalid_body_is_rejected(self):
+        for data in ({'ids': [2], 'action': 'delete'}, {'ids': [], 'action': 'activate'},
+                     {'ids': ['x'], 'action': 'activate'}):
+            self.assertEqual(self.post(data).status_code, 400, data)
@@ -21,6 +21,7 @@ urlpatterns = [
     
     # Admin endpoints
     path('admin/', views.admin_users_list, name='admin_users_list'),
+    path('admin/bulk/status/', views.admin_users_bulk_status, name='admin_users_bulk_status'),
     path('admin/<int:target_user_id>/', views.admin_user_detail, name='admin_user_detail'),
     path('admin/<int:target_user_id>/toggle/', views.admin_user_toggle_status, name='admin_user_toggle_status'),
     path('admin/stats/', views.admin_users_stats, name='admin_users_stats'),
@@ -6,11 +6,16 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
+from datetime import timedelta
 
 from conectaya.authentication.decorators import jwt_required_drf
-from .models import User, UserProfile
+from apps.shared.bulk import parse_bulk_request, bulk_update, updated_ids, bulk_response_data
+from apps.shared.versions import bump_provider_version
+from .models import User, UserProfile, ProviderStats
 from .serializers import (
     UserSerializer, UserProfileSerializer, UserProfileCreateSerializer,
     UserProfileUpdateSerializer, UserProfilePublicSerializer,
@@ -18,6 +23,46 @@ from .serializers import (
 )
 
 
+# Resumen global de usuarios (sin filtros): se cachea unos segundos porque el
+# panel de admin lo pide en cada cambio de página
+USERS_COUNTERS_CACHE_KEY = 'users:admin_counters'
+USERS_COUNTERS_CACHE_TTL = 30  # segundos
+
+
+def _aggregate_user_counters(users):
+    """
+    Calcula todos los contadores de usuarios en una sola consulta
+    usando agregación condicional (un solo recorrido de la tabla)
+    """
+    today = timezone.localdate()
+    month_ago = timezone.now() - timedelta(days=30)
+    
+    return users.aggregate(
+        total=Count('id'),
+        customers=Count('id', filter=Q(role='CUSTOMER')),
+        providers=Count('id', filter=Q(role='PROVIDER')),
+        admins=Count('id', filter=Q(role='ADMIN')),
+        active=Count('id', filter=Q(is_active=True)),
+        inactive=Count('id', filter=Q(is_active=False)),
+        pending_providers=Count('id', filter=Q(role='PROVIDER', provider_status='PENDING')),
+        approved_providers=Count('id', filter=Q(role='PROVIDER', provider_status='APPROVED')),
+        rejected_providers=Count('id', filter=Q(role='PROVIDER', provider_status='REJECTED')),
+        new_today=Count('id', filter=Q(created_at__date=today)),
+        recent_users=Count('id', filter=Q(created_at__gte=month_ago)),
+    )
+
+
+def _get_global_user_counters():
+    """
+    Contadores de toda la tabla de usuarios, cacheados con TTL corto
+    """
+    counters = cache.get(USERS_COUNTERS_CACHE_KEY)
+    if counters is None:
+        counters = _aggregate_user_counters(User.objects.all())
+        cache.set(USERS_COUNTERS_CACHE_KEY, counters, USERS_COUNTERS_CACHE_TTL)
+    return counters
+
+
 @api_view(['GET', 'PUT'])
 @jwt_required_drf
 def user_profile(request):
@@ -273,18 +318,24 @@ def admin_users_list(request):
             )
         
         users = users.order_by('-created_at')
-        total_filtered = users.count()
 
-        today = timezone.localdate()
+        # Sin filtros el resumen es global y se sirve desde caché
+        is_filtered = any([role_filter, status_filter, provider_status_filter, search_query])
+        if is_filtered:
+            counters = _aggregate_user_counters(users)
+        else:
+            counters = _get_global_user_counters()
+        
+        total_filtered = counters['total']
         summary = {
             'total': total_filtered,
-            'customers': users.filter(role='CUSTOMER').count(),
-            'providers': users.filter(role='PROVIDER').count(),
-            'admins': users.filter(role='ADMIN').count(),
-            'active': users.filter(is_active=True).count(),
-            'inactive': users.filter(is_active=False).count(),
-            'pending_providers': users.filter(role='PROVIDER', provider_status='PENDING').count(),
-            'new_today': users.filter(created_at__date=today).count()
+            'customers': counters['customers'],
+            'providers': counters['providers'],
+            'admins': counters['admins'],
+            'active': counters['active'],
+            'inactive': counters['inactive'],
+            'pending_providers': counters['pending_providers'],
+            'new_today': counters['new_today']
         }
 
         paginator = PageNumberPagination()
@@ -342,6 +393,7 @@ def admin_user_detail(request, target_user_id):
             
             if serializer.is_valid():
                 target_user = serializer.save()
+                cache.delete(USERS_COUNTERS_CACHE_KEY)
                 return Response(
                     UserAdminSerializer(target_user).data,
                     status=status.HTTP_200_OK
@@ -389,6 +441,7 @@ def admin_user_toggle_status(request, target_user_id):
         
         target_user.is_active = not target_user.is_active
         target_user.save()
+        cache.delete(USERS_COUNTERS_CACHE_KEY)
         
         action = 'activado' if target_user.is_active else 'desactivado'
         
@@ -404,6 +457,64 @@ def admin_user_toggle_status(request, target_user_id):
         )
 
 
+
+# Acciones en bloque: valor de is_active a escribir
+BULK_USER_ACTIONS = {
+    'activate': True,
+    'deactivate': False,
+}
+
+
+@api_view(['POST'])
+@jwt_required_drf
+def admin_users_bulk_status(request):
+    """
+    Activar/desactivar varios usuarios en una sola petición (solo admin)
+    Body: {"ids": [1, 2, 3], "action": "activate" | "deactivate"}
+
+    Igual que en el endpoint individual, la propia cuenta y los otros
+    administradores no se modifican (resultado "forbidden").
+    """
+    try:
+        user_id = request.jwt_user_id
+        user = get_object_or_404(User, id=user_id)
+        
+        if user.role != 'ADMIN':
+            return Response(
+                {'error': 'Acceso denegado'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            ids, action = parse_bulk_request(request.data, BULK_USER_ACTIONS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        is_active = BULK_USER_ACTIONS[action]
+        with transaction.atomic():
+            outcomes = bulk_update(
+                User.objects.all(), ids, {'is_active': is_active},
+                unchanged=Q(is_active=is_active),
+                forbidden=Q(id=user_id) | Q(role='ADMIN')
+            )
+            
+            # El estado del proveedor afecta a su perfil público cacheado
+            providers = User.objects.filter(
+                id__in=updated_ids(outcomes), role='PROVIDER'
+            ).values_list('id', flat=True)
+            for provider_id in providers:
+                bump_provider_version(provider_id)
+        
+        cache.delete(USERS_COUNTERS_CACHE_KEY)
+        
+        return Response(bulk_response_data(action, outcomes), status=status.HTTP_200_OK)
+        
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['GET'])
 @jwt_required_drf
 def admin_users_stats(request):
@@ -420,51 +531,20 @@ def admin_users_stats(request):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        from django.db.models import Count
-        
-        # Estadísticas generales
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        inactive_users = User.objects.filter(is_active=False).count()
-        
-        # Por rol
-        customers = User.objects.filter(role='CUSTOMER').count()
-        providers = User.objects.filter(role='PROVIDER').count()
-        admins = User.objects.filter(role='ADMIN').count()
-        
-        # Proveedores por estado
-        pending_providers = User.objects.filter(
-            role='PROVIDER', 
-            provider_status='PENDING'
-        ).count()
-        approved_providers = User.objects.filter(
-            role='PROVIDER', 
-            provider_status='APPROVED'
-        ).count()
-        rejected_providers = User.objects.filter(
-            role='PROVIDER', 
-            provider_status='REJECTED'
-        ).count()
-        
-        # Usuarios recientes (últimos 30 días)
-        from datetime import datetime, timedelta
-        month_ago = datetime.now() - timedelta(days=30)
-        
-        recent_users = User.objects.filter(
-            created_at__gte=month_ago
-        ).count()
+        # Todos los contadores en una sola consulta (cacheada con TTL corto)
+        counters = _get_global_user_counters()
         
         return Response({
-            'total_users': total_users,
-            'active_users': active_users,
-            'inactive_users': inactive_users,
-            'customers': customers,
-            'providers': providers,
-            'admins': admins,
-            'pending_providers': pending_providers,
-            'approved_providers': approved_providers,
-            'rejected_providers': rejected_providers,
-            'recent_users': recent_users
+            'total_users': counters['total'],
+            'active_users': counters['active'],
+            'inactive_users': counters['inactive'],
+            'customers': counters['customers'],
+            'providers': counters['providers'],
+            'admins': counters['admins'],
+            'pending_providers': counters['pending_providers'],
+            'approved_providers': counters['approved_providers'],
+            'rejected_providers': counters['rejected_providers'],
+            'recent_users': counters['recent_users']
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -598,19 +678,15 @@ def user_activity_summary(request):
             # Actividad como proveedor
             total_services = Service.objects.filter(provider_id=user_id).count()
             total_bookings = Booking.objects.filter(provider_id=user_id).count()
-            total_reviews_received = Review.objects.filter(
-                service__provider_id=user_id
-            ).count()
             
-            # Rating promedio
-            services = Service.objects.filter(provider_id=user_id)
-            avg_rating = sum(s.rating_avg for s in services) / len(services) if services else 0
+            # Reseñas y rating desde la fila de estadísticas del proveedor
+            stats = ProviderStats.for_provider(user_id)
             
             summary['activity'] = {
                 'total_services': total_services,
                 'total_bookings': total_bookings,
-                'total_reviews_received': total_reviews_received,
-                'average_rating': round(avg_rating, 2)
+                'total_reviews_received': stats.total_reviews,
+                'average_rating': round(stats.average_rating, 2)
             }
         
         return Response(summary, status=status.HTTP_200_OK)
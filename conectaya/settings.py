@@ -183,6 +183,11 @@ CORS_ALLOW_CREDENTIALS = True
 SPRINGBOOT_API_URL = 'https://conectaya-springboot-backend.onrender.com/api'
 INTERNAL_API_SECRET = 'change-this-secret-key'
 
+# ============================================
+# REDIS
+# ============================================
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
+
 # ============================================
 # DJANGO CHANNELS (WebSockets)
 # ============================================
@@ -192,7 +197,7 @@ CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')],
+            "hosts": [REDIS_URL],
         },
     },
 }
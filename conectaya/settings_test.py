@@ -0,0 +1,39 @@
+"""
+Settings para correr los tests sin los servicios de producción
+
+- SQLite en archivo (no en memoria) para que los tests con hilos
+  concurrentes compartan la base; 'IMMEDIATE' toma el lock de escritura al
+  abrir cada transacción, así las escrituras concurrentes esperan su turno
+  en lugar de fallar con "database is locked"
+- Channel layer en memoria
+
+Uso:
+    python -m pytest
+    python manage.py test --settings=conectaya.settings_test
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+TEST_DB_PATH = os.path.join(tempfile.gettempdir(), 'conectaya_test.sqlite3')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': TEST_DB_PATH,
+        'OPTIONS': {
+            'timeout': 30,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            'NAME': TEST_DB_PATH,
+        },
+    }
+}
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
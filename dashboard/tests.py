@@ -1,3 +1,37 @@
+"""
+Tests de las estadísticas del dashboard
+"""
 from django.test import TestCase
 
-# Create your tests here.
+from apps.bookings.models import Booking
+from apps.services.models import Service
+from apps.shared.testing import UsersTableMixin, auth_header, create_user, mock_springboot
+
+
+class RoleStatsTests(UsersTableMixin, TestCase):
+
+    def setUp(self):
+        mock_springboot(self)
+        create_user(1, role='PROVIDER')
+        create_user(2, role='CUSTOMER')
+        service = Service.objects.create(
+            provider_id=1, title='Gasfitería', description='Reparaciones', price=50
+        )
+        for booking_status in ('pending', 'completed', 'completed'):
+            Booking.objects.create(
+                service=service, customer_id=2, provider_id=1, status=booking_status, service_price=50
+            )
+
+    def test_customer_stats(self):
+        response = self.client.get('/api/dashboard/stats/customer/', **auth_header(2))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['total_bookings'], 3)
+        self.assertEqual(response.json()['pending_bookings'], 1)
+        self.assertEqual(response.json()['completed_bookings'], 2)
+
+    def test_provider_stats(self):
+        response = self.client.get('/api/dashboard/stats/provider/', **auth_header(1))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['completed_bookings'], 2)
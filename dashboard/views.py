@@ -149,9 +149,8 @@ def provider_stats(request):
         
         from apps.services.models import Service
         from apps.bookings.models import Booking
-        from apps.reviews.models import Review
         from datetime import datetime, timedelta
-        from django.db.models import Count, Avg, Sum
+        from django.db.models import Count, Sum
         
         # Servicios
         services = Service.objects.filter(provider_id=user_id)
@@ -163,22 +162,14 @@ def provider_stats(request):
         bookings = Booking.objects.filter(provider_id=user_id)
         total_bookings = bookings.count()
         pending_bookings = bookings.filter(status='pending').count()
-        completed_bookings = bookings.filter(status='completed').count()
-        
-        # Reviews
-        reviews = Review.objects.filter(service__provider_id=user_id)
-        total_reviews = reviews.count()
-        
-        # Rating promedio del proveedor (promedio de sus servicios con calificaciones)
-        # Se calcula en base al rating_avg de cada servicio que tenga reviews
-        avg_rating = services.filter(reviews_count__gt=0).aggregate(Avg('rating_avg'))['rating_avg__avg'] or 0
         
-        # Ingresos (estimados)
-        completed_bookings_qs = bookings.filter(status='completed')
-        total_revenue = sum(
-            (booking.service_price if booking.service_price is not None else booking.service.price) 
-            for booking in completed_bookings_qs
-        )
+        # Reseñas, rating ponderado e ingresos: fila desnormalizada del proveedor
+        from apps.users.models import ProviderStats
+        stats = ProviderStats.for_provider(user_id)
+        total_reviews = stats.total_reviews
+        avg_rating = stats.average_rating
+        total_revenue = stats.lifetime_revenue
+        completed_bookings = stats.completed_bookings
         
         # Estadísticas del mes actual
         current_month = datetime.now().replace(day=1)